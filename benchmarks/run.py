@@ -0,0 +1,250 @@
+"""
+Benchmark the hot paths of donate against synthetic configurations.
+
+Results are written as JSON so runs can be compared. When a baseline is given
+with '--compare', any benchmark slower than the baseline by more than the
+threshold is reported and the script exits with a non-zero status.
+
+Run with donate installed, for example 'poetry run python benchmarks/run.py'.
+"""
+import argparse
+from collections import Counter
+from datetime import datetime
+import json
+from pathlib import Path
+import platform
+import random
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, Callable, Optional
+
+from donate.configuration import parse_config
+from donate.donee import Donee, DoneeTable
+from donate.generate import format_donations
+from donate.ledger import ledger_stats
+from donate.maths import single_donation, means_summary
+from donate.paths import set_data_path
+from donate.state import drain_pending, record_intent, state_lock
+
+RESULTS_PATH = Path(__file__).parent / "results"
+
+DEFAULT_SIZES = [10, 1000, 100000]
+CATEGORIES = ["software", "distribution", "podcast", "organisation", "other"]
+
+
+def synthetic_config(n_donees: int, split: int, seed: int = 0) -> str:
+    """Create a YAML configuration with `n_donees` donees."""
+    rng = random.Random(seed)
+    lines = [
+        "---",
+        f"total_donation: {split}",
+        f"split: {split}",
+        "decimal_currency: true",
+        "",
+        "weights:",
+        "  large: 1.0",
+        "  small: 0.1",
+        "",
+        "donees:"
+    ]
+    for i in range(n_donees):
+        weight = rng.choice(["large", "small", f"{rng.uniform(0.01, 1):.3f}"])
+        lines += [
+            f"  - name: Donee {i}",
+            f"    weight: {weight}",
+            f"    category: {rng.choice(CATEGORIES)}",
+            f"    url: https://example.com/{i}"
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def time_function(function: Callable[[], Any], repeats: int,
+                  min_time: float = 0.2) -> dict[str, Any]:
+    """
+    Time `function`, calling it enough times per repeat to take at least
+    `min_time` seconds.
+    """
+    number = 1
+    while True:
+        start = perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+
+    times = [elapsed / number]
+    for _ in range(repeats - 1):
+        start = perf_counter()
+        for _ in range(number):
+            function()
+        times.append((perf_counter() - start) / number)
+
+    times.sort()
+    return {
+        "min": times[0],
+        "median": times[len(times) // 2],
+        "repeats": repeats,
+        "number": number
+    }
+
+
+def write_history(data_path: Path, donees: list[Donee], rounds: int,
+                  split: int) -> None:
+    """Fill the ledger and log with `rounds` previous donations."""
+    set_data_path(data_path)
+
+    for _ in range(rounds):
+        donations = single_donation(donees, split, split)
+        record_intent(donations, "£", True)
+    with state_lock():
+        drain_pending()
+
+
+def commit(donations: Counter[Donee]) -> None:
+    """Record and commit a round of donations, as generate does."""
+    record_intent(donations, "£", True)
+    with state_lock():
+        drain_pending()
+
+
+def run(sizes: list[int], split: int, history: int,
+        repeats: int) -> list[dict[str, Any]]:
+    results = []
+
+    def record(name: str, size: int, function: Callable[[], Any],
+               function_repeats: int = repeats) -> None:
+        result = time_function(function, function_repeats)
+        result.update(name=name, size=size)
+        results.append(result)
+        print(f"{name:20} {size:>9} donees  min {result['min']:.3e} s"
+              f"  median {result['median']:.3e} s", flush=True)
+
+    for size in sizes:
+        config_text = synthetic_config(size, split)
+        # Parsing large configurations is slow, repeat it fewer times
+        record("parse_config", size, lambda: parse_config(config_text),
+               max(1, repeats // 3))
+
+        config = parse_config(config_text)
+        table = DoneeTable.from_donees(config.donees)
+        record("DoneeTable", size,
+               lambda: DoneeTable.from_donees(config.donees))
+
+        record("single_donation", size,
+               lambda: single_donation(table, split, split, True))
+        record("means_summary", size,
+               lambda: means_summary(table, split, "£"))
+
+        donations = single_donation(table, split, split, True)
+        record("format_donations", size,
+               lambda: format_donations(donations, "£", True))
+
+        with TemporaryDirectory() as tmp_dir:
+            data_path = Path(tmp_dir)
+            write_history(data_path, config.donees, history, split)
+
+            record("commit", size, lambda: commit(donations))
+            record("ledger_stats", size, lambda: ledger_stats("£", True))
+            set_data_path(None)
+
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            check=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list[dict[str, Any]], baseline: dict[str, Any],
+            threshold: float) -> list[str]:
+    """Return descriptions of benchmarks slower than the baseline."""
+    baseline_results = {
+        (result["name"], result["size"]): result
+        for result in baseline["results"]
+    }
+
+    regressions = []
+    for result in results:
+        try:
+            previous = baseline_results[(result["name"], result["size"])]
+        except KeyError:
+            continue
+
+        ratio = result["min"] / previous["min"]
+        if ratio > threshold:
+            regressions.append(
+                f"{result['name']} ({result['size']} donees) is"
+                f" {ratio:.2f}x slower than the baseline"
+            )
+
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=DEFAULT_SIZES,
+                        help="Numbers of donees, e.g. 10 1000 1000000.")
+    parser.add_argument("--split", type=int, default=10000,
+                        help="Number of parts in each donation.")
+    parser.add_argument("--history", type=int, default=1000,
+                        help="Number of previous donations in the ledger"
+                        " and log.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", type=Path,
+                        help="Results file. Defaults to a timestamped file"
+                        " in benchmarks/results.")
+    parser.add_argument("--compare", type=Path,
+                        help="Results file to compare against.")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Slowdown ratio reported as a regression.")
+    args = parser.parse_args()
+
+    timestamp = datetime.now()
+    results = run(args.sizes, args.split, args.history, args.repeats)
+
+    report = {
+        "timestamp": timestamp.isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "split": args.split,
+            "history": args.history,
+            "repeats": args.repeats
+        },
+        "results": results
+    }
+
+    output = args.output
+    if output is None:
+        RESULTS_PATH.mkdir(exist_ok=True)
+        output = RESULTS_PATH / f"{timestamp:%Y%m%dT%H%M%S}.json"
+    with open(output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare is not None:
+        with open(args.compare, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
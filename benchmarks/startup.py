@@ -0,0 +1,89 @@
+"""
+Measure the start up time of the donate command line interface.
+
+Each command is run several times in a fresh interpreter and the fastest run
+is compared to the command's time budget. Exits with a non-zero status if any
+command is over budget.
+"""
+import argparse
+from pathlib import Path
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+from textwrap import dedent
+from time import perf_counter
+
+# Budgets in seconds for the fastest of the repeated runs
+BUDGETS = {
+    "--help": 0.5,
+    "means": 0.75,
+}
+
+CONFIG = dedent(
+    """\
+    ---
+    total_donation: 100
+    split: 4
+
+    weights:
+      large: 1.0
+      small: 0.25
+
+    donees:
+      - name: Distro
+        weight: large
+        category: distribution
+        url: distro.com
+      - name: Software
+        weight: small
+        category: software
+        url: software.com
+    """
+)
+
+
+def time_command(args: list[str], repeats: int) -> list[float]:
+    times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        subprocess.run([sys.executable, "-m", "donate", *args],
+                       check=True, capture_output=True)
+        times.append(perf_counter() - start)
+    return times
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", "-n", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiply every budget by this factor.")
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmp_dir:
+        config_path = Path(tmp_dir) / "config.yaml"
+        config_path.write_text(CONFIG)
+
+        commands = {
+            "--help": ["--help"],
+            "means": ["means", "100", "--config", str(config_path)],
+        }
+
+        # Warm the configuration cache so 'means' measures the usual case
+        time_command(commands["means"], 1)
+
+        over_budget = False
+        for name, command in commands.items():
+            times = time_command(command, args.repeats)
+            budget = BUDGETS[name] * args.scale
+            fastest = min(times)
+            status = "ok" if fastest <= budget else "OVER BUDGET"
+            print(f"donate {name:8} fastest {fastest:.3f} s"
+                  f" median {sorted(times)[len(times) // 2]:.3f} s"
+                  f" budget {budget:.3f} s {status}")
+            over_budget = over_budget or fastest > budget
+
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
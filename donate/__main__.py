@@ -1,15 +1,13 @@
-from .configuration import parse_config, Configuration
-from .donee import Donee
-from .ledger import update_ledger, ledger_stats
-from .logs import update_log
-from .maths import split_decimal, single_donation, means_summary
-from .schedule import (schedule_map, Schedule, AdHoc, get_last_donation,
-                       update_last_donation)
+# Modules other than typer are imported by the commands which use them, so
+# that starting the command line interface stays fast
+from datetime import datetime
 from pathlib import Path
-from tabulate import tabulate
 import typer
-from typing import Optional
-from xdg import BaseDirectory  # type: ignore
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .configuration import Configuration
+    from .profiling import Profiler
 
 
 app = typer.Typer()
@@ -20,6 +18,36 @@ config_path_option = typer.Option(
     help="Specify a path to a non-default configuration file."
 )
 
+workers_option = typer.Option(
+    None, "--workers", "-w",
+    help="Number of worker processes. Defaults to the number of CPUs."
+)
+
+
+format_option = typer.Option(
+    "table", "--format", "-f",
+    help=(
+        "Output format, 'table', or 'json', 'csv' or 'ndjson' to stream rows"
+        " to other programs."
+    )
+)
+
+seed_option = typer.Option(
+    None, "--seed",
+    help=(
+        "Seed the random streams donations are drawn from, so the same seed"
+        " gives the same donations."
+    )
+)
+
+distinct_option = typer.Option(
+    False, "--distinct",
+    help=(
+        "Split each donation between distinct donees, so that no donee"
+        " receives more than one part."
+    )
+)
+
 
 @app.command(help="Generate a set of donations.")
 def generate(
@@ -38,57 +66,173 @@ def generate(
             "Generate sample donations but don't commit them to the donations"
             " ledger or update the last donation time."
         )
-    )
+    ),
+    timings: bool = typer.Option(
+        False, "--timings", envvar="DONATE_TIMINGS",
+        help="Report the wall time of each phase of generating donations."
+    ),
+    profile: bool = typer.Option(
+        False, "--profile", envvar="DONATE_PROFILE",
+        help=(
+            "Report the wall time, memory allocated and number of function"
+            " calls of each phase of generating donations. This is slow."
+        )
+    ),
+    report_format: str = typer.Option(
+        "json", "--report-format", envvar="DONATE_REPORT_FORMAT",
+        help="Format of the timings report, 'json' or 'openmetrics'."
+    ),
+    report_path: Optional[Path] = typer.Option(
+        None, "--report-path", envvar="DONATE_REPORT_PATH",
+        help="Write the timings report to a file rather than standard error."
+    ),
+    seed: Optional[int] = seed_option,
+    distinct: bool = distinct_option,
+    balanced: bool = typer.Option(
+        False, "--balanced",
+        help=(
+            "Give each part of a donation to the donee furthest below its"
+            " share of your recorded donations, rather than drawing donees at"
+            " random, so that totals follow your weights closely."
+        )
+    ),
+    output_format: str = format_option
 ) -> None:
-    config = get_config(check_config_path(config_path))
+    from .profiling import Profiler, report_formats, write_report
 
-    # Create instance of schedule object
-    if ad_hoc:
-        schedule: Schedule = AdHoc()
-    else:
-        schedule = schedule_map[config.schedule]()
+    if report_format not in report_formats:
+        raise typer.BadParameter(
+            f"Report format '{report_format}' is not valid"
+        )
+    check_output_format(output_format)
+    if distinct and balanced:
+        raise typer.BadParameter(
+            "'--distinct' and '--balanced' cannot be used together"
+        )
 
-    # Determine number of donations due
-    due_donations = schedule.due_donations(get_last_donation())
+    profiler = Profiler(enabled=timings, detailed=profile)
+    try:
+        _generate(config_path, ad_hoc, dry_run, profiler, seed, distinct,
+                  balanced, output_format)
+    finally:
+        if profiler.enabled:
+            write_report(profiler, report_format,
+                         str(report_path) if report_path else None)
+
+
+def _generate(config_path: Optional[Path], ad_hoc: bool, dry_run: bool,
+              profiler: "Profiler", seed: Optional[int], distinct: bool,
+              balanced: bool, output_format: str) -> None:
+    from .generate import donation_rows, generate_donations, make_donations
+    from .output import write_rows
+    from .streams import stream
+
+    with profiler.phase("config"):
+        config = get_config(check_config_path(config_path))
+    if distinct:
+        check_distinct_split(config)
+
+    rng = stream(seed) if seed is not None else None
+    if output_format == "table":
+        print(generate_donations(config, ad_hoc=ad_hoc, dry_run=dry_run,
+                                 profiler=profiler, rng=rng,
+                                 distinct=distinct, balanced=balanced,
+                                 plan=True))
+        return
+
+    _, donations = make_donations(config, ad_hoc=ad_hoc, dry_run=dry_run,
+                                  profiler=profiler, rng=rng,
+                                  distinct=distinct, balanced=balanced,
+                                  plan=True)
+    with profiler.phase("formatting"):
+        write_rows(donation_rows(donations, config.currency_symbol,
+                                 config.decimal_currency), output_format)
 
-    if not isinstance(schedule, AdHoc):
-        if due_donations == 0:
-            print("No donations due")
-            return
-        else:
-            print(f"{due_donations} donations due")
-
-    # Get individual donations
-    individual_donations = single_donation(
-        config.donees,
-        config.total_donation * due_donations,
-        config.split * due_donations,
-        config.decimal_currency
-    )
-    print(format_donations(individual_donations, config.currency_symbol,
-                           config.decimal_currency))
 
-    # Return before updating any files if this is a dry run
-    if dry_run:
-        typer.Exit()
+@app.command(help="Print some statistics about previous donations.")
+def stats(
+    by: Optional[str] = typer.Option(
+        None, "--by", "-b",
+        help=(
+            "Break down donations by 'month', 'year' or 'category' rather"
+            " than by donee."
+        )
+    ),
+    since: Optional[datetime] = typer.Option(
+        None, "--since", formats=["%Y-%m"],
+        help="Only include donations from this month, YYYY-MM, onwards."
+    ),
+    until: Optional[datetime] = typer.Option(
+        None, "--until", formats=["%Y-%m"],
+        help="Only include donations up to this month, YYYY-MM."
+    ),
+    output_format: str = format_option,
+    config_path: Optional[Path] = config_path_option
+) -> None:
+    from .ledger import (format_stats, rollup_periods, rollup_rows,
+                         rollup_stats, stats_rows)
+    from .output import write_rows
+    from .storage import storage_map
+
+    if by is not None and by not in rollup_periods:
+        raise typer.BadParameter(f"Breakdown '{by}' is not valid")
+    check_output_format(output_format)
+    # A window can only be applied to a breakdown
+    if by is None and (since is not None or until is not None):
+        by = "month"
 
-    # Record donation date
-    update_last_donation()
+    config = get_config(check_config_path(config_path))
+    storage = storage_map[config.storage]()
 
-    # Append donations to log
-    update_log(individual_donations, config.currency_symbol,
-               config.decimal_currency)
+    if by is not None:
+        since_month = f"{since:%Y-%m}" if since else None
+        until_month = f"{until:%Y-%m}" if until else None
+        rollups = storage.rollups(since_month, until_month)
 
-    # Update ledger
-    update_ledger(individual_donations)
+        if output_format == "table":
+            typer.echo(rollup_stats(rollups, by, config.currency_symbol,
+                                    config.decimal_currency, since_month,
+                                    until_month))
+        else:
+            write_rows(rollup_rows(rollups, by, config.decimal_currency,
+                                   since_month, until_month), output_format)
+        return
+
+    total, number = storage.totals()
+    if output_format == "table":
+        typer.echo(format_stats(total, number, config.currency_symbol,
+                                config.decimal_currency))
+    else:
+        write_rows(stats_rows(total, number, config.decimal_currency),
+                   output_format)
 
 
-@app.command(help="Print some statistics about previous donations.")
-def stats(config_path: Optional[Path] = config_path_option) -> None:
-    config = get_config(check_config_path(config_path))
+@app.command(
+    help=("Print the donations recorded in the donation log. Donations are"
+          " only logged with the 'files' storage backend.")
+)
+def log(
+    since: Optional[datetime] = typer.Option(
+        None, "--since", formats=["%Y-%m-%d"],
+        help="Only print donations made on or after this date."
+    ),
+    until: Optional[datetime] = typer.Option(
+        None, "--until", formats=["%Y-%m-%d"],
+        help="Only print donations made on or before this date."
+    )
+) -> None:
+    from .logs import read_log
 
-    typer.echo(ledger_stats(config.currency_symbol, config.decimal_currency))
-    typer.Exit()
+    records = read_log(since.date() if since else None,
+                       until.date() if until else None)
+    for record in records:
+        if isinstance(record.amount, float):
+            amount = f"{record.amount:.2f}"
+        else:
+            amount = f"{record.amount}"
+        typer.echo(
+            f"{record.date}  {record.currency_symbol}{amount}  {record.donee}"
+        )
 
 
 @app.command(
@@ -97,24 +241,308 @@ def stats(config_path: Optional[Path] = config_path_option) -> None:
 )
 def means(
     total_donation: int = typer.Argument(..., help="total donation"),
+    statistics: bool = typer.Option(
+        False, "--statistics", "-s",
+        help=(
+            "Also print the variance, standard deviation and probability of"
+            " receiving a donation when the total is split according to your"
+            " configuration."
+        )
+    ),
+    distinct: bool = typer.Option(
+        False, "--distinct",
+        help=(
+            "Print the probability each donee is included and the mean"
+            " donations when the total is split between distinct donees,"
+            " estimated by simulation."
+        )
+    ),
+    rounds: int = typer.Option(
+        10000, "--rounds", "-r",
+        help="Number of rounds simulated to estimate distinct donations."
+    ),
+    seed: Optional[int] = seed_option,
+    output_format: str = format_option,
+    config_path: Optional[Path] = config_path_option
+) -> None:
+    from .donee import DoneeTable
+    from .maths import (distinct_rows, distinct_summary, means_rows,
+                        means_summary, statistics_summary)
+    from .output import write_rows
+
+    check_output_format(output_format)
+    if rounds < 1:
+        raise typer.BadParameter(f"Rounds '{rounds}' is not valid")
+
+    config = get_config(check_config_path(config_path))
+    donees = DoneeTable.from_donees(config.donees)
+
+    if distinct:
+        check_distinct_split(config)
+        if output_format == "table":
+            typer.echo(distinct_summary(donees, total_donation, config.split,
+                                        config.currency_symbol, rounds,
+                                        seed))
+        else:
+            write_rows(distinct_rows(donees, total_donation, config.split,
+                                     rounds, seed), output_format)
+        return
+
+    if output_format != "table":
+        write_rows(means_rows(donees, total_donation, config.split,
+                              statistics), output_format)
+        return
+
+    typer.echo(
+        means_summary(donees, total_donation, config.currency_symbol)
+    )
+    if statistics:
+        typer.echo("")
+        typer.echo(
+            statistics_summary(donees, total_donation, config.split,
+                               config.currency_symbol)
+        )
+    typer.Exit()
+
+
+@app.command(
+    help=("Draw the donations of the next PERIODS scheduled rounds in advance"
+          " and store them in a plan, which 'generate' takes rounds from."
+          " The plan is redrawn when your donees or weights change.")
+)
+def plan(
+    periods: int = typer.Option(
+        12, "--periods", "-n", help="Number of rounds to plan."
+    ),
+    seed: Optional[int] = seed_option,
+    config_path: Optional[Path] = config_path_option
+) -> None:
+    from .plan import make_plan
+    from .state import state_lock
+    from .streams import stream
+
+    if periods < 1:
+        raise typer.BadParameter(f"Periods '{periods}' is not valid")
+
+    config = get_config(check_config_path(config_path))
+
+    rng = stream(seed) if seed is not None else None
+    with state_lock():
+        make_plan(config, periods, rng=rng)
+
+    typer.echo(f"Planned {periods} rounds of donations")
+
+
+@app.command(
+    help=("Simulate ROUNDS donations and summarise the distribution of"
+          " donations received by each donee and donee category")
+)
+def simulate(
+    rounds: int = typer.Argument(100000, help="number of rounds"),
+    workers: Optional[int] = typer.Option(
+        None, "--workers", "-w",
+        help="Number of worker processes. Defaults to the number of CPUs."
+    ),
+    seed: Optional[int] = typer.Option(
+        None, "--seed", "-s",
+        help=(
+            "Seed the random streams rounds are drawn from. The same seed"
+            " gives the same outcome for any number of workers."
+        )
+    ),
     config_path: Optional[Path] = config_path_option
 ) -> None:
+    from .donee import DoneeTable
+    from .simulate import simulate as simulate_donations
+
+    if rounds < 1:
+        raise typer.BadParameter(f"Rounds '{rounds}' is not valid")
+    check_workers(workers)
+
     config = get_config(check_config_path(config_path))
+    donees = DoneeTable.from_donees(config.donees)
 
     typer.echo(
-        means_summary(config.donees, total_donation, config.currency_symbol)
+        simulate_donations(donees, config.total_donation, config.split,
+                           rounds, config.decimal_currency,
+                           config.currency_symbol, workers, seed)
     )
     typer.Exit()
 
 
-def get_config(config_path: Path) -> Configuration:
-    with open(config_path, "r") as config_text:
-        config = parse_config(config_text.read())
+@app.command(
+    help=("Serve generate, means and stats requests from a long running"
+          " process with the configuration kept in memory. Use the"
+          " 'donate-client' command to send requests.")
+)
+def serve(
+    socket_path: Optional[Path] = typer.Option(
+        None, "--socket",
+        help="Path of the Unix socket to listen on."
+    ),
+    config_path: Optional[Path] = config_path_option
+) -> None:
+    from .client import default_socket_path
+    from .server import serve as serve_requests
+
+    if socket_path is None:
+        socket_path = default_socket_path()
+
+    typer.echo(f"Listening on {socket_path}")
+    serve_requests(check_config_path(config_path), socket_path)
+
+
+@app.command(
+    help=("Generate donations for each profile in PROFILES, a directory of"
+          " profile directories each containing a config.yaml or a YAML"
+          " manifest listing configurations.")
+)
+def batch(
+    profiles_path: Path = typer.Argument(
+        ..., metavar="PROFILES", help="profile directory or manifest"
+    ),
+    workers: Optional[int] = typer.Option(
+        None, "--workers", "-w",
+        help="Number of worker processes. Defaults to the number of CPUs."
+    ),
+    ad_hoc: bool = typer.Option(
+        False, "--ad-hoc", "-a",
+        help="Make an ad hoc donation for every profile."
+    ),
+    dry_run: bool = typer.Option(
+        False, "--dry-run", "-d",
+        help="Generate donations but don't record them."
+    ),
+    seed: Optional[int] = seed_option,
+    storage_backend: Optional[str] = typer.Option(
+        None, "--storage",
+        help=(
+            "Storage backend to use for every profile rather than each"
+            " profile's own, for example 'memory' to record nothing."
+        )
+    )
+) -> None:
+    from .batch import batch_summary, find_profiles, run_batch
+    from .storage import storage_map
+    from time import perf_counter
+
+    # Unlike a configuration, a batch run may use the 'memory' backend
+    if storage_backend is not None and storage_backend not in storage_map:
+        raise typer.BadParameter(
+            f"Storage '{storage_backend}' is not valid"
+        )
+    check_workers(workers)
+
+    profiles = find_profiles(profiles_path)
+
+    start = perf_counter()
+    results = run_batch(profiles, workers, ad_hoc, dry_run, seed,
+                        storage_backend)
+    elapsed = perf_counter() - start
+
+    typer.echo(batch_summary(results, elapsed))
+    if any(result.error for result in results):
+        raise typer.Exit(1)
+
+
+ledger_app = typer.Typer(
+    help="Check the donations ledger against the donation log."
+)
+app.add_typer(ledger_app, name="ledger")
+
+
+@ledger_app.command(
+    help=("Report any difference between the donations ledger and the"
+          " donation log.")
+)
+def verify(
+    workers: Optional[int] = workers_option,
+    config_path: Optional[Path] = config_path_option
+) -> None:
+    from .reconcile import format_drift, verify_ledger
+    from .state import drain_pending, state_lock
+
+    check_workers(workers)
+    config = _files_config(config_path)
+
+    with state_lock():
+        drain_pending()
+        drift = verify_ledger(config.decimal_currency, workers)
+
+    typer.echo(format_drift(drift, config.currency_symbol,
+                            config.decimal_currency))
+    if drift:
+        raise typer.Exit(1)
+
+
+@ledger_app.command(
+    help=("Replace the donations ledger with the totals in the donation log"
+          " and report any difference corrected.")
+)
+def rebuild(
+    workers: Optional[int] = workers_option,
+    config_path: Optional[Path] = config_path_option
+) -> None:
+    from .reconcile import format_drift, rebuild_ledger
+    from .state import drain_pending, state_lock
+
+    check_workers(workers)
+    config = _files_config(config_path)
+    categories = {donee.name: donee.category for donee in config.donees}
+
+    with state_lock():
+        drain_pending()
+        drift = rebuild_ledger(config.decimal_currency, categories, workers)
+
+    typer.echo(format_drift(drift, config.currency_symbol,
+                            config.decimal_currency))
+
+
+def _files_config(config_path: Optional[Path]) -> "Configuration":
+    """Load a configuration using the 'files' storage backend."""
+    config = get_config(check_config_path(config_path))
+    if config.storage != "files":
+        typer.echo("The ledger and log are only kept by the 'files' storage"
+                   " backend")
+        raise typer.Exit(1)
     return config
 
 
+def check_output_format(output_format: str) -> None:
+    from .output import output_formats
+
+    if output_format not in output_formats:
+        raise typer.BadParameter(
+            f"Output format '{output_format}' is not valid"
+        )
+
+
+def check_workers(workers: Optional[int]) -> None:
+    if workers is not None and workers < 1:
+        raise typer.BadParameter(f"Workers '{workers}' is not valid")
+
+
+def check_distinct_split(config: "Configuration") -> None:
+    """Check donations can be split between distinct donees."""
+    donees = sum(1 for donee in config.donees if donee.weight > 0)
+    if config.split > donees:
+        raise typer.BadParameter(
+            f"Split '{config.split}' is larger than the number of donees"
+            f" with a positive weight, {donees}, so '--distinct' cannot be"
+            " used"
+        )
+
+
+def get_config(config_path: Path) -> "Configuration":
+    from .configuration import load_config
+
+    return load_config(config_path)
+
+
 def check_config_path(path: Optional[Path]) -> Path:
     if path is None:
+        from xdg import BaseDirectory  # type: ignore
+
         try:
             path = (
                 BaseDirectory.load_first_config("donate") + "/config.yaml"
@@ -128,27 +556,6 @@ def check_config_path(path: Optional[Path]) -> Path:
     return path
 
 
-def format_donations(donations: dict[Donee, int], currency_symbol: str,
-                     decimal_currency: bool) -> str:
-    table: list[tuple[str, str, str]] = []
-    for donee, amount in donations.items():
-        if decimal_currency:
-            whole, hundreths = split_decimal(amount)
-            amount_str: str = f"{whole}.{hundreths:02d}"
-        else:
-            amount_str = f"{amount}"
-
-        amount_str = f"{currency_symbol}{amount_str}"
-        table.append((donee.name, amount_str, donee.url))
-
-    return tabulate(
-        sorted(
-            table,
-            key=lambda item: float(item[1][1:]),  # type: ignore
-            reverse=True)
-    )
-
-
 def main() -> None:
     app()
 
@@ -0,0 +1,153 @@
+"""Generate donations for many profiles in a pool of worker processes."""
+from .configuration import load_config
+from .generate import make_donations
+from .paths import set_data_path
+from .storage import storage_map
+from .streams import stream
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from random import Random
+from tabulate import tabulate
+from time import perf_counter
+from typing import Any, NamedTuple, Optional
+from yaml import safe_load
+
+
+class Profile(NamedTuple):
+    """A configuration and the directory its state is kept in."""
+    name: str
+    config_path: Path
+    data_path: Path
+
+
+class ProfileResult(NamedTuple):
+    name: str
+    due_donations: int
+    donations: int
+    total: int
+    decimal_currency: bool
+    currency_symbol: str
+    seconds: float
+    error: Optional[str]
+
+
+def find_profiles(path: Path) -> list[Profile]:
+    """
+    Find the profiles in a directory or manifest.
+
+    A directory's profiles are its subdirectories containing a
+    `config.yaml`, with their state kept in a `data` directory beside it.
+
+    A manifest is a YAML list of profiles, each with a `config` path and
+    optionally a `name` and a `data` path. Relative paths are relative to the
+    manifest. The data path defaults to a `data` directory beside the
+    configuration.
+    """
+    if path.is_dir():
+        return [
+            Profile(config_path.parent.name, config_path,
+                    config_path.parent / "data")
+            for config_path in sorted(path.glob("*/config.yaml"))
+        ]
+
+    with open(path, "r") as manifest_file:
+        manifest: list[dict[str, Any]] = safe_load(manifest_file)
+
+    profiles = []
+    for entry in manifest:
+        config_path = path.parent / entry["config"]
+        if "data" in entry:
+            data_path = path.parent / entry["data"]
+        else:
+            data_path = config_path.parent / "data"
+        name = entry.get("name", config_path.parent.name)
+        profiles.append(Profile(name, config_path, data_path))
+
+    return profiles
+
+
+def run_profile(profile: Profile, ad_hoc: bool = False,
+                dry_run: bool = False, rng: Optional[Random] = None,
+                storage_backend: Optional[str] = None) -> ProfileResult:
+    """
+    Generate and record the donations due for a single profile, in the
+    storage backend `storage_backend` if given rather than the profile's.
+    """
+    start = perf_counter()
+    set_data_path(profile.data_path)
+    try:
+        config = load_config(profile.config_path)
+        storage = storage_map[storage_backend or config.storage]()
+        due_donations, donations = make_donations(config, ad_hoc=ad_hoc,
+                                                  dry_run=dry_run, rng=rng,
+                                                  storage=storage)
+        return ProfileResult(
+            profile.name, due_donations, len(donations),
+            sum(donations.values()), config.decimal_currency,
+            config.currency_symbol, perf_counter() - start, None
+        )
+    except Exception as error:
+        # Report the failure without stopping the other profiles
+        return ProfileResult(profile.name, 0, 0, 0, False, "",
+                             perf_counter() - start, repr(error))
+    finally:
+        set_data_path(None)
+
+
+def run_batch(profiles: list[Profile], workers: Optional[int] = None,
+              ad_hoc: bool = False,
+              dry_run: bool = False,
+              seed: Optional[int] = None,
+              storage_backend: Optional[str] = None) -> list[ProfileResult]:
+    """
+    Run each profile in a pool of `workers` processes.
+
+    If `seed` is given each profile draws donations from its own stream
+    derived from the seed and the profile's position, so results do not
+    depend on the number of workers. If `storage_backend` is given it is used
+    for every profile, for example 'memory' to leave profiles' state
+    untouched.
+    """
+    rngs = [
+        stream(seed, index) if seed is not None else None
+        for index in range(len(profiles))
+    ]
+
+    if workers == 1:
+        return [
+            run_profile(profile, ad_hoc, dry_run, rng, storage_backend)
+            for profile, rng in zip(profiles, rngs)
+        ]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(run_profile, profile, ad_hoc, dry_run, rng,
+                            storage_backend)
+            for profile, rng in zip(profiles, rngs)
+        ]
+        return [future.result() for future in futures]
+
+
+def batch_summary(results: list[ProfileResult], elapsed: float) -> str:
+    """Summarise the results of a batch."""
+    table = []
+    for result in results:
+        if result.decimal_currency:
+            total = f"{result.currency_symbol}{result.total / 100:.2f}"
+        else:
+            total = f"{result.currency_symbol}{result.total}"
+        table.append([
+            result.name, result.due_donations, result.donations, total,
+            result.seconds, result.error or "ok"
+        ])
+
+    failed = sum(1 for result in results if result.error)
+    throughput = len(results) / elapsed if elapsed else float("inf")
+
+    return "\n".join([
+        tabulate(table, headers=["Profile", "Due", "Donations", "Total",
+                                 "Seconds", "Status"]),
+        "",
+        f"{len(results)} profiles ({failed} failed) in {elapsed:.2f} s"
+        f" ({throughput:.1f} profiles per second)"
+    ])
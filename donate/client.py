@@ -0,0 +1,93 @@
+"""
+Thin client for the donate server.
+
+This module only uses the standard library so that it starts quickly.
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+import socket
+import sys
+from typing import Any, Optional
+
+
+def default_socket_path() -> Path:
+    """Path of the server's socket in the user's runtime directory."""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "donate.sock"
+
+    cache_home = os.environ.get("XDG_CACHE_HOME") or (
+        os.path.expanduser("~/.cache")
+    )
+    return Path(cache_home) / "donate" / "donate.sock"
+
+
+def request(command: str, arguments: Optional[dict[str, Any]] = None,
+            socket_path: Optional[Path] = None) -> dict[str, Any]:
+    """Send a request to the server and return its response."""
+    if socket_path is None:
+        socket_path = default_socket_path()
+
+    message = {"command": command, "arguments": arguments or {}}
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(str(socket_path))
+        connection.sendall(json.dumps(message).encode() + b"\n")
+
+        with connection.makefile("rb") as response_file:
+            response: dict[str, Any] = json.loads(response_file.readline())
+
+    return response
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Send a command to a running 'donate serve' server."
+    )
+    parser.add_argument("--socket", type=Path, default=None,
+                        help="Path of the server's socket.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser("generate",
+                                     help="Generate a set of donations.")
+    generate.add_argument("--ad-hoc", "-a", action="store_true")
+    generate.add_argument("--dry-run", "-d", action="store_true")
+    generate.add_argument("--seed", type=int)
+    generate.add_argument("--distinct", action="store_true")
+    generate.add_argument("--balanced", action="store_true")
+
+    means = subparsers.add_parser("means", help="Print mean donations.")
+    means.add_argument("total_donation", type=int)
+    means.add_argument("--statistics", "-s", action="store_true")
+
+    stats = subparsers.add_parser("stats", help="Print donation statistics.")
+    stats.add_argument("--by", "-b",
+                       choices=["month", "year", "category"])
+    stats.add_argument("--since", help="First month, YYYY-MM.")
+    stats.add_argument("--until", help="Last month, YYYY-MM.")
+    subparsers.add_parser("ping", help="Check the server is running.")
+    subparsers.add_parser("shutdown", help="Stop the server.")
+
+    args = vars(parser.parse_args(argv))
+    command = args.pop("command")
+    socket_path = args.pop("socket")
+
+    try:
+        response = request(command, args, socket_path)
+    except OSError as error:
+        print(f"Could not connect to the donate server: {error}",
+              file=sys.stderr)
+        return 1
+
+    if not response["ok"]:
+        print(response["error"], file=sys.stderr)
+        return 1
+
+    print(response["output"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
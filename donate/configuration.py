@@ -1,8 +1,20 @@
 from .donee import Donee
 from .schedule import schedule_map
+from hashlib import sha256
+import os
+from pathlib import Path
+import pickle
 from typing import Any, KeysView
 from pydantic import BaseModel, Field, validator
-from yaml import load
+from xdg import BaseDirectory  # type: ignore
+
+# Storage backends a configuration may use. The 'memory' backend keeps no
+# record between runs, so is only used by tests, simulations and batch runs.
+storage_backends = ["files", "sqlite"]
+
+# Increment when the Configuration model changes to invalidate cached
+# configurations
+CACHE_VERSION = 3
 
 
 class Weights(BaseModel):
@@ -29,6 +41,7 @@ class Configuration(BaseModel):
     decimal_currency: bool = False
 
     schedule: str = "ad hoc"
+    storage: str = "files"
 
     donees: list[Donee]
 
@@ -38,8 +51,26 @@ class Configuration(BaseModel):
             raise ValueError(f"Schedule '{v}' is not valid")
         return v
 
+    @validator("donees")
+    def names_unique(cls, v: list[Donee]) -> list[Donee]:
+        # Donations are recorded by donee name
+        names = set()
+        for donee in v:
+            if donee.name in names:
+                raise ValueError(f"Donee '{donee.name}' is duplicated")
+            names.add(donee.name)
+        return v
+
+    @validator("storage")
+    def storage_exists(cls, v: str) -> str:
+        if v not in storage_backends:
+            raise ValueError(f"Storage '{v}' is not valid")
+        return v
+
 
 def parse_config(config: str) -> Configuration:
+    # yaml is only needed when the cached configuration is stale
+    from yaml import load
     try:
         from yaml import CLoader as Loader
     except ImportError:
@@ -62,3 +93,57 @@ def parse_config_dict(config: dict[str, Any]) -> Configuration:
     configuration = Configuration(**config)
 
     return configuration
+
+
+def _config_cache_path(config_path: Path) -> Path:
+    cache_path = Path(BaseDirectory.save_cache_path("donate"))
+    key = sha256(str(config_path).encode()).hexdigest()[:16]
+    return cache_path / f"config-{key}.pickle"
+
+
+def load_config(config_path: Path) -> Configuration:
+    """
+    Load and validate a configuration file.
+
+    Validated configurations are cached keyed by the file's path,
+    modification time and content hash. The cache is used when all three
+    match, skipping YAML parsing and validation.
+    """
+    config_path = Path(config_path).resolve()
+    with open(config_path, "rb") as config_file:
+        config_bytes = config_file.read()
+        mtime = os.fstat(config_file.fileno()).st_mtime_ns
+    digest = sha256(config_bytes).hexdigest()
+
+    cache_path = _config_cache_path(config_path)
+    key = {
+        "version": CACHE_VERSION,
+        "path": str(config_path),
+        "mtime": mtime,
+        "sha256": digest
+    }
+
+    try:
+        with open(cache_path, "rb") as cache_file:
+            cached = pickle.load(cache_file)
+        if cached["key"] == key:
+            configuration: Configuration = cached["configuration"]
+            return configuration
+    except Exception:
+        # A missing, stale or unreadable cache is rebuilt below
+        pass
+
+    configuration = parse_config(config_bytes.decode())
+
+    # Caching is best effort, a configuration which cannot be cached, for
+    # example because the cache directory is read only, is still returned
+    tmp_path = cache_path.with_name(cache_path.name + f".{os.getpid()}")
+    try:
+        with open(tmp_path, "wb") as cache_file:
+            pickle.dump({"key": key, "configuration": configuration},
+                        cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+
+    return configuration
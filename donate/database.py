@@ -0,0 +1,169 @@
+"""SQLite storage of donations and the last donation time."""
+from .donee import Donee
+from .ledger import Rollups
+from .paths import data_path
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+import sqlite3
+from typing import Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS donations (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    donee TEXT NOT NULL,
+    category TEXT NOT NULL,
+    currency_symbol TEXT NOT NULL,
+    amount INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS donations_date ON donations (date);
+CREATE INDEX IF NOT EXISTS donations_donee ON donations (donee, amount);
+CREATE INDEX IF NOT EXISTS donations_category
+    ON donations (category, amount);
+
+CREATE TABLE IF NOT EXISTS rollups (
+    month TEXT NOT NULL,
+    category TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    PRIMARY KEY (month, category)
+);
+
+CREATE TABLE IF NOT EXISTS last_donation (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    time TEXT NOT NULL
+);
+"""
+# Stored in the database's user_version
+_SCHEMA_VERSION = 1
+
+
+def _database_path() -> Path:
+    return data_path() / "donate.sqlite"
+
+
+def connect(path: Optional[Path] = None) -> sqlite3.Connection:
+    """Open the donations database, creating the tables if necessary."""
+    if path is None:
+        path = _database_path()
+
+    connection = sqlite3.connect(path)
+    connection.executescript(_SCHEMA)
+
+    # Databases created before the rollups table have their rollups filled
+    # in from the donations once
+    version, = connection.execute("PRAGMA user_version").fetchone()
+    if version < _SCHEMA_VERSION:
+        with connection:
+            connection.execute("DELETE FROM rollups")
+            connection.execute(
+                "INSERT INTO rollups (month, category, total, number)"
+                " SELECT substr(date, 1, 7), category, SUM(amount), COUNT(*)"
+                " FROM donations GROUP BY substr(date, 1, 7), category"
+            )
+            connection.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    return connection
+
+
+def get_last_donation(connection: sqlite3.Connection) -> Optional[datetime]:
+    """Get the time of the last donation."""
+    row = connection.execute(
+        "SELECT time FROM last_donation WHERE id = 0"
+    ).fetchone()
+
+    if row is None:
+        return None
+    return datetime.fromisoformat(row[0])
+
+
+def record_donations(connection: sqlite3.Connection,
+                     donations: Counter[Donee], currency_symbol: str,
+                     time: Optional[datetime] = None) -> None:
+    """
+    Record a set of donations and the time of the donation in a single
+    transaction, along with the donations' monthly rollups.
+
+    Amounts are stored as integers, in hundredths when using a decimal
+    currency.
+    """
+    if time is None:
+        time = datetime.today()
+    donation_date = time.date().isoformat()
+
+    categories: Counter[str] = Counter()
+    numbers: Counter[str] = Counter()
+    for donee, amount in donations.items():
+        categories[donee.category] += amount
+        numbers[donee.category] += 1
+
+    with connection:
+        connection.executemany(
+            "INSERT INTO donations"
+            " (date, donee, category, currency_symbol, amount)"
+            " VALUES (?, ?, ?, ?, ?)",
+            [
+                (donation_date, donee.name, donee.category, currency_symbol,
+                 amount)
+                for donee, amount in donations.items()
+            ]
+        )
+        connection.executemany(
+            "INSERT INTO rollups (month, category, total, number)"
+            " VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (month, category) DO UPDATE SET"
+            " total = total + excluded.total,"
+            " number = number + excluded.number",
+            [
+                (donation_date[:7], category, total, numbers[category])
+                for category, total in categories.items()
+            ]
+        )
+        connection.execute(
+            "INSERT INTO last_donation (id, time) VALUES (0, ?)"
+            " ON CONFLICT (id) DO UPDATE SET time = excluded.time",
+            (time.isoformat(),)
+        )
+
+
+def database_totals(
+    connection: sqlite3.Connection
+) -> tuple[dict[str, int], dict[str, int]]:
+    """Return the total and number of donations to each donee."""
+    total: dict[str, int] = {}
+    number: dict[str, int] = {}
+    for donee, donee_total, donee_number in connection.execute(
+        "SELECT donee, SUM(amount), COUNT(*) FROM donations GROUP BY donee"
+    ):
+        total[donee] = donee_total
+        number[donee] = donee_number
+
+    return total, number
+
+
+def database_rollups(connection: sqlite3.Connection,
+                     since: Optional[str] = None,
+                     until: Optional[str] = None) -> Rollups:
+    """
+    Return the total and number of donations by month and category, for
+    months from `since` to `until`, given as 'YYYY-MM', if given.
+    """
+    conditions = []
+    parameters = []
+    if since is not None:
+        conditions.append("month >= ?")
+        parameters.append(since)
+    if until is not None:
+        conditions.append("month <= ?")
+        parameters.append(until)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+
+    rollups: Rollups = {}
+    for month, category, total, number in connection.execute(
+        "SELECT month, category, total, number FROM rollups" + where,
+        parameters
+    ):
+        rollups.setdefault(month, {})[category] = [total, number]
+
+    return rollups
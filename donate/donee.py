@@ -1,4 +1,10 @@
+from array import array
+from functools import cached_property
 from pydantic import BaseModel, Field
+from typing import TYPE_CHECKING, Union
+
+if TYPE_CHECKING:
+    from .sampler import AliasSampler
 
 
 class Donee(BaseModel):
@@ -10,3 +16,74 @@ class Donee(BaseModel):
 
     def __hash__(self) -> int:
         return hash(self.name)
+
+
+class DoneeTable:
+    """
+    Column oriented table of donees.
+
+    Weights and category codes are held in compact arrays so that operations
+    over every donee, such as normalising weights or grouping by category, do
+    not need to visit a `Donee` model for each row. `Donee` models are only
+    created for rows which are accessed by index.
+    """
+    def __init__(self, names: list[str], weights: "array[float]",
+                 category_codes: "array[int]", categories: list[str],
+                 urls: list[str]) -> None:
+        self.names = names
+        self.weights = weights
+        self.category_codes = category_codes
+        self.categories = categories
+        self.urls = urls
+        self._donees: dict[int, Donee] = {}
+
+    @classmethod
+    def from_donees(cls, donees: list[Donee]) -> "DoneeTable":
+        """Build a table from a list of donees."""
+        categories: dict[str, int] = {}
+        category_codes = array("l", [
+            categories.setdefault(donee.category, len(categories))
+            for donee in donees
+        ])
+
+        return cls(
+            names=[donee.name for donee in donees],
+            weights=array("d", [donee.weight for donee in donees]),
+            category_codes=category_codes,
+            categories=list(categories),
+            urls=[donee.url for donee in donees]
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, index: int) -> Donee:
+        """Return the donee in row `index`."""
+        try:
+            donee = self._donees[index]
+        except KeyError:
+            donee = Donee(
+                name=self.names[index],
+                weight=self.weights[index],
+                category=self.categories[self.category_codes[index]],
+                url=self.urls[index]
+            )
+            self._donees[index] = donee
+        return donee
+
+    @cached_property
+    def sampler(self) -> "AliasSampler":
+        """Alias sampler for the donees in this table."""
+        from .sampler import AliasSampler
+        return AliasSampler(self)
+
+
+# Collections of donees accepted by the maths and sampling functions
+Donees = Union[list[Donee], DoneeTable]
+
+
+def weights(donees: Donees) -> list[float]:
+    """Get weights from donees."""
+    if isinstance(donees, DoneeTable):
+        return donees.weights.tolist()
+    return [donee.weight for donee in donees]
@@ -0,0 +1,249 @@
+"""Generate, display and record donations."""
+from . import output
+from .configuration import Configuration
+from .donee import Donee, Donees
+from .maths import (split_decimal, single_donation, catch_up_donation,
+                    distinct_donation, balanced_donation)
+from .plan import advance_plan, planned_donations
+from .profiling import Profiler
+from .sampler import Sampler, get_donee_table
+from .schedule import schedule_map, Schedule, AdHoc
+from .state import state_lock
+from .storage import Storage, storage_map
+from collections import Counter
+from contextlib import ExitStack
+from random import Random
+from tabulate import tabulate
+from typing import Any, Iterator, Optional
+
+
+def generate_donations(config: Configuration,
+                       donees: Optional[Donees] = None, ad_hoc: bool = False,
+                       dry_run: bool = False,
+                       profiler: Optional[Profiler] = None,
+                       sampler: Optional[Sampler] = None,
+                       rng: Optional[Random] = None,
+                       storage: Optional[Storage] = None,
+                       distinct: bool = False,
+                       balanced: bool = False, plan: bool = False) -> str:
+    """
+    Generate any donations which are due, record them unless this is a dry
+    run and return a description of the donations.
+
+    `donees` may be given to reuse a prepared `DoneeTable` of the
+    configuration's donees and `sampler` to reuse a sampler of them. Donations
+    are drawn using `rng` if given, so that they can be reproduced, in which
+    case `sampler` is not used, and
+    recorded in `storage` if given. If `distinct` is true each donation is
+    split between distinct donees and if `balanced` is true donations go to
+    the donees furthest below their share of the recorded donations. If
+    `plan` is true donations are taken from the donation plan, when there is
+    one.
+    """
+    if profiler is None:
+        profiler = Profiler(enabled=False)
+
+    due_donations, individual_donations = make_donations(
+        config, donees, ad_hoc, dry_run, profiler, sampler, rng, storage,
+        distinct, balanced, plan
+    )
+
+    output = []
+    if not ad_hoc and schedule_map[config.schedule] is not AdHoc:
+        if due_donations == 0:
+            return "No donations due"
+        else:
+            output.append(f"{due_donations} donations due")
+
+    with profiler.phase("formatting"):
+        output.append(format_donations(individual_donations,
+                                       config.currency_symbol,
+                                       config.decimal_currency))
+
+    return "\n".join(output)
+
+
+def make_donations(
+    config: Configuration, donees: Optional[Donees] = None,
+    ad_hoc: bool = False, dry_run: bool = False,
+    profiler: Optional[Profiler] = None, sampler: Optional[Sampler] = None,
+    rng: Optional[Random] = None, storage: Optional[Storage] = None,
+    distinct: bool = False, balanced: bool = False, plan: bool = False
+) -> tuple[int, Counter[Donee]]:
+    """
+    Generate any donations which are due and record them unless this is a dry
+    run.
+
+    Donations are recorded in `storage` if given, otherwise in the
+    configuration's storage backend. If `distinct` is true the parts of each
+    donation go to distinct donees. If `balanced` is true the parts go to the
+    donees furthest below their share of the donations in the storage, rather
+    than being drawn at random, reading the totals holding the storage lock.
+
+    If `plan` is true, and donations are otherwise drawn at random without a
+    given `rng`, due donations are taken from the donation plan when enough
+    planned rounds remain. The plan is read and advanced holding the state
+    lock.
+
+    Returns the number of scheduled donations which were due and the
+    individual donations.
+    """
+    if distinct and balanced:
+        raise ValueError(
+            "Distinct and balanced donations cannot be made together"
+        )
+
+    if profiler is None:
+        profiler = Profiler(enabled=False)
+
+    if donees is None:
+        donees = get_donee_table(config.donees)
+
+    if storage is None:
+        storage = storage_map[config.storage]()
+
+    # Create instance of schedule object
+    if ad_hoc:
+        schedule: Schedule = AdHoc()
+    else:
+        schedule = schedule_map[config.schedule]()
+
+    # Seeded donations are always drawn with the alias sampler of the donees,
+    # so that the same seed gives the same donations whichever sampler the
+    # caller keeps
+    if rng is not None:
+        sampler = None
+
+    # Planned rounds stand in for donations drawn at random
+    plan = plan and not (distinct or balanced) and rng is None
+
+    with ExitStack() as stack:
+        # Hold the storage lock from reading the last donation until the
+        # donations are recorded so that concurrent runs cannot both make a
+        # due donation. Ad hoc donations are always due and need not wait,
+        # unless they are balanced against the totals of earlier rounds.
+        if not isinstance(schedule, AdHoc) or balanced:
+            stack.enter_context(storage.lock())
+        # The plan is shared by every run using the data directory, whatever
+        # the schedule or storage, so that no two runs take the same round
+        if plan:
+            stack.enter_context(state_lock())
+
+        due_donations, individual_donations = _draw_donations(
+            config, donees, schedule, dry_run, profiler, sampler, rng,
+            storage, distinct, balanced, plan
+        )
+
+    if due_donations == 0 or dry_run:
+        return due_donations, individual_donations
+
+    # Commit this round along with any others waiting, timing each write
+    storage.commit(profiler)
+
+    return due_donations, individual_donations
+
+
+def _draw_donations(
+    config: Configuration, donees: Donees, schedule: Schedule, dry_run: bool,
+    profiler: Profiler, sampler: Optional[Sampler], rng: Optional[Random],
+    storage: Storage, distinct: bool, balanced: bool, plan: bool
+) -> tuple[int, Counter[Donee]]:
+    with profiler.phase("schedule"):
+        # Determine number of donations due
+        last_donation = None
+        if not isinstance(schedule, AdHoc):
+            last_donation = storage.get_last_donation()
+        due_donations = schedule.due_donations(last_donation)
+
+    if due_donations == 0:
+        return due_donations, Counter()
+
+    with profiler.phase("sampling"):
+        planned = None
+        if plan:
+            planned = planned_donations(config, donees, due_donations)
+
+        # Get individual donations, drawing the number of parts each donee
+        # receives directly when catching up on several due donations
+        if planned is not None:
+            individual_donations = planned[0]
+        elif balanced:
+            # Due donations are allocated together, towards the shares of the
+            # totals after all of them
+            individual_donations = balanced_donation(
+                donees,
+                config.total_donation * due_donations,
+                config.split * due_donations,
+                storage.totals()[0],
+                config.decimal_currency
+            )
+        elif distinct:
+            # Each due donation is split between distinct donees
+            individual_donations = Counter()
+            for _ in range(due_donations):
+                individual_donations += distinct_donation(
+                    donees, config.total_donation, config.split,
+                    config.decimal_currency, rng
+                )
+        elif due_donations > 1:
+            individual_donations = catch_up_donation(
+                donees,
+                config.total_donation * due_donations,
+                config.split * due_donations,
+                config.decimal_currency,
+                rng
+            )
+        else:
+            individual_donations = single_donation(
+                donees, config.total_donation, config.split,
+                config.decimal_currency, sampler, rng
+            )
+
+    # Return before updating any files if this is a dry run
+    if dry_run:
+        return due_donations, individual_donations
+
+    with profiler.phase("record"):
+        # Move past the planned rounds before recording them, so that should
+        # this run be interrupted the rounds are skipped rather than taken
+        # again
+        if planned is not None:
+            advance_plan(planned[1])
+        storage.record_donations(individual_donations,
+                                 config.currency_symbol,
+                                 config.decimal_currency)
+
+    return due_donations, individual_donations
+
+
+def format_donations(donations: dict[Donee, int], currency_symbol: str,
+                     decimal_currency: bool) -> str:
+    table: list[tuple[str, str, str]] = []
+    for donee, amount in _by_amount(donations):
+        if decimal_currency:
+            whole, hundreths = split_decimal(amount)
+            amount_str: str = f"{whole}.{hundreths:02d}"
+        else:
+            amount_str = f"{amount}"
+
+        amount_str = f"{currency_symbol}{amount_str}"
+        table.append((donee.name, amount_str, donee.url))
+
+    return tabulate(table)
+
+
+def donation_rows(donations: dict[Donee, int], currency_symbol: str,
+                  decimal_currency: bool) -> Iterator[dict[str, Any]]:
+    """Yield a row for each donation, largest first."""
+    for donee, amount in _by_amount(donations):
+        yield {
+            "donee": donee.name,
+            "amount": output.amount(amount, decimal_currency),
+            "currency_symbol": currency_symbol,
+            "url": donee.url
+        }
+
+
+def _by_amount(donations: dict[Donee, int]) -> list[tuple[Donee, int]]:
+    """Sort donations by their integer amounts, largest first."""
+    return sorted(donations.items(), key=lambda item: item[1], reverse=True)
@@ -1,52 +1,362 @@
+from . import output
 from .donee import Donee
 from .maths import split_decimal
+from .paths import data_path, write_atomic
 from collections import Counter
+from datetime import datetime
 import json
+import os
 from pathlib import Path
 from tabulate import tabulate
-from typing import Union
-from xdg import BaseDirectory  # type: ignore
+from typing import Any, Iterator, Optional, Union
+
+# Size in bytes the journal may grow to before it is compacted into the
+# ledger snapshot
+COMPACTION_SIZE = 1024 * 1024
+
+# Total and number of donations by month, then category
+Rollups = dict[str, dict[str, list[int]]]
+
+rollup_periods = ["month", "year", "category"]
 
 
 def _ledger_path() -> Path:
-    data_path = Path(BaseDirectory.save_data_path("donate"))
-    return data_path / "ledger.json"
+    return data_path() / "ledger.json"
 
 
-def _get_ledger() -> dict[str, Counter[str]]:
-    """Return the existing ledger or create an empty ledger."""
+def _journal_path() -> Path:
+    """
+    Path of the ledger journal, an append-only log of donations made since
+    the ledger snapshot was last compacted.
+    """
+    return _ledger_path().with_suffix(".journal")
+
+
+def _read_snapshot() -> tuple[int, dict[str, Counter[str]], Rollups]:
+    """
+    Return the sequence number of the last journal entry included in the
+    ledger snapshot, the snapshot and its rollups, or an empty snapshot.
+    """
     try:
         with open(_ledger_path(), "r") as ledger_file:
             ledger_dict = json.load(ledger_file)
+            sequence: int = ledger_dict.get("sequence", 0)
             ledger: dict[str, Counter[str]] = dict(
                 total=Counter(ledger_dict["total"]),
                 number=Counter(ledger_dict["number"])
             )
+            rollups: Rollups = ledger_dict.get("rollups", {})
     except FileNotFoundError:
+        sequence = 0
         ledger = {"total": Counter(), "number": Counter()}
+        rollups = {}
 
-    return ledger
+    return sequence, ledger, rollups
 
 
-def update_ledger(donations: Counter[Donee]) -> None:
-    ledger = _get_ledger()
+def _read_journal() -> Iterator[dict[str, Any]]:
+    """Yield each entry in the journal."""
+    try:
+        with open(_journal_path(), "r") as journal_file:
+            for line in journal_file:
+                if line.strip():
+                    yield json.loads(line)
+    except FileNotFoundError:
+        return
+
+
+def _last_line(path: Path) -> Optional[bytes]:
+    """Return the last line of a file without reading the whole file."""
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        block = 4096
+        while True:
+            start = max(0, end - block)
+            f.seek(start)
+            lines = f.read(end - start).rstrip(b"\n").rsplit(b"\n", 1)
+            if len(lines) == 2 or start == 0:
+                return lines[-1] or None
+            block *= 2
+
+
+def _last_sequence() -> int:
+    """Return the sequence number of the latest ledger entry."""
+    try:
+        last_line = _last_line(_journal_path())
+    except FileNotFoundError:
+        last_line = None
+
+    if last_line is None:
+        sequence, _, _ = _read_snapshot()
+        return sequence
+
+    last_sequence: int = json.loads(last_line)["sequence"]
+    return last_sequence
+
+
+def _read_ledger() -> tuple[dict[str, Counter[str]], Rollups]:
+    """
+    Rebuild the ledger and its rollups from the snapshot and any later
+    journal entries.
+    """
+    sequence, ledger, rollups = _read_snapshot()
     total = ledger["total"]
     number = ledger["number"]
 
+    for entry in _read_journal():
+        # Skip entries already included in the snapshot
+        if entry["sequence"] <= sequence:
+            continue
+
+        for name, amount in entry.get("donations", {}).items():
+            total[name] += amount
+            number[name] += 1
+
+        # Entries written before rollups were kept have no date
+        if "date" in entry:
+            month = rollups.setdefault(entry["date"][:7], {})
+            for category, (amount, count) in entry["categories"].items():
+                month_totals = month.setdefault(category, [0, 0])
+                month_totals[0] += amount
+                month_totals[1] += count
+
+    return ledger, rollups
+
+
+def _get_ledger() -> dict[str, Counter[str]]:
+    """Return the existing ledger or create an empty ledger."""
+    ledger, _ = _read_ledger()
+    return ledger
+
+
+def get_rollups() -> Rollups:
+    """Return the total and number of donations by month and category."""
+    _, rollups = _read_ledger()
+    return rollups
+
+
+def rollups_between(rollups: Rollups, since: Optional[str] = None,
+                    until: Optional[str] = None) -> Rollups:
+    """Return the months of rollups from `since` to `until`, if given."""
+    return {
+        month: categories for month, categories in rollups.items()
+        if (since is None or month >= since)
+        and (until is None or month <= until)
+    }
+
+
+def compact_ledger() -> None:
+    """Fold the journal into the ledger snapshot and clear the journal."""
+    ledger, rollups = _read_ledger()
+    replace_ledger(ledger, rollups)
+
+
+def replace_ledger(ledger: dict[str, Counter[str]], rollups: Rollups) -> None:
+    """Replace the ledger snapshot and clear the journal."""
+    sequence = _last_sequence()
+
+    # Write the snapshot first. Should the journal not be cleared, entries
+    # already in the snapshot are skipped by their sequence number.
+    write_atomic(
+        _ledger_path(),
+        json.dumps(dict(sequence=sequence, rollups=rollups, **ledger),
+                   indent=2)
+    )
+
+    # Keep a marker of the latest sequence number in the journal so that
+    # appending does not need to read the snapshot
+    write_atomic(_journal_path(), json.dumps({"sequence": sequence}) + "\n")
+
+
+def journal_entry(donations: Counter[Donee],
+                  time: Optional[datetime] = None) -> dict[str, Any]:
+    """
+    Create a journal entry for a round of donations made at `time`, or now.
+
+    The entry holds the amount donated to each donee and the total and number
+    of donations to each category, which are added to the rollups.
+    """
+    if time is None:
+        time = datetime.today()
+
+    categories: dict[str, list[int]] = {}
     for donee, amount in donations.items():
-        name = donee.name
-        total[name] += amount
-        number[name] += 1
+        category_totals = categories.setdefault(donee.category, [0, 0])
+        category_totals[0] += amount
+        category_totals[1] += 1
+
+    return {
+        "date": time.date().isoformat(),
+        "donations": {
+            donee.name: amount for donee, amount in donations.items()
+        },
+        "categories": categories
+    }
+
+
+def update_ledger(donations: Counter[Donee]) -> None:
+    size = append_journal([journal_entry(donations)])
+
+    if size > COMPACTION_SIZE:
+        compact_ledger()
+
+
+def append_journal(entries: list[dict[str, Any]],
+                   sync: bool = False) -> int:
+    """
+    Append entries, each numbered with the next sequence number, to the
+    journal and return the size of the journal.
+
+    Entries are flushed to disk if `sync` is true.
+    """
+    sequence = _last_sequence()
+
+    lines = []
+    for entry in entries:
+        sequence += 1
+        lines.append(json.dumps({"sequence": sequence, **entry}) + "\n")
+
+    with open(_journal_path(), "a") as journal_file:
+        journal_file.writelines(lines)
+        size = journal_file.tell()
+
+        if sync:
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+    return size
+
+
+def journal_intents() -> set[str]:
+    """Return the identifiers of intents recorded in the journal."""
+    return {
+        entry["intent"] for entry in _read_journal() if "intent" in entry
+    }
+
+
+def _rollup_table(
+    rollups: Rollups, by: str, since: Optional[str], until: Optional[str]
+) -> list[tuple[str, int, int, Optional[float]]]:
+    """
+    Total rollups by month, year or category and compare months and years
+    with the previous period and categories with the total.
+    """
+    if by not in rollup_periods:
+        raise ValueError(f"Breakdown '{by}' is not valid")
 
-    with open(_ledger_path(), "w") as ledger_file:
-        json.dump(ledger, ledger_file, indent=2)
+    totals: dict[str, list[int]] = {}
+    for month, categories in rollups_between(rollups, since, until).items():
+        for category, (amount, count) in categories.items():
+            if by == "month":
+                key = month
+            elif by == "year":
+                key = month[:4]
+            else:
+                key = category
+
+            key_totals = totals.setdefault(key, [0, 0])
+            key_totals[0] += amount
+            key_totals[1] += count
+
+    table: list[tuple[str, int, int, Optional[float]]] = []
+    if by == "category":
+        grand_total = sum(amount for amount, _ in totals.values())
+        for key, (amount, count) in sorted(
+            totals.items(), key=lambda item: item[1][0], reverse=True
+        ):
+            table.append((key, amount, count, amount / grand_total))
+    else:
+        previous: Optional[int] = None
+        for key, (amount, count) in sorted(totals.items()):
+            change = None if previous is None else amount - previous
+            table.append((key, amount, count, change))
+            previous = amount
+
+    return table
+
+
+def rollup_stats(rollups: Rollups, by: str, currency_symbol: str,
+                 decimal_currency: bool, since: Optional[str] = None,
+                 until: Optional[str] = None) -> str:
+    """
+    Create a table of the total and number of donations by month, year or
+    category from rollups.
+
+    Only months from `since` to `until`, given as 'YYYY-MM', are included.
+    Months and years are compared with the previous period and categories
+    with the total.
+    """
+    scale = 100 if decimal_currency else 1
+    money_format = ".2f" if decimal_currency else "g"
+
+    table = []
+    for key, amount, count, trend in _rollup_table(rollups, by, since,
+                                                   until):
+        if by != "category" and trend is not None:
+            trend /= scale
+        table.append([key, amount / scale, count, trend])
+
+    if by == "category":
+        trend_header = "Share"
+        trend_format = ".1%"
+    else:
+        trend_header = f"Change / {currency_symbol}"
+        trend_format = "+" + money_format
+
+    return tabulate(
+        table,
+        headers=[by.capitalize(), f"Total / {currency_symbol}",
+                 "Number of donations", trend_header],
+        floatfmt=["", money_format, "", trend_format],
+        missingval="-",
+        disable_numparse=[0]
+    )
+
+
+def rollup_rows(rollups: Rollups, by: str, decimal_currency: bool,
+                since: Optional[str] = None,
+                until: Optional[str] = None) -> Iterator[dict[str, Any]]:
+    """Yield the rows of `rollup_stats`."""
+    for key, amount, count, trend in _rollup_table(rollups, by, since,
+                                                   until):
+        row: dict[str, Any] = {
+            by: key,
+            "total": output.amount(amount, decimal_currency),
+            "number": count
+        }
+        if by == "category":
+            row["share"] = trend
+        else:
+            row["change"] = None if trend is None else output.amount(
+                int(trend), decimal_currency
+            )
+        yield row
+
+
+def stats_rows(total: dict[str, int], number: dict[str, int],
+               decimal_currency: bool) -> Iterator[dict[str, Any]]:
+    """
+    Yield the total and number of donations to each donee, largest total
+    first.
+    """
+    for donee, amount in sorted(total.items(), key=lambda item: item[1],
+                                reverse=True):
+        yield {
+            "donee": donee,
+            "total": output.amount(amount, decimal_currency),
+            "number": number.get(donee, 0)
+        }
 
 
 def ledger_stats(currency_symbol: str, decimal_currency: bool) -> str:
     ledger = _get_ledger()
-    total = ledger["total"]
-    number = ledger["number"]
+    return format_stats(ledger["total"], ledger["number"], currency_symbol,
+                        decimal_currency)
+
 
+def format_stats(total: dict[str, int], number: dict[str, int],
+                 currency_symbol: str, decimal_currency: bool) -> str:
+    """Create tables of the total and number of donations to each donee."""
     total_output: dict[str, Union[float, int]] = dict()
     if decimal_currency:
         for donee, amount in total.items():
@@ -1,31 +1,328 @@
 from .donee import Donee
+from .paths import data_path, write_atomic
+from bisect import bisect_left
 from collections import Counter
-from csv import writer
+from csv import reader, writer
 from datetime import date
+import gzip
+from io import StringIO
+import json
+import os
 from pathlib import Path
-from typing import Union
-from xdg import BaseDirectory  # type: ignore
+import shutil
+from typing import (Any, Iterable, Iterator, Mapping, NamedTuple, Optional,
+                    Union)
+
+
+class LogRecord(NamedTuple):
+    """A donation read from the log."""
+    date: date
+    donee: str
+    currency_symbol: str
+    amount: Union[int, float]
 
 
 def _log_path() -> Path:
-    data_path = Path(BaseDirectory.save_data_path("donate"))
-    return data_path / "donation_log.csv"
+    return data_path() / "donation_log.csv"
+
+
+def _index_path(log_path: Optional[Path] = None) -> Path:
+    """
+    Path of the index of an uncompressed log segment, by default the
+    unsegmented log. The index holds the byte offset of the first record of
+    each month in the segment.
+    """
+    if log_path is None:
+        log_path = _log_path()
+    return log_path.with_suffix(".index")
 
 
 def update_log(donations: Counter[Donee], currency_symbol: str,
                decimal_currency: bool) -> None:
-    with open(_log_path(), "a", newline="") as csvfile:
-        log_writer = writer(csvfile)
+    append_log(log_rows(
+        {donee.name: amount for donee, amount in donations.items()},
+        currency_symbol, decimal_currency
+    ))
+
 
+def log_rows(donations: Mapping[str, int], currency_symbol: str,
+             decimal_currency: bool,
+             donation_date: Optional[str] = None) -> list[list[Any]]:
+    """Create log rows for donations to the donees named in `donations`."""
+    if donation_date is None:
         donation_date = date.today().isoformat()
 
-        for donee, amount in donations.items():
-            log_amount: Union[int, float]
-            if decimal_currency:
-                log_amount = amount / 100
+    rows = []
+    for name, amount in donations.items():
+        log_amount: Union[int, float]
+        if decimal_currency:
+            log_amount = amount / 100
+        else:
+            log_amount = amount
+
+        rows.append([donation_date, name, currency_symbol, log_amount])
+
+    return rows
+
+
+def _segment_path(year: str) -> Path:
+    """Path of the log segment of donations made in `year`."""
+    log_path = _log_path()
+    return log_path.with_name(f"{log_path.stem}-{year}{log_path.suffix}")
+
+
+def _segment_year(path: Path) -> Optional[str]:
+    """Return the year of a log segment, or `None` for an unsegmented log."""
+    if path == _log_path():
+        return None
+    return path.name[len(_log_path().stem) + 1:][:4]
+
+
+def log_segments() -> list[Path]:
+    """
+    Return the paths of the log segments in date order.
+
+    A log written before segmentation is read first. Each year's segment is
+    compressed once a later year's segment has been started. Should both a
+    compressed and uncompressed segment exist for a year, as when
+    compression was interrupted, the uncompressed segment is used.
+    """
+    log_path = _log_path()
+    segments: dict[str, Path] = {}
+    for pattern in [f"{log_path.stem}-*{log_path.suffix}.gz",
+                    f"{log_path.stem}-*{log_path.suffix}"]:
+        for path in log_path.parent.glob(pattern):
+            year = _segment_year(path)
+            if year is not None and year.isdigit():
+                segments[year] = path
+
+    paths = [segments[year] for year in sorted(segments)]
+    if log_path.exists():
+        paths.insert(0, log_path)
+    return paths
+
+
+def append_log(rows: list[list[Any]], sync: bool = False,
+               rotate: bool = True) -> None:
+    """
+    Append rows to the log segment of the year they were made in, flushing
+    them to disk if `sync` is true, then compress any closed segments if
+    `rotate` is true.
+    """
+    rows_by_year: dict[str, list[list[Any]]] = {}
+    for row in rows:
+        rows_by_year.setdefault(row[0][:4], []).append(row)
+
+    for year, year_rows in rows_by_year.items():
+        segment_path = _segment_path(year)
+        compressed_path = segment_path.with_name(segment_path.name + ".gz")
+        if compressed_path.exists() and not segment_path.exists():
+            # Add late records for a closed year to its archive
+            segment_path = compressed_path
+
+        csvfile = StringIO(newline="")
+        log_writer = writer(csvfile)
+        log_writer.writerows(year_rows)
+        data = csvfile.getvalue().encode()
+
+        with open(segment_path, "ab") as segment_file:
+            if segment_path.suffix == ".gz":
+                # Appending adds a member to the archive
+                with gzip.GzipFile(fileobj=segment_file,
+                                   mode="ab") as compressed_file:
+                    compressed_file.write(data)
             else:
-                log_amount = amount
+                segment_file.write(data)
+
+            if sync:
+                segment_file.flush()
+                os.fsync(segment_file.fileno())
+
+    if rotate:
+        rotate_log()
+
+
+def log_sizes() -> dict[str, int]:
+    """Return the size of each log segment, by file name."""
+    return {path.name: path.stat().st_size for path in log_segments()}
+
+
+def restore_log(sizes: Mapping[str, int]) -> None:
+    """
+    Return the log to the segment sizes `sizes` from `log_sizes`, removing
+    anything appended since, including segments which have been created.
+    Segments must not have been rotated since.
+    """
+    for path in log_segments():
+        if path.name not in sizes:
+            path.unlink()
+        elif path.stat().st_size > sizes[path.name]:
+            os.truncate(path, sizes[path.name])
+        else:
+            continue
+        # Records may have been indexed past the restored size
+        _index_path(path).unlink(missing_ok=True)
+
+
+def rotate_log() -> None:
+    """Compress each uncompressed log segment older than the latest."""
+    segments = [
+        path for path in log_segments() if _segment_year(path) is not None
+    ]
+    for path in segments[:-1]:
+        if path.suffix == ".gz":
+            continue
+
+        compressed_path = path.with_name(path.name + ".gz")
+        tmp_path = compressed_path.with_name(
+            f"{compressed_path.name}.{os.getpid()}.tmp"
+        )
+        with open(path, "rb") as segment_file:
+            with gzip.open(tmp_path, "wb") as compressed_file:
+                shutil.copyfileobj(segment_file, compressed_file)
+        with open(tmp_path, "rb") as compressed_file:
+            os.fsync(compressed_file.fileno())
+        os.replace(tmp_path, compressed_path)
+
+        path.unlink()
+        _index_path(path).unlink(missing_ok=True)
+
+
+def _parse_record(line: bytes) -> LogRecord:
+    donation_date, donee, currency_symbol, amount = next(
+        reader([line.decode()])
+    )
+    return LogRecord(
+        date.fromisoformat(donation_date), donee, currency_symbol,
+        float(amount) if "." in amount else int(amount)
+    )
+
+
+def _read_index(log_path: Path) -> dict[str, Any]:
+    try:
+        with open(_index_path(log_path), "r") as index_file:
+            index: dict[str, Any] = json.load(index_file)
+            return index
+    except FileNotFoundError:
+        return {"size": 0, "ordered": True, "months": {}}
+
+
+def update_index(log_path: Optional[Path] = None) -> dict[str, Any]:
+    """
+    Bring the index of an uncompressed log segment, by default the
+    unsegmented log, up to date and return it.
+
+    Only records appended since the index was last updated are read. The
+    index is marked unordered if a record follows one from a later month, in
+    which case readers scan the whole segment.
+    """
+    if log_path is None:
+        log_path = _log_path()
+    index = _read_index(log_path)
+
+    try:
+        size = log_path.stat().st_size
+    except FileNotFoundError:
+        size = 0
+    if size < index["size"]:
+        # The log has been replaced, index it from the start
+        index = {"size": 0, "ordered": True, "months": {}}
+    if size == index["size"]:
+        return index
+
+    months: dict[str, int] = index["months"]
+    last_month = max(months, default="")
+    offset = index["size"]
+    with open(log_path, "rb") as log_file:
+        log_file.seek(offset)
+        for line in log_file:
+            if not line.endswith(b"\n"):
+                # Leave a partly written record to be indexed later
+                break
+
+            month = line[:7].decode()
+            if month > last_month:
+                months[month] = offset
+                last_month = month
+            elif month < last_month:
+                index["ordered"] = False
+
+            offset += len(line)
+
+    index["size"] = offset
+    write_atomic(_index_path(log_path), json.dumps(index))
+
+    return index
+
+
+def read_log(since: Optional[date] = None,
+             until: Optional[date] = None) -> Iterator[LogRecord]:
+    """
+    Yield the records in the log, optionally only those made on or after
+    `since` and on or before `until`.
+
+    Segments of years outside the range are skipped. Compressed segments are
+    decompressed as they are read. In uncompressed segments the index is used
+    to start reading at the first month which may contain records after
+    `since` and to stop after the month of `until`.
+    """
+    for path in log_segments():
+        year = _segment_year(path)
+        if year is not None:
+            if since is not None and year < f"{since.year:04d}":
+                continue
+            if until is not None and year > f"{until.year:04d}":
+                break
+
+        if path.suffix == ".gz":
+            with gzip.open(path, "rb") as segment_file:
+                yield from _read_lines(segment_file, since, until, False)
+        else:
+            yield from _read_segment(path, since, until)
+
+
+def _read_segment(path: Path, since: Optional[date],
+                  until: Optional[date]) -> Iterator[LogRecord]:
+    index = update_index(path)
+    ordered = index["ordered"]
+    months = sorted(index["months"])
+
+    offset = 0
+    if since is not None and ordered:
+        position = bisect_left(months, since.isoformat()[:7])
+        if position == len(months):
+            return
+        offset = index["months"][months[position]]
+
+    try:
+        log_file = open(path, "rb")
+    except FileNotFoundError:
+        return
+
+    with log_file:
+        log_file.seek(offset)
+        yield from _read_lines(log_file, since, until, ordered)
+
+
+def _read_lines(lines: Iterable[bytes], since: Optional[date],
+                until: Optional[date], ordered: bool) -> Iterator[LogRecord]:
+    """
+    Parse and filter log lines. When the lines are in month order, stop after
+    the month of `until`.
+    """
+    until_month = until.isoformat()[:7] if until is not None else None
+
+    for line in lines:
+        if not line.endswith(b"\n"):
+            break
+
+        if (ordered and until_month is not None
+                and line[:7].decode() > until_month):
+            break
 
-            log_writer.writerow(
-                [donation_date, donee.name, currency_symbol, log_amount]
-            )
+        record = _parse_record(line)
+        if since is not None and record.date < since:
+            continue
+        if until is not None and record.date > until:
+            continue
+        yield record
@@ -1,7 +1,13 @@
 """Mathematical and statistical operations."""
-from .donee import Donee
+from .donee import Donee, Donees, DoneeTable, weights
+from .sampler import (Sampler, get_sampler, multinomial, sample_distinct,
+                      sample_distinct_indices)
+from .streams import blocks, new_seed, stream
 from collections import Counter, defaultdict
-from random import choices
+from heapq import heapify, heapreplace
+from math import sqrt
+from random import Random
+from typing import Any, Iterator, Mapping, Optional
 from tabulate import tabulate
 
 
@@ -12,12 +18,28 @@ def split_decimal(amount: int) -> tuple[int, int]:
     return whole, hundreths
 
 
-def weights(donees: list[Donee]) -> list[float]:
-    """Get weights from donees."""
-    return [donee.weight for donee in donees]
+def names(donees: Donees) -> list[str]:
+    """Get names from donees."""
+    if isinstance(donees, DoneeTable):
+        return donees.names
+    return [donee.name for donee in donees]
 
 
-def normalised_weights(donees: list[Donee]) -> list[float]:
+def _category_totals(donees: Donees, values: list[float]) -> dict[str, float]:
+    """Sum values for each category of donee."""
+    if isinstance(donees, DoneeTable):
+        totals = [0.] * len(donees.categories)
+        for code, value in zip(donees.category_codes, values):
+            totals[code] += value
+        return dict(zip(donees.categories, totals))
+
+    category_totals: defaultdict[str, float] = defaultdict(float)
+    for donee, value in zip(donees, values):
+        category_totals[donee.category] += value
+    return category_totals
+
+
+def normalised_weights(donees: Donees) -> list[float]:
     """Calculate the normalised weights of each donee."""
 
     n_weights = weights(donees)
@@ -27,9 +49,9 @@ def normalised_weights(donees: list[Donee]) -> list[float]:
     return n_weights
 
 
-def single_donation(donees: list[Donee], total_donation: int, split: int,
-                    decimal_currency: bool = False) -> Counter[Donee]:
-    """Generate a single donation."""
+def _individual_donation(total_donation: int, split: int,
+                         decimal_currency: bool) -> int:
+    """Calculate the amount of each part of a split donation."""
     # When using a decimal currency allow spliting donations into hundreths
     if decimal_currency:
         total_donation *= 100
@@ -41,13 +63,26 @@ def single_donation(donees: list[Donee], total_donation: int, split: int,
             f"donation amount {total_donation}."
             )
 
-    individual_donation = total_donation // split
+    return total_donation // split
+
 
-    selected = choices(
-        donees,
-        weights=weights(donees),
-        k=split
-        )
+def single_donation(donees: Donees, total_donation: int, split: int,
+                    decimal_currency: bool = False,
+                    sampler: Optional[Sampler] = None,
+                    rng: Optional[Random] = None) -> Counter[Donee]:
+    """
+    Generate a single donation.
+
+    Donees are drawn using `sampler` if given, otherwise using an alias
+    sampler for `donees`. Random numbers are drawn from `rng` if given,
+    otherwise from the `random` module.
+    """
+    individual_donation = _individual_donation(total_donation, split,
+                                               decimal_currency)
+
+    if sampler is None:
+        sampler = get_sampler(donees)
+    selected = sampler.sample(split, rng)
 
     individual_donations: Counter[Donee] = Counter()
     for donee in selected:
@@ -56,34 +91,208 @@ def single_donation(donees: list[Donee], total_donation: int, split: int,
     return individual_donations
 
 
-def _means(donees: list[Donee], total_donation: int) -> list[float]:
+def catch_up_donation(donees: Donees, total_donation: int, split: int,
+                      decimal_currency: bool = False,
+                      rng: Optional[Random] = None) -> Counter[Donee]:
+    """
+    Generate a large donation, such as when many scheduled donations are due.
+
+    The result has the same distribution as `single_donation` but the number
+    of parts each donee receives is drawn from a multinomial distribution, so
+    the cost does not grow with `split`.
+    """
+    individual_donation = _individual_donation(total_donation, split,
+                                               decimal_currency)
+
+    counts = multinomial(donees, split, rng)
+
+    individual_donations: Counter[Donee] = Counter()
+    for donee, count in counts.items():
+        individual_donations[donee] = count * individual_donation
+
+    return individual_donations
+
+
+def balanced_donation(donees: Donees, total_donation: int, split: int,
+                      totals: Mapping[str, int],
+                      decimal_currency: bool = False) -> Counter[Donee]:
+    """
+    Generate a donation which moves the donees' totals towards their target
+    shares.
+
+    `totals` is the amount each donee has received so far, by name. Each part
+    of the donation is given to the donee furthest below its share of the
+    donees' totals including this donation. Donees are kept in a heap by
+    deficit so that, after building the heap, each part costs O(log n).
+    """
+    individual_donation = _individual_donation(total_donation, split,
+                                               decimal_currency)
+
+    donee_totals = [totals.get(name, 0) for name in names(donees)]
+    target_total = sum(donee_totals) + individual_donation * split
+
+    # Donees are keyed by their surplus, the negated deficit, as heapq keeps
+    # the smallest item first. Ties go to the earliest donee.
+    heap = [
+        (donee_total - weight * target_total, index)
+        for index, (weight, donee_total)
+        in enumerate(zip(normalised_weights(donees), donee_totals))
+    ]
+    heapify(heap)
+
+    parts = [0] * len(heap)
+    for _ in range(split):
+        surplus, index = heap[0]
+        parts[index] += 1
+        heapreplace(heap, (surplus + individual_donation, index))
+
+    return Counter({
+        donees[index]: count * individual_donation
+        for index, count in enumerate(parts) if count
+    })
+
+
+def distinct_donation(donees: Donees, total_donation: int, split: int,
+                      decimal_currency: bool = False,
+                      rng: Optional[Random] = None) -> Counter[Donee]:
+    """
+    Generate a single donation split between `split` distinct donees.
+
+    Donees are drawn without replacement, so no donee receives more than one
+    part.
+    """
+    individual_donation = _individual_donation(total_donation, split,
+                                               decimal_currency)
+
+    return Counter({
+        donee: individual_donation
+        for donee in sample_distinct(donees, split, rng)
+    })
+
+
+def inclusion_probabilities(donees: Donees, split: int, rounds: int,
+                            seed: Optional[int] = None) -> list[float]:
+    """
+    Estimate the probability that each donee is one of the `split` distinct
+    donees of a round from `rounds` simulated rounds.
+
+    There is no closed form for the inclusion probabilities of weighted
+    sampling without replacement. Rounds are drawn in blocks from the streams
+    of `seed`, or of a new seed, so estimates can be reproduced.
+    """
+    if seed is None:
+        seed = new_seed()
+
+    donee_weights = weights(donees)
+    counts = [0] * len(donee_weights)
+    for block, size in blocks(rounds):
+        rng = stream(seed, block)
+        for _ in range(size):
+            for index in sample_distinct_indices(donee_weights, split, rng):
+                counts[index] += 1
+
+    return [count / rounds for count in counts]
+
+
+def distinct_statistics(
+    donees: Donees, total_donation: int, split: int, rounds: int,
+    seed: Optional[int] = None
+) -> tuple[list[tuple[str, float, float]], list[tuple[str, float, float]]]:
+    """
+    Estimate the probability of inclusion and mean donation received by each
+    donee, and the expected number of donees included and mean donation
+    received by each category of donee, when a donation is split between
+    distinct donees.
+    """
+    probabilities = inclusion_probabilities(donees, split, rounds, seed)
+    part = total_donation / split
+
+    donee_rows = sorted(
+        [
+            (name, probability, probability * part)
+            for name, probability in zip(names(donees), probabilities)
+        ],
+        key=lambda elem: elem[1], reverse=True
+    )
+    category_rows = sorted(
+        [
+            (category, included, included * part)
+            for category, included
+            in _category_totals(donees, probabilities).items()
+        ],
+        key=lambda elem: elem[1], reverse=True
+    )
+    return donee_rows, category_rows
+
+
+def distinct_summary(donees: Donees, total_donation: int, split: int,
+                     currency_symbol: str, rounds: int,
+                     seed: Optional[int] = None) -> str:
+    """
+    Create tables summarising donations for donees and categories when a
+    donation is split between distinct donees.
+    """
+    donee_rows, category_rows = distinct_statistics(
+        donees, total_donation, split, rounds, seed
+    )
+
+    summary = "\n".join([
+        f"Mean donations from {currency_symbol}{total_donation} split between"
+        f" {split} distinct donees, from {rounds} simulated rounds",
+        "",
+        tabulate(donee_rows,
+                 headers=["Donee", "P(included)",
+                          f"Mean donation / {currency_symbol}"]),
+        "",
+        tabulate(category_rows,
+                 headers=["Category", "Mean included",
+                          f"Mean donation / {currency_symbol}"])
+    ])
+    return summary
+
+
+def distinct_rows(donees: Donees, total_donation: int, split: int,
+                  rounds: int,
+                  seed: Optional[int] = None) -> Iterator[dict[str, Any]]:
+    """
+    Yield the estimated inclusion and mean donation of each donee and then
+    each category of donee when a donation is split between distinct donees.
+    """
+    donee_rows, category_rows = distinct_statistics(
+        donees, total_donation, split, rounds, seed
+    )
+    for row_type, rows in [("donee", donee_rows),
+                           ("category", category_rows)]:
+        for name, included, mean in rows:
+            yield {"type": row_type, "name": name, "included": included,
+                   "mean": mean}
+
+
+def _means(donees: Donees, total_donation: int) -> list[float]:
     weights = normalised_weights(donees)
     return [weight * total_donation for weight in weights]
 
 
-def donee_means(donees: list[Donee],
+def donee_means(donees: Donees,
                 total_donation: int) -> list[tuple[str, float]]:
     """Calculate the mean donation received by each donee."""
-    names = [donee.name for donee in donees]
     means = _means(donees, total_donation)
-    return sorted(list(zip(names, means)), key=lambda elem: elem[1],
+    return sorted(list(zip(names(donees), means)), key=lambda elem: elem[1],
                   reverse=True)
 
 
-def category_means(donees: list[Donee],
+def category_means(donees: Donees,
                    total_donation: int) -> list[tuple[str, float]]:
     """Calculate the mean donation received by each category of donee."""
     means = _means(donees, total_donation)
 
-    category_means: defaultdict[str, float] = defaultdict(float)
-    for donee, mean in zip(donees, means):
-        category_means[donee.category] += mean
+    category_means = _category_totals(donees, means)
 
     return sorted(category_means.items(), key=lambda item: item[1],
                   reverse=True)
 
 
-def means_summary(donees: list[Donee], total_donation: int,
+def means_summary(donees: Donees, total_donation: int,
                   currency_symbol: str) -> str:
     """Create tables summarising mean donations for donees and categories."""
     means = "\n".join([
@@ -96,3 +305,91 @@ def means_summary(donees: list[Donee], total_donation: int,
                  headers=["Category", f"Mean donation / {currency_symbol}"])
     ])
     return means
+
+
+def _statistics(weight: float, total_donation: int,
+                split: int) -> tuple[float, float, float, float]:
+    """
+    Calculate the mean, variance, standard deviation and probability of
+    receiving at least one part of a donation for a normalised weight.
+
+    The number of parts received from `split` draws is binomially distributed.
+    """
+    part = total_donation / split
+    mean = weight * total_donation
+    variance = part * part * split * weight * (1. - weight)
+    p_any = 1. - (1. - weight) ** split
+    return mean, variance, sqrt(variance), p_any
+
+
+def donee_statistics(
+    donees: Donees, total_donation: int, split: int
+) -> list[tuple[str, float, float, float, float]]:
+    """
+    Calculate the mean, variance, standard deviation and probability of
+    receiving a donation for each donee.
+    """
+    statistics = [
+        (name, *_statistics(weight, total_donation, split))
+        for name, weight in zip(names(donees), normalised_weights(donees))
+    ]
+    return sorted(statistics, key=lambda elem: elem[1], reverse=True)
+
+
+def category_statistics(
+    donees: Donees, total_donation: int, split: int
+) -> list[tuple[str, float, float, float, float]]:
+    """
+    Calculate the mean, variance, standard deviation and probability of
+    receiving a donation for each category of donee.
+    """
+    category_weights = _category_totals(donees, normalised_weights(donees))
+
+    statistics = [
+        (category, *_statistics(weight, total_donation, split))
+        for category, weight in category_weights.items()
+    ]
+    return sorted(statistics, key=lambda elem: elem[1], reverse=True)
+
+
+def statistics_summary(donees: Donees, total_donation: int, split: int,
+                       currency_symbol: str) -> str:
+    """
+    Create tables summarising the distribution of donations for donees and
+    categories.
+    """
+    headers = [f"Mean / {currency_symbol}", f"Variance / {currency_symbol}²",
+               f"Standard deviation / {currency_symbol}", "P(any)"]
+
+    statistics = "\n".join([
+        f"Donation statistics from {currency_symbol}{total_donation} split"
+        f" {split} ways",
+        "",
+        tabulate(donee_statistics(donees, total_donation, split),
+                 headers=["Donee", *headers]),
+        "",
+        tabulate(category_statistics(donees, total_donation, split),
+                 headers=["Category", *headers])
+    ])
+    return statistics
+
+
+def means_rows(donees: Donees, total_donation: int, split: int,
+               statistics: bool = False) -> Iterator[dict[str, Any]]:
+    """
+    Yield the mean donation received by each donee and then each category of
+    donee, with the variance, standard deviation and probability of receiving
+    a donation if `statistics` is true.
+    """
+    for row_type, function in [("donee", donee_statistics),
+                               ("category", category_statistics)]:
+        for name, mean, variance, standard_deviation, p_any in function(
+            donees, total_donation, split
+        ):
+            row: dict[str, Any] = {"type": row_type, "name": name,
+                                   "mean": mean}
+            if statistics:
+                row.update(variance=variance,
+                           standard_deviation=standard_deviation,
+                           p_any=p_any)
+            yield row
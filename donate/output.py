@@ -0,0 +1,44 @@
+"""Streaming, machine-readable output of rows of results."""
+import csv
+import json
+import sys
+from typing import Any, Iterable, Optional, TextIO
+
+output_formats = ["table", "json", "csv", "ndjson"]
+
+
+def write_rows(rows: Iterable[dict[str, Any]], output_format: str,
+               file: Optional[TextIO] = None) -> None:
+    """
+    Write rows, each a dictionary with the same keys, as they are produced.
+
+    `output_format` is one of 'json', an array of objects, 'csv', with a
+    header of the first row's keys, or 'ndjson', one object per line.
+    """
+    if file is None:
+        file = sys.stdout
+
+    if output_format == "ndjson":
+        for row in rows:
+            file.write(json.dumps(row, ensure_ascii=False) + "\n")
+    elif output_format == "json":
+        separator = "[\n"
+        for row in rows:
+            file.write(separator + json.dumps(row, ensure_ascii=False))
+            separator = ",\n"
+        file.write("[]\n" if separator == "[\n" else "\n]\n")
+    elif output_format == "csv":
+        row_writer: Optional[csv.DictWriter[str]] = None
+        for row in rows:
+            if row_writer is None:
+                row_writer = csv.DictWriter(file, fieldnames=list(row),
+                                            lineterminator="\n")
+                row_writer.writeheader()
+            row_writer.writerow(row)
+    else:
+        raise ValueError(f"Output format '{output_format}' is not valid")
+
+
+def amount(value: int, decimal_currency: bool) -> float:
+    """Convert an integer amount, in hundredths if decimal, to currency."""
+    return value / 100 if decimal_currency else value
@@ -0,0 +1,46 @@
+"""Location and writing of the files donate keeps its state in."""
+import os
+from pathlib import Path
+from typing import Optional
+from xdg import BaseDirectory  # type: ignore
+
+_data_path: Optional[Path] = None
+# The XDG data directory, resolved once per process
+_default_data_path: Optional[Path] = None
+
+
+def set_data_path(path: Optional[Path]) -> None:
+    """
+    Keep state in `path` rather than the XDG data directory, or restore the
+    default if `path` is `None`.
+    """
+    global _data_path
+    if path is not None:
+        path.mkdir(parents=True, exist_ok=True)
+    _data_path = path
+
+
+def data_path() -> Path:
+    """Return the directory donate keeps its state in."""
+    global _default_data_path
+    if _data_path is not None:
+        return _data_path
+    if _default_data_path is None:
+        _default_data_path = Path(BaseDirectory.save_data_path("donate"))
+    return _default_data_path
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """
+    Replace the contents of a file in a single step.
+
+    The new contents are written and flushed to disk in a temporary file
+    which is then renamed over `path`, so readers see either the old or the
+    new contents and never a partial write.
+    """
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as tmp_file:
+        tmp_file.write(text)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.replace(tmp_path, path)
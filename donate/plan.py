@@ -0,0 +1,158 @@
+"""
+Plans of donations drawn in advance of when they are due.
+
+A plan file begins with a header line holding a fingerprint of the
+configuration its rounds were drawn from, followed by one line for each round
+listing the index of each donee receiving a part and the number of parts it
+receives. A cursor file holds the byte offset of the next round, so that
+taking a round reads only the header and that round's line.
+"""
+from .configuration import Configuration
+from .donee import Donee, Donees, DoneeTable
+from .maths import _individual_donation
+from .paths import data_path, write_atomic
+from .sampler import get_donee_table
+from collections import Counter
+from hashlib import sha256
+import json
+from pathlib import Path
+from random import Random
+from typing import Any, Optional
+
+
+def _plan_path() -> Path:
+    return data_path() / "plan"
+
+
+def _cursor_path() -> Path:
+    """File holding the byte offset of the next round in the plan."""
+    return data_path() / "plan_cursor"
+
+
+def config_fingerprint(config: Configuration) -> str:
+    """
+    Fingerprint the parts of a configuration which planned rounds depend on,
+    the donees, their weights and order, and how donations are split.
+    """
+    key = json.dumps({
+        "total_donation": config.total_donation,
+        "split": config.split,
+        "decimal_currency": config.decimal_currency,
+        "donees": [
+            [donee.name, donee.weight, donee.category, donee.url]
+            for donee in config.donees
+        ]
+    })
+    return sha256(key.encode()).hexdigest()[:16]
+
+
+def make_plan(config: Configuration, periods: int,
+              donees: Optional[Donees] = None,
+              rng: Optional[Random] = None) -> None:
+    """
+    Draw the donations of the next `periods` rounds and write them to the
+    plan, replacing any existing plan.
+
+    Every part of every round is drawn in a single pass of an alias sampler
+    of the donees.
+    """
+    if periods < 1:
+        raise ValueError(f"Periods '{periods}' is not valid")
+
+    if donees is None or not isinstance(donees, DoneeTable):
+        donees = get_donee_table(config.donees)
+
+    # Check the donation splits into whole parts before drawing
+    _individual_donation(config.total_donation, config.split,
+                         config.decimal_currency)
+
+    split = config.split
+    indices = donees.sampler.sample_indices(periods * split, rng)
+
+    header = json.dumps({"fingerprint": config_fingerprint(config),
+                         "periods": periods})
+    lines = [header]
+    for start in range(0, len(indices), split):
+        counts = Counter(indices[start:start + split])
+        lines.append(" ".join(
+            f"{index}:{count}" for index, count in sorted(counts.items())
+        ))
+
+    # Remove the cursor first so a stale cursor is never read with the new
+    # plan. Without a cursor the plan starts at its first round.
+    _cursor_path().unlink(missing_ok=True)
+    write_atomic(_plan_path(), "\n".join(lines) + "\n")
+
+
+def _read_header(plan_path: Path) -> tuple[dict[str, Any], int]:
+    """Return a plan's header and the byte offset of its first round."""
+    with open(plan_path, "rb") as plan_file:
+        header_line = plan_file.readline()
+    return json.loads(header_line), len(header_line)
+
+
+def plan_remaining() -> int:
+    """Return the number of rounds left in the plan."""
+    plan_path = _plan_path()
+    if not plan_path.exists():
+        return 0
+
+    _, first = _read_header(plan_path)
+    with open(plan_path, "rb") as plan_file:
+        plan_file.seek(_read_cursor(first))
+        return sum(1 for _ in plan_file)
+
+
+def _read_cursor(first: int) -> int:
+    try:
+        with open(_cursor_path(), "r") as cursor_file:
+            return int(cursor_file.read())
+    except FileNotFoundError:
+        return first
+
+
+def planned_donations(
+    config: Configuration, donees: Donees, rounds: int = 1
+) -> Optional[tuple[Counter[Donee], int]]:
+    """
+    Take the next `rounds` rounds from the plan, without removing them.
+
+    Returns the individual donations of the rounds and the byte offset of the
+    round following them, to pass to `advance_plan` once the donations are
+    recorded, or `None` if there is no plan or too few rounds remain. A plan
+    drawn from a different configuration is redrawn, with the same number of
+    periods, first.
+    """
+    plan_path = _plan_path()
+    if not plan_path.exists():
+        return None
+
+    header, first = _read_header(plan_path)
+    if header["fingerprint"] != config_fingerprint(config):
+        make_plan(config, header["periods"], donees)
+        _, first = _read_header(plan_path)
+
+    individual_donation = _individual_donation(config.total_donation,
+                                               config.split,
+                                               config.decimal_currency)
+
+    individual_donations: Counter[Donee] = Counter()
+    with open(plan_path, "rb") as plan_file:
+        plan_file.seek(_read_cursor(first))
+        for _ in range(rounds):
+            line = plan_file.readline()
+            if not line:
+                return None
+            for part in line.split():
+                index, count = part.split(b":")
+                individual_donations[donees[int(index)]] += (
+                    int(count) * individual_donation
+                )
+        offset = plan_file.tell()
+
+    return individual_donations, offset
+
+
+def advance_plan(offset: int) -> None:
+    """Move the plan's cursor to the round at byte `offset`."""
+    write_atomic(_cursor_path(), f"{offset}\n")
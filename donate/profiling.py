@@ -0,0 +1,115 @@
+"""Timing and profiling of the phases of a command."""
+from contextlib import contextmanager
+import json
+import sys
+from time import perf_counter
+import tracemalloc
+from types import FrameType
+from typing import Any, Iterator, Optional
+
+report_formats = ["json", "openmetrics"]
+
+
+class Profiler:
+    """
+    Record the wall time of named phases.
+
+    When `detailed` is true the memory allocated, peak memory and number of
+    function calls in each phase are also recorded. This slows the profiled
+    code considerably.
+    """
+    def __init__(self, enabled: bool = True, detailed: bool = False) -> None:
+        self.enabled = enabled or detailed
+        self.detailed = detailed
+        self.phases: dict[str, dict[str, float]] = {}
+        self._calls = 0
+
+    def _count_call(self, frame: FrameType, event: str, arg: Any) -> None:
+        if event in ("call", "c_call"):
+            self._calls += 1
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Record the code run in the context as the phase `name`."""
+        if not self.enabled:
+            yield
+            return
+
+        if self.detailed:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            memory_start, _ = tracemalloc.get_traced_memory()
+            self._calls = 0
+            sys.setprofile(self._count_call)
+
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            record = {"seconds": perf_counter() - start}
+
+            if self.detailed:
+                sys.setprofile(None)
+                memory_end, memory_peak = tracemalloc.get_traced_memory()
+                if started_tracing:
+                    tracemalloc.stop()
+                record.update(
+                    allocated_bytes=memory_end - memory_start,
+                    peak_bytes=memory_peak - memory_start,
+                    calls=self._calls
+                )
+
+            self.phases[name] = record
+
+    def report(self, report_format: str = "json") -> str:
+        """Create a report of the recorded phases."""
+        if report_format == "json":
+            return self.report_json()
+        elif report_format == "openmetrics":
+            return self.report_openmetrics()
+        raise ValueError(f"Report format '{report_format}' is not valid")
+
+    def report_json(self) -> str:
+        return json.dumps({"phases": self.phases}, indent=2)
+
+    def report_openmetrics(self) -> str:
+        metrics = {
+            "seconds": ("gauge", "Wall time of each phase."),
+            "allocated_bytes": ("gauge", "Memory allocated in each phase."),
+            "peak_bytes": ("gauge", "Peak memory allocated in each phase."),
+            "calls": ("gauge", "Function calls in each phase.")
+        }
+
+        lines = []
+        for metric, (metric_type, description) in metrics.items():
+            samples = [
+                (phase, record[metric])
+                for phase, record in self.phases.items()
+                if metric in record
+            ]
+            if not samples:
+                continue
+
+            name = f"donate_phase_{metric}"
+            lines += [f"# TYPE {name} {metric_type}",
+                      f"# HELP {name} {description}"]
+            lines += [
+                f'{name}{{phase="{phase}"}} {value}'
+                for phase, value in samples
+            ]
+        lines.append("# EOF")
+
+        return "\n".join(lines)
+
+
+def write_report(profiler: Profiler, report_format: str,
+                 path: Optional[str] = None) -> None:
+    """Write a report to `path`, or to standard error."""
+    report = profiler.report(report_format)
+    if path is None:
+        print(report, file=sys.stderr)
+    else:
+        with open(path, "w") as report_file:
+            report_file.write(report + "\n")
@@ -0,0 +1,192 @@
+"""Rebuild and verify the ledger from the donation log."""
+from .ledger import Rollups, _get_ledger, replace_ledger
+from .logs import log_segments
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from csv import reader
+import gzip
+from pathlib import Path
+from tabulate import tabulate
+from typing import Optional
+
+# Approximate size in bytes of the chunks of an uncompressed log segment
+# parsed by each task
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# Total and number of donations by donee, and rollups
+_Tally = tuple[Counter[str], Counter[str], Rollups]
+
+
+def _chunks(path: Path,
+            chunk_size: int = CHUNK_SIZE) -> list[tuple[Path, int, int]]:
+    """
+    Split a log segment into chunks of whole records, given as byte ranges.
+    Compressed segments are a single chunk.
+    """
+    if path.suffix == ".gz":
+        return [(path, 0, -1)]
+
+    size = path.stat().st_size
+    boundaries = [0]
+    with open(path, "rb") as segment_file:
+        for offset in range(chunk_size, size, chunk_size):
+            if offset <= boundaries[-1]:
+                continue
+            segment_file.seek(offset)
+            segment_file.readline()
+            boundaries.append(segment_file.tell())
+    if boundaries[-1] < size:
+        boundaries.append(size)
+
+    return [
+        (path, start, end) for start, end in zip(boundaries, boundaries[1:])
+    ]
+
+
+def _tally_chunk(path: Path, start: int, end: int, decimal_currency: bool,
+                 categories: dict[str, str]) -> _Tally:
+    """Total the donations to each donee in a chunk of a log segment."""
+    if end == -1:
+        with gzip.open(path, "rb") as segment_file:
+            data = segment_file.read()
+    else:
+        with open(path, "rb") as segment_file:
+            segment_file.seek(start)
+            data = segment_file.read(end - start)
+    # Ignore a partly written record
+    data = data[:data.rfind(b"\n") + 1]
+
+    total: Counter[str] = Counter()
+    number: Counter[str] = Counter()
+    rollups: Rollups = {}
+    for donation_date, donee, _, amount in reader(
+        data.decode().splitlines()
+    ):
+        if decimal_currency:
+            value = round(float(amount) * 100)
+        else:
+            value = int(amount)
+
+        total[donee] += value
+        number[donee] += 1
+
+        month = rollups.setdefault(donation_date[:7], {})
+        month_totals = month.setdefault(categories.get(donee, "other"),
+                                        [0, 0])
+        month_totals[0] += value
+        month_totals[1] += 1
+
+    return total, number, rollups
+
+
+def tally_log(decimal_currency: bool, categories: dict[str, str],
+              workers: Optional[int] = None,
+              chunk_size: int = CHUNK_SIZE) -> _Tally:
+    """
+    Total the donations to each donee, and by month and category, in the
+    log.
+
+    The log is parsed in chunks spread over a pool of `workers` processes.
+    Donees are put in a category using `categories`, a map of donee names to
+    categories, or 'other'.
+    """
+    chunks = [
+        chunk for path in log_segments() for chunk in _chunks(path, chunk_size)
+    ]
+
+    if workers == 1:
+        results = [
+            _tally_chunk(path, start, end, decimal_currency, categories)
+            for path, start, end in chunks
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_tally_chunk, path, start, end,
+                                decimal_currency, categories)
+                for path, start, end in chunks
+            ]
+            results = [future.result() for future in futures]
+
+    total: Counter[str] = Counter()
+    number: Counter[str] = Counter()
+    rollups: Rollups = {}
+    for chunk_total, chunk_number, chunk_rollups in results:
+        total.update(chunk_total)
+        number.update(chunk_number)
+        for month, month_categories in chunk_rollups.items():
+            month_totals = rollups.setdefault(month, {})
+            for category, (amount, count) in month_categories.items():
+                category_totals = month_totals.setdefault(category, [0, 0])
+                category_totals[0] += amount
+                category_totals[1] += count
+
+    return total, number, rollups
+
+
+def ledger_drift(
+    ledger: dict[str, Counter[str]], log_total: Counter[str],
+    log_number: Counter[str]
+) -> list[tuple[str, int, int, int, int]]:
+    """
+    Return the donees whose ledger total or number of donations differs from
+    the log, with the ledger's and log's totals and numbers.
+    """
+    drift = []
+    names = set(ledger["total"]) | set(ledger["number"]) | set(log_total)
+    for name in sorted(names):
+        ledger_total = ledger["total"][name]
+        ledger_number = ledger["number"][name]
+        if (ledger_total, ledger_number) != (log_total[name],
+                                             log_number[name]):
+            drift.append((name, ledger_total, log_total[name],
+                          ledger_number, log_number[name]))
+    return drift
+
+
+def format_drift(drift: list[tuple[str, int, int, int, int]],
+                 currency_symbol: str, decimal_currency: bool) -> str:
+    """Describe any drift between the ledger and log."""
+    if not drift:
+        return "The ledger agrees with the log"
+
+    scale = 100 if decimal_currency else 1
+    table = [
+        [name, ledger_total / scale, log_total / scale, ledger_number,
+         log_number]
+        for name, ledger_total, log_total, ledger_number, log_number in drift
+    ]
+    return "\n".join([
+        f"The ledger differs from the log for {len(drift)} donees",
+        "",
+        tabulate(
+            table,
+            headers=["Donee", f"Ledger total / {currency_symbol}",
+                     f"Log total / {currency_symbol}", "Ledger number",
+                     "Log number"],
+            floatfmt=".2f" if decimal_currency else "g"
+        )
+    ])
+
+
+def verify_ledger(decimal_currency: bool, workers: Optional[int] = None
+                  ) -> list[tuple[str, int, int, int, int]]:
+    """Return the drift between the ledger and the log."""
+    total, number, _ = tally_log(decimal_currency, {}, workers)
+    return ledger_drift(_get_ledger(), total, number)
+
+
+def rebuild_ledger(decimal_currency: bool, categories: dict[str, str],
+                   workers: Optional[int] = None
+                   ) -> list[tuple[str, int, int, int, int]]:
+    """
+    Replace the ledger and its rollups with totals from the log and return
+    the drift that was corrected.
+
+    The state lock should be held and pending donations committed so that
+    the ledger and log are not changed while rebuilding.
+    """
+    total, number, rollups = tally_log(decimal_currency, categories, workers)
+    drift = ledger_drift(_get_ledger(), total, number)
+    replace_ledger({"total": total, "number": number}, rollups)
+    return drift
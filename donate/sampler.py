@@ -0,0 +1,415 @@
+"""Weighted samplers for selecting donees."""
+from .donee import Donee, Donees, DoneeTable, weights
+from collections import Counter
+from heapq import heapify, heappop
+from math import floor, lgamma, log, sqrt
+from random import Random, expovariate, random, randrange
+from typing import (Callable, Iterable, Optional, Protocol, Sequence,
+                    TypeVar)
+
+
+class Sampler(Protocol):
+    """Weighted sampler of donees."""
+    def sample(self, k: int, rng: Optional[Random] = None) -> list[Donee]:
+        """Draw `k` donees, with replacement."""
+
+
+class AliasSampler:
+    """
+    Weighted sampler using Vose's alias method.
+
+    Building the alias tables is O(n) in the number of donees, after which
+    each draw is O(1).
+    """
+    def __init__(self, donees: Donees) -> None:
+        self.donees = donees
+        self.probability, self.alias = _alias_tables(weights(donees))
+
+    def __len__(self) -> int:
+        return len(self.donees)
+
+    def sample_indices(self, k: int,
+                       rng: Optional[Random] = None) -> list[int]:
+        """Draw the indices of `k` donees, with replacement."""
+        uniform: Callable[[], float] = rng.random if rng else random
+        index: Callable[[int], int] = rng.randrange if rng else randrange
+
+        n = len(self.probability)
+        probability = self.probability
+        alias = self.alias
+
+        selected = []
+        for _ in range(k):
+            i = index(n)
+            if uniform() < probability[i]:
+                selected.append(i)
+            else:
+                selected.append(alias[i])
+
+        return selected
+
+    def sample(self, k: int, rng: Optional[Random] = None) -> list[Donee]:
+        """Draw `k` donees, with replacement."""
+        donees = self.donees
+        return [donees[i] for i in self.sample_indices(k, rng)]
+
+
+class DynamicSampler:
+    """
+    Weighted sampler backed by a Fenwick tree of weights.
+
+    Donees can be inserted, removed and reweighted in O(log n) and each draw
+    is O(log n), so a sampler for a large set of donees can be kept up to date
+    without rebuilding it.
+    """
+    def __init__(self, donees: Iterable[Donee] = ()) -> None:
+        donee_list = list(donees)
+        self._donees: list[Optional[Donee]] = list(donee_list)
+        self._weights = [donee.weight for donee in donee_list]
+        self._slots: dict[str, int] = {}
+        for slot, donee in enumerate(donee_list):
+            if donee.name in self._slots:
+                raise ValueError(f"Donee '{donee.name}' is duplicated")
+            self._slots[donee.name] = slot
+        self._free: list[int] = []
+
+        # Build the tree in O(n), tree[i] holds the sum of weights of slots
+        # (i - lowbit(i), i]
+        n = len(self._weights)
+        self._tree = [0.] + self._weights
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                self._tree[parent] += self._tree[i]
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._slots
+
+    def _add(self, slot: int, delta: float) -> None:
+        i = slot + 1
+        n = len(self._weights)
+        while i <= n:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, slots: int) -> float:
+        """Sum of the weights of the first `slots` slots."""
+        total = 0.
+        i = slots
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    @property
+    def total_weight(self) -> float:
+        return self._prefix(len(self._weights))
+
+    def names(self) -> set[str]:
+        return set(self._slots)
+
+    def donee(self, name: str) -> Donee:
+        donee = self._donees[self._slots[name]]
+        assert donee is not None
+        return donee
+
+    def insert(self, donee: Donee) -> None:
+        """Add a donee."""
+        if donee.name in self._slots:
+            raise ValueError(f"Donee '{donee.name}' is already present")
+
+        if self._free:
+            slot = self._free.pop()
+            self._donees[slot] = donee
+            self._weights[slot] = donee.weight
+            self._add(slot, donee.weight)
+        else:
+            slot = len(self._weights)
+            self._donees.append(donee)
+            self._weights.append(donee.weight)
+            # The new node covers slots (i - lowbit(i), i]
+            i = slot + 1
+            self._tree.append(
+                donee.weight + self._prefix(i - 1) - self._prefix(i - (i & -i))
+            )
+
+        self._slots[donee.name] = slot
+
+    def remove(self, name: str) -> None:
+        """Remove the donee called `name`."""
+        slot = self._slots.pop(name)
+        self._add(slot, -self._weights[slot])
+        self._weights[slot] = 0.
+        self._donees[slot] = None
+        self._free.append(slot)
+
+    def update(self, donee: Donee) -> None:
+        """Replace a donee of the same name, for example to change weight."""
+        slot = self._slots[donee.name]
+        self._add(slot, donee.weight - self._weights[slot])
+        self._weights[slot] = donee.weight
+        self._donees[slot] = donee
+
+    def _find(self, target: float) -> int:
+        """Find the slot in which the cumulative weight exceeds `target`."""
+        n = len(self._weights)
+        tree = self._tree
+
+        position = 0
+        step = 1 << n.bit_length()
+        while step:
+            next_position = position + step
+            if next_position <= n and tree[next_position] <= target:
+                position = next_position
+                target -= tree[next_position]
+            step >>= 1
+
+        return position
+
+    def sample(self, k: int, rng: Optional[Random] = None) -> list[Donee]:
+        """Draw `k` donees, with replacement."""
+        uniform: Callable[[], float] = rng.random if rng else random
+
+        if not self._slots:
+            raise ValueError("Cannot sample from an empty list of donees.")
+
+        total = self.total_weight
+        selected: list[Donee] = []
+        while len(selected) < k:
+            slot = self._find(uniform() * total)
+            # Rounding can land past the end or on a removed slot, draw again
+            if slot < len(self._weights) and self._weights[slot] > 0.:
+                donee = self._donees[slot]
+                assert donee is not None
+                selected.append(donee)
+
+        return selected
+
+
+def _alias_tables(weights: list[float]) -> tuple[list[float], list[int]]:
+    """Construct the probability and alias tables for Vose's alias method."""
+    n = len(weights)
+    if n == 0:
+        raise ValueError("Cannot sample from an empty list of donees.")
+
+    total = sum(weights)
+    scaled = [weight * n / total for weight in weights]
+
+    probability = [0.] * n
+    alias = [0] * n
+
+    small = [i for i, p in enumerate(scaled) if p < 1.]
+    large = [i for i, p in enumerate(scaled) if p >= 1.]
+
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+
+        probability[less] = scaled[less]
+        alias[less] = more
+
+        scaled[more] = (scaled[more] + scaled[less]) - 1.
+        if scaled[more] < 1.:
+            small.append(more)
+        else:
+            large.append(more)
+
+    # Any remaining entries have a scaled probability of one, up to floating
+    # point error
+    for i in large + small:
+        probability[i] = 1.
+        alias[i] = i
+
+    return probability, alias
+
+
+def binomial(n: int, p: float, rng: Optional[Random] = None) -> int:
+    """
+    Draw from a binomial distribution of `n` trials with success probability
+    `p`.
+
+    Uses the geometric method when the mean is small and Hörmann's BTRS
+    transformed rejection algorithm otherwise, so the cost does not grow with
+    `n`.
+    """
+    uniform: Callable[[], float] = rng.random if rng else random
+
+    if p <= 0.:
+        return 0
+    if p >= 1.:
+        return n
+
+    # Exploit symmetry so that p <= 0.5
+    if p > 0.5:
+        return n - binomial(n, 1. - p, rng)
+
+    if n * p < 10.:
+        # Geometric method, O(np)
+        x = y = 0
+        c = log(1. - p)
+        if not c:
+            return x
+        while True:
+            y += floor(log(uniform()) / c) + 1
+            if y > n:
+                return x
+            x += 1
+
+    # BTRS, transformed rejection with squeeze
+    spq = sqrt(n * p * (1. - p))
+    b = 1.15 + 2.53 * spq
+    a = -0.0873 + 0.0248 * b + 0.01 * p
+    c = n * p + 0.5
+    vr = 0.92 - 4.2 / b
+
+    alpha = (2.83 + 5.1 / b) * spq
+    lpq = log(p / (1. - p))
+    m = floor((n + 1) * p)
+    h = lgamma(m + 1) + lgamma(n - m + 1)
+
+    while True:
+        u = uniform() - 0.5
+        us = 0.5 - abs(u)
+        k = floor((2. * a / us + b) * u + c)
+        if k < 0 or k > n:
+            continue
+
+        v = uniform()
+        if us >= 0.07 and v <= vr:
+            return k
+
+        v *= alpha / (a / (us * us) + b)
+        if log(v) <= h - lgamma(k + 1) - lgamma(n - k + 1) + (k - m) * lpq:
+            return k
+
+
+def multinomial(donees: Donees, k: int,
+                rng: Optional[Random] = None) -> Counter[Donee]:
+    """
+    Count how many of `k` weighted draws, with replacement, select each donee.
+
+    The counts are drawn directly from the multinomial distribution as a
+    sequence of conditional binomial draws, so the cost depends on the number
+    of donees rather than on `k`.
+    """
+    if len(donees) == 0:
+        raise ValueError("Cannot sample from an empty list of donees.")
+
+    donee_weights = weights(donees)
+
+    counts: Counter[Donee] = Counter()
+    remaining_draws = k
+    remaining_weight = sum(donee_weights)
+
+    for index, weight in enumerate(donee_weights[:-1]):
+        if remaining_draws == 0:
+            break
+
+        count = binomial(remaining_draws, weight / remaining_weight, rng)
+        if count:
+            counts[donees[index]] = count
+
+        remaining_draws -= count
+        remaining_weight -= weight
+    else:
+        if remaining_draws:
+            counts[donees[len(donee_weights) - 1]] = remaining_draws
+
+    return counts
+
+
+def sample_distinct_indices(weights: Sequence[float], k: int,
+                            rng: Optional[Random] = None) -> list[int]:
+    """
+    Draw the indices of `k` distinct items, without replacement, with
+    probability proportional to `weights`.
+
+    Each item with a positive weight is given an exponentially distributed
+    key with rate equal to its weight and the `k` smallest keys are selected
+    (Efraimidis and Spirakis), in the order they would have been drawn one at
+    a time. The keys are heapified in O(n) and the `k` smallest popped, so
+    this costs O(n + k log n).
+    """
+    exponential: Callable[[float], float] = (
+        rng.expovariate if rng else expovariate
+    )
+
+    keys = [
+        (exponential(weight), index)
+        for index, weight in enumerate(weights) if weight > 0.
+    ]
+    if k > len(keys):
+        raise ValueError(
+            f"Cannot choose {k} distinct donees from {len(keys)} donees with"
+            " a positive weight."
+        )
+
+    heapify(keys)
+    return [heappop(keys)[1] for _ in range(k)]
+
+
+def sample_distinct(donees: Donees, k: int,
+                    rng: Optional[Random] = None) -> list[Donee]:
+    """Draw `k` distinct donees, without replacement."""
+    return [
+        donees[index]
+        for index in sample_distinct_indices(weights(donees), k, rng)
+    ]
+
+
+_DoneesKey = tuple[tuple[str, float, str, str], ...]
+_T = TypeVar("_T")
+
+_sampler_cache: dict[_DoneesKey, AliasSampler] = {}
+_table_cache: dict[_DoneesKey, DoneeTable] = {}
+_CACHE_SIZE = 8
+
+
+def _donees_key(donees: list[Donee]) -> _DoneesKey:
+    return tuple(
+        (donee.name, donee.weight, donee.category, donee.url)
+        for donee in donees
+    )
+
+
+def _cached(cache: dict[_DoneesKey, _T], key: _DoneesKey,
+            build: Callable[[], _T]) -> _T:
+    try:
+        value = cache[key]
+    except KeyError:
+        value = build()
+        if len(cache) >= _CACHE_SIZE:
+            # Evict the oldest entry
+            del cache[next(iter(cache))]
+        cache[key] = value
+    return value
+
+
+def get_donee_table(donees: list[Donee]) -> DoneeTable:
+    """
+    Return a table of `donees`.
+
+    Tables, along with the alias sampler kept on each, are cached by the
+    donees' fields, so repeated calls with the same donees skip building the
+    table and its alias tables.
+    """
+    return _cached(_table_cache, _donees_key(donees),
+                   lambda: DoneeTable.from_donees(donees))
+
+
+def get_sampler(donees: Donees) -> AliasSampler:
+    """
+    Return an alias sampler for `donees`.
+
+    Samplers are cached by the donees' fields, or on the table for a
+    `DoneeTable`, so repeated calls with the same donees skip constructing the
+    alias tables.
+    """
+    if isinstance(donees, DoneeTable):
+        return donees.sampler
+
+    return _cached(_sampler_cache, _donees_key(donees),
+                   lambda: AliasSampler(donees))
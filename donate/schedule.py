@@ -1,8 +1,8 @@
+from .paths import data_path, write_atomic
 from abc import ABC, abstractmethod
 from datetime import datetime
 from pathlib import Path
 from typing import Type, Optional
-from xdg import BaseDirectory  # type: ignore
 
 
 class Schedule(ABC):
@@ -56,8 +56,7 @@ schedule_map: dict[str, Type[Schedule]] = {
 
 
 def _last_donation_path() -> Path:
-    data_path = Path(BaseDirectory.save_data_path("donate"))
-    return data_path / "last_donation"
+    return data_path() / "last_donation"
 
 
 def get_last_donation() -> Optional[datetime]:
@@ -76,9 +75,9 @@ def get_last_donation() -> Optional[datetime]:
     return last_donation
 
 
-def update_last_donation() -> None:
-    """Write the current time to the last donation file."""
-    last_donation_path = _last_donation_path()
+def update_last_donation(time: Optional[datetime] = None) -> None:
+    """Write the current time, or `time`, to the last donation file."""
+    if time is None:
+        time = datetime.today()
 
-    with open(last_donation_path, "w") as last_donation_file:
-        last_donation_file.write(datetime.today().isoformat()+"\n")
+    write_atomic(_last_donation_path(), time.isoformat()+"\n")
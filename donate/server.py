@@ -0,0 +1,183 @@
+"""Long running server answering requests with a warm configuration."""
+import asyncio
+from .configuration import Configuration, load_config
+from .donee import Donee, DoneeTable
+from .generate import generate_donations
+from .ledger import format_stats, rollup_stats
+from .maths import means_summary, statistics_summary
+from .sampler import DynamicSampler
+from .storage import storage_map
+from .streams import stream
+from functools import partial
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+
+def update_sampler(sampler: DynamicSampler, donees: list[Donee]) -> None:
+    """Update a sampler to draw from `donees`."""
+    names = set()
+    for donee in donees:
+        names.add(donee.name)
+        if donee.name not in sampler:
+            sampler.insert(donee)
+        elif sampler.donee(donee.name) != donee:
+            sampler.update(donee)
+
+    for name in sampler.names() - names:
+        sampler.remove(name)
+
+
+class DonateServer:
+    """
+    Serve generate, means and stats requests over a Unix socket.
+
+    The configuration, a table of its donees and a sampler are kept in memory.
+    When the configuration file changes the sampler is updated with only the
+    donees which were added, removed or changed. Parsing the changed file,
+    building its table and finding the changes still take O(n), only the
+    sampler's updates are O(log n) each. Requests which write to the ledger,
+    log or last donation time are run one at a time, and the configuration is
+    only reloaded between them.
+    """
+    def __init__(self, config_path: Path) -> None:
+        self.config_path = config_path
+        self._mtime = -1
+        self._storage_backend = ""
+        self._load()
+        self._write_lock = asyncio.Lock()
+        self._server: asyncio.AbstractServer
+
+    def _load(self) -> None:
+        mtime = os.stat(self.config_path).st_mtime_ns
+        if mtime == self._mtime:
+            return
+
+        self.config: Configuration = load_config(self.config_path)
+        self.donees = DoneeTable.from_donees(self.config.donees)
+
+        # Keep the storage, and any donations held in memory, unless the
+        # backend changes
+        if self._mtime == -1 or self.config.storage != self._storage_backend:
+            self.storage = storage_map[self.config.storage]()
+            self._storage_backend = self.config.storage
+
+        if self._mtime == -1:
+            self.sampler = DynamicSampler(self.config.donees)
+        else:
+            update_sampler(self.sampler, self.config.donees)
+        self._mtime = mtime
+
+    def generate(self, ad_hoc: bool = False, dry_run: bool = False,
+                 seed: Optional[int] = None, distinct: bool = False,
+                 balanced: bool = False) -> str:
+        rng = stream(seed) if seed is not None else None
+        return generate_donations(self.config, self.donees, ad_hoc=ad_hoc,
+                                  dry_run=dry_run, sampler=self.sampler,
+                                  rng=rng, storage=self.storage,
+                                  distinct=distinct, balanced=balanced,
+                                  plan=True)
+
+    def means(self, total_donation: int, statistics: bool = False) -> str:
+        output = means_summary(self.donees, total_donation,
+                               self.config.currency_symbol)
+        if statistics:
+            output += "\n\n" + statistics_summary(
+                self.donees, total_donation, self.config.split,
+                self.config.currency_symbol
+            )
+        return output
+
+    def stats(self, by: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None) -> str:
+        if by is not None:
+            return rollup_stats(self.storage.rollups(since, until), by,
+                                self.config.currency_symbol,
+                                self.config.decimal_currency, since, until)
+
+        total, number = self.storage.totals()
+        return format_stats(total, number, self.config.currency_symbol,
+                            self.config.decimal_currency)
+
+    def ping(self) -> str:
+        return "pong"
+
+    async def _dispatch(self, request: dict[str, Any]) -> str:
+        command = request.get("command")
+        arguments = request.get("arguments", {})
+
+        if command == "shutdown":
+            self._server.close()
+            return "Shutting down"
+
+        handlers: dict[str, Callable[..., str]] = {
+            "generate": self.generate,
+            "means": self.means,
+            "stats": self.stats,
+            "ping": self.ping
+        }
+        try:
+            handler = handlers[str(command)]
+        except KeyError:
+            raise ValueError(f"Command '{command}' is not valid")
+
+        # Run requests in worker threads so that reads are not held up by
+        # each other
+        loop = asyncio.get_running_loop()
+        call = partial(handler, **arguments)
+        async with self._write_lock:
+            # Reload a changed configuration only once any generate in
+            # progress has finished, so that the sampler and storage are never
+            # changed under a draw
+            self._load()
+            if command == "generate":
+                # Serialise writes to the ledger, log and last donation time
+                return await loop.run_in_executor(None, call)
+        return await loop.run_in_executor(None, call)
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                try:
+                    output = await self._dispatch(json.loads(line))
+                    response = {"ok": True, "output": output}
+                except Exception as error:
+                    response = {"ok": False, "error": str(error)}
+
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: Path) -> None:
+        """Serve requests on `socket_path` until a shutdown request."""
+        socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if socket_path.is_socket():
+            socket_path.unlink()
+
+        # Create the socket accessible only by this user, rather than
+        # restricting it once created, so that no other user can connect in
+        # between
+        umask = os.umask(0o077)
+        try:
+            self._server = await asyncio.start_unix_server(
+                self._handle, path=str(socket_path)
+            )
+        finally:
+            os.umask(umask)
+
+        try:
+            async with self._server:
+                await self._server.wait_closed()
+        finally:
+            if socket_path.is_socket():
+                socket_path.unlink()
+
+
+def serve(config_path: Path, socket_path: Path) -> None:
+    async def _serve() -> None:
+        await DonateServer(config_path).serve(socket_path)
+
+    asyncio.run(_serve())
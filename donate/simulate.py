@@ -0,0 +1,185 @@
+"""Monte Carlo simulation of donation outcomes."""
+from .donee import Donees, DoneeTable
+from .maths import _individual_donation
+from .sampler import AliasSampler
+from .streams import blocks, new_seed, stream
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from os import cpu_count
+from tabulate import tabulate
+from time import perf_counter
+from typing import Optional
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+# Histograms of the number of parts received per round, indexed by donee or
+# category. Rounds where nothing was received are not recorded.
+_Histograms = list[Counter[int]]
+
+
+def _simulate_chunk(donees: DoneeTable, split: int,
+                    chunk: list[tuple[int, int]],
+                    seed: int) -> tuple[_Histograms, _Histograms]:
+    """
+    Simulate the blocks of rounds in `chunk` and histogram the parts
+    received. Each block of rounds uses its own stream derived from `seed`.
+    """
+    sampler = AliasSampler(donees)
+    categories = donees.category_codes
+
+    donee_histograms: _Histograms = [Counter() for _ in range(len(donees))]
+    category_histograms: _Histograms = [
+        Counter() for _ in donees.categories
+    ]
+
+    for block, rounds in chunk:
+        rng = stream(seed, block)
+        for _ in range(rounds):
+            counts = Counter(sampler.sample_indices(split, rng))
+
+            category_counts: Counter[int] = Counter()
+            for index, count in counts.items():
+                donee_histograms[index][count] += 1
+                category_counts[categories[index]] += count
+
+            for index, count in category_counts.items():
+                category_histograms[index][count] += 1
+
+    return donee_histograms, category_histograms
+
+
+def _merge(histograms: _Histograms, other: _Histograms) -> None:
+    for histogram, other_histogram in zip(histograms, other):
+        histogram.update(other_histogram)
+
+
+def _chunks(rounds: int, workers: int) -> list[list[tuple[int, int]]]:
+    """Split the blocks of `rounds` into chunks to distribute to workers."""
+    round_blocks = blocks(rounds)
+    n_chunks = min(len(round_blocks), workers * 4) or 1
+    return [round_blocks[i::n_chunks] for i in range(n_chunks)]
+
+
+def _percentile(histogram: Counter[int], rounds: int,
+                percentile: float) -> int:
+    """Return a percentile of the parts received from a histogram."""
+    target = percentile / 100 * rounds
+    cumulative = rounds - sum(histogram.values())
+    if cumulative >= target:
+        return 0
+
+    for count in sorted(histogram):
+        cumulative += histogram[count]
+        if cumulative >= target:
+            return count
+
+    return max(histogram)
+
+
+def _statistics(histogram: Counter[int], rounds: int,
+                individual_donation: int,
+                decimal_currency: bool) -> list[float]:
+    """Summarise a histogram as percentiles, P(0) and the expected wait."""
+    scale = individual_donation / 100 if decimal_currency else (
+        individual_donation
+    )
+
+    p_zero = 1 - sum(histogram.values()) / rounds
+    if p_zero < 1:
+        expected_wait = 1 / (1 - p_zero)
+    else:
+        expected_wait = float("inf")
+
+    return [
+        *[_percentile(histogram, rounds, percentile) * scale
+          for percentile in PERCENTILES],
+        p_zero,
+        expected_wait
+    ]
+
+
+def simulate(donees: Donees, total_donation: int, split: int,
+             rounds: int, decimal_currency: bool = False,
+             currency_symbol: str = "£", workers: Optional[int] = None,
+             seed: Optional[int] = None) -> str:
+    """
+    Simulate `rounds` donations and summarise the outcomes for each donee and
+    category of donee.
+
+    Rounds are simulated in blocks, each using an independent random stream
+    derived from `seed`, and spread over a pool of `workers` processes. The
+    same seed gives the same outcome for any number of workers.
+    """
+    if rounds < 1:
+        raise ValueError(f"Rounds '{rounds}' is not valid")
+
+    individual_donation = _individual_donation(total_donation, split,
+                                               decimal_currency)
+
+    if seed is None:
+        seed = new_seed()
+
+    # Send workers the compact table rather than a list of models
+    if not isinstance(donees, DoneeTable):
+        donees = DoneeTable.from_donees(donees)
+
+    donee_histograms: _Histograms = [Counter() for _ in range(len(donees))]
+    category_histograms: _Histograms = [
+        Counter() for _ in donees.categories
+    ]
+
+    start = perf_counter()
+    if workers is None:
+        workers = cpu_count() or 1
+
+    if workers == 1:
+        results = [_simulate_chunk(donees, split, blocks(rounds), seed)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_simulate_chunk, donees, split, chunk, seed)
+                for chunk in _chunks(rounds, workers)
+            ]
+            results = [future.result() for future in futures]
+
+    for donee_result, category_result in results:
+        _merge(donee_histograms, donee_result)
+        _merge(category_histograms, category_result)
+    elapsed = perf_counter() - start
+
+    headers = [
+        *[f"P{percentile} / {currency_symbol}" for percentile in PERCENTILES],
+        "P(nothing)",
+        "Expected wait / rounds"
+    ]
+
+    donee_table = sorted(
+        [
+            [name, *_statistics(histogram, rounds, individual_donation,
+                                decimal_currency)]
+            for name, histogram in zip(donees.names, donee_histograms)
+        ],
+        key=lambda row: row[-2]  # type: ignore
+    )
+    category_table = sorted(
+        [
+            [name, *_statistics(histogram, rounds, individual_donation,
+                                decimal_currency)]
+            for name, histogram in zip(donees.categories,
+                                       category_histograms)
+        ],
+        key=lambda row: row[-2]  # type: ignore
+    )
+
+    summary = "\n".join([
+        f"Simulated {rounds} donations of {currency_symbol}{total_donation}"
+        f" split {split} ways",
+        "",
+        tabulate(donee_table, headers=["Donee", *headers]),
+        "",
+        tabulate(category_table, headers=["Category", *headers]),
+        "",
+        f"{rounds} rounds in {elapsed:.2f} s"
+        f" ({rounds / elapsed:.0f} rounds per second)"
+    ])
+    return summary
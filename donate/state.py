@@ -0,0 +1,218 @@
+"""
+Locking and group commit of the donation state kept in files.
+
+A round of donations is first written as an intent file in the pending
+directory. Intents are then applied to the log, ledger and last donation file
+together while holding an exclusive lock on the data directory, so that
+concurrent invocations commit every waiting round in a single durable write.
+"""
+from .donee import Donee
+from .ledger import COMPACTION_SIZE, append_journal, compact_ledger
+from .ledger import journal_entry, journal_intents
+from .logs import append_log, log_rows, log_sizes, restore_log, rotate_log
+from .paths import data_path, write_atomic
+from .profiling import Profiler
+from .schedule import get_last_donation, update_last_donation
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+import fcntl
+import json
+import os
+from pathlib import Path
+from threading import local
+from time import time_ns
+from typing import Any, Iterator, Optional
+from uuid import uuid4
+
+
+def _lock_path() -> Path:
+    return data_path() / "lock"
+
+
+def _pending_path() -> Path:
+    """Directory of intents waiting to be committed."""
+    pending_path = data_path() / "pending"
+    pending_path.mkdir(exist_ok=True)
+    return pending_path
+
+
+def _draining_path() -> Path:
+    """
+    Marker of intents being committed. The marker remains should a commit be
+    interrupted.
+
+    The marker holds the ids of the intents, the size of each log segment
+    before the intents' rows were appended and whether every write of the
+    commit has completed.
+    """
+    return data_path() / "draining"
+
+
+def _write_draining(intent_ids: list[str], sizes: dict[str, int],
+                    written: bool) -> None:
+    write_atomic(
+        _draining_path(),
+        json.dumps({"intents": intent_ids, "log_sizes": sizes,
+                    "written": written})
+    )
+
+
+# Number of times each thread has entered the state lock
+_held = local()
+
+
+@contextmanager
+def state_lock() -> Iterator[None]:
+    """
+    Hold an exclusive advisory lock on the data directory.
+
+    The lock may be entered again by a thread which holds it.
+    """
+    depth: int = getattr(_held, "depth", 0)
+    if depth:
+        _held.depth = depth + 1
+        try:
+            yield
+        finally:
+            _held.depth = depth
+        return
+
+    with open(_lock_path(), "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        _held.depth = 1
+        try:
+            yield
+        finally:
+            _held.depth = 0
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def record_intent(donations: Counter[Donee], currency_symbol: str,
+                  decimal_currency: bool,
+                  time: Optional[datetime] = None) -> str:
+    """Durably record a round of donations to commit and return its id."""
+    if time is None:
+        time = datetime.today()
+
+    # Identifiers sort in the order intents were recorded
+    intent_id = f"{time_ns():020d}-{os.getpid()}-{uuid4().hex[:8]}"
+    intent = {
+        "id": intent_id,
+        "time": time.isoformat(),
+        "currency_symbol": currency_symbol,
+        "decimal_currency": decimal_currency,
+        **journal_entry(donations, time)
+    }
+    write_atomic(_pending_path() / f"{intent_id}.json", json.dumps(intent))
+
+    return intent_id
+
+
+def _pending_intents() -> list[tuple[Path, dict[str, Any]]]:
+    intents = []
+    for intent_path in sorted(_pending_path().glob("*.json")):
+        with open(intent_path, "r") as intent_file:
+            intents.append((intent_path, json.load(intent_file)))
+    return intents
+
+
+def drain_pending(profiler: Optional[Profiler] = None) -> int:
+    """
+    Commit all pending intents to the log, ledger and last donation file and
+    return the number committed. The state lock must be held.
+
+    If a previous commit was interrupted, intents already in the ledger
+    journal are not written to it again and the log is returned to its size
+    before the commit, so that every row is written to it exactly once.
+
+    The writes to the log, ledger and last donation file are timed as phases
+    of `profiler`.
+    """
+    if profiler is None:
+        profiler = Profiler(enabled=False)
+
+    draining_path = _draining_path()
+    finished = 0
+    committed: set[str] = set()
+    if draining_path.exists():
+        with open(draining_path, "r") as draining_file:
+            draining = json.load(draining_file)
+
+        if draining["written"]:
+            # Only removing the intents was interrupted
+            for intent_id in draining["intents"]:
+                (_pending_path() / f"{intent_id}.json").unlink(
+                    missing_ok=True
+                )
+                finished += 1
+            draining_path.unlink()
+        else:
+            restore_log(draining["log_sizes"])
+            committed = journal_intents()
+
+    intents = _pending_intents()
+    if not intents:
+        return finished
+
+    intent_ids = [intent["id"] for _, intent in intents]
+    _write_draining(intent_ids, log_sizes(), False)
+
+    # Append every round to the log and journal with a single write each.
+    # Segments are rotated only once the commit is complete, so that the log
+    # can be restored should it be interrupted.
+    with profiler.phase("log"):
+        rows = []
+        for _, intent in intents:
+            rows += log_rows(intent["donations"], intent["currency_symbol"],
+                             intent["decimal_currency"], intent["date"])
+        append_log(rows, sync=True, rotate=False)
+
+    with profiler.phase("ledger"):
+        # Record the intent's id with its entry so that it is recognised as
+        # committed should this commit be interrupted
+        size = append_journal(
+            [
+                {
+                    "date": intent["date"],
+                    "donations": intent["donations"],
+                    "categories": intent["categories"],
+                    "intent": intent["id"]
+                }
+                for _, intent in intents if intent["id"] not in committed
+            ],
+            sync=True
+        )
+
+    with profiler.phase("last_donation"):
+        latest = max(
+            datetime.fromisoformat(intent["time"]) for _, intent in intents
+        )
+        last_donation = get_last_donation()
+        if last_donation is None or latest > last_donation:
+            update_last_donation(latest)
+
+    _write_draining(intent_ids, {}, True)
+    for intent_path, _ in intents:
+        intent_path.unlink()
+    draining_path.unlink()
+
+    rotate_log()
+
+    # Compact only once the intents are removed, the journal entries are
+    # needed to recognise committed intents until then
+    if size > COMPACTION_SIZE:
+        compact_ledger()
+
+    return finished + len(intents)
+
+
+def commit_donations(donations: Counter[Donee], currency_symbol: str,
+                     decimal_currency: bool) -> None:
+    """
+    Record a round of donations and commit it, along with any other pending
+    rounds.
+    """
+    record_intent(donations, currency_symbol, decimal_currency)
+    with state_lock():
+        drain_pending()
@@ -0,0 +1,203 @@
+"""Storage of the last donation time and the donations made."""
+from . import database
+from .donee import Donee
+from .ledger import (Rollups, _get_ledger, get_rollups, journal_entry,
+                     rollups_between)
+from .profiling import Profiler
+from .schedule import get_last_donation
+from .state import drain_pending, record_intent, state_lock
+from abc import ABC, abstractmethod
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import sqlite3
+from threading import Lock, local
+from typing import Iterator, Optional, Type
+
+
+class Storage(ABC):
+    """Storage base class."""
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """
+        Hold exclusive access to the storage, from reading the last donation
+        until a round of donations is recorded.
+        """
+        yield
+
+    @abstractmethod
+    def get_last_donation(self) -> Optional[datetime]:
+        """Get the time of the last donation. The lock must be held."""
+
+    @abstractmethod
+    def record_donations(self, donations: Counter[Donee],
+                         currency_symbol: str, decimal_currency: bool,
+                         time: Optional[datetime] = None) -> None:
+        """Record a round of donations made at `time`, or now."""
+
+    def commit(self, profiler: Optional[Profiler] = None) -> None:
+        """
+        Make recorded donations durable. The lock must not be held.
+
+        The writes may be timed as phases of `profiler`.
+        """
+
+    @abstractmethod
+    def totals(self) -> tuple[dict[str, int], dict[str, int]]:
+        """Return the total and number of donations to each donee."""
+
+    @abstractmethod
+    def rollups(self, since: Optional[str] = None,
+                until: Optional[str] = None) -> Rollups:
+        """
+        Return the total and number of donations by month and category, for
+        months from `since` to `until`, given as 'YYYY-MM', if given.
+        """
+
+
+class FileStorage(Storage):
+    """
+    Keep the last donation time, ledger and log in files in the data
+    directory.
+
+    Rounds are recorded as intents and committed to the files together by
+    `commit`, along with rounds from any other process.
+    """
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        with state_lock():
+            yield
+
+    def get_last_donation(self) -> Optional[datetime]:
+        # Apply rounds recorded by other runs, or interrupted, first
+        drain_pending()
+        return get_last_donation()
+
+    def record_donations(self, donations: Counter[Donee],
+                         currency_symbol: str, decimal_currency: bool,
+                         time: Optional[datetime] = None) -> None:
+        record_intent(donations, currency_symbol, decimal_currency, time)
+
+    def commit(self, profiler: Optional[Profiler] = None) -> None:
+        with state_lock():
+            drain_pending(profiler)
+
+    def totals(self) -> tuple[dict[str, int], dict[str, int]]:
+        # Include rounds recorded but not yet committed
+        with state_lock():
+            drain_pending()
+            ledger = _get_ledger()
+        return ledger["total"], ledger["number"]
+
+    def rollups(self, since: Optional[str] = None,
+                until: Optional[str] = None) -> Rollups:
+        # Include rounds recorded but not yet committed
+        with state_lock():
+            drain_pending()
+            rollups = get_rollups()
+        return rollups_between(rollups, since, until)
+
+
+class SQLiteStorage(Storage):
+    """
+    Keep the last donation time and donations in an SQLite database, by
+    default in the data directory.
+
+    SQLite connections may only be used by the thread which opened them, so
+    each thread using the storage opens its own connection.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path
+        self._local = local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection to the database."""
+        try:
+            connection: sqlite3.Connection = self._local.connection
+        except AttributeError:
+            connection = database.connect(self.path)
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        with state_lock():
+            yield
+
+    def get_last_donation(self) -> Optional[datetime]:
+        return database.get_last_donation(self.connection)
+
+    def record_donations(self, donations: Counter[Donee],
+                         currency_symbol: str, decimal_currency: bool,
+                         time: Optional[datetime] = None) -> None:
+        # Donations and the donation time are recorded in one transaction
+        database.record_donations(self.connection, donations,
+                                  currency_symbol, time)
+
+    def totals(self) -> tuple[dict[str, int], dict[str, int]]:
+        return database.database_totals(self.connection)
+
+    def rollups(self, since: Optional[str] = None,
+                until: Optional[str] = None) -> Rollups:
+        return database.database_rollups(self.connection, since, until)
+
+
+class MemoryStorage(Storage):
+    """
+    Keep the last donation time and donations in memory, for tests,
+    simulations and batch runs which should not touch the disk.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.last_donation: Optional[datetime] = None
+        self.total: Counter[str] = Counter()
+        self.number: Counter[str] = Counter()
+        self._rollups: Rollups = {}
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        with self._lock:
+            yield
+
+    def get_last_donation(self) -> Optional[datetime]:
+        return self.last_donation
+
+    def record_donations(self, donations: Counter[Donee],
+                         currency_symbol: str, decimal_currency: bool,
+                         time: Optional[datetime] = None) -> None:
+        if time is None:
+            time = datetime.today()
+
+        entry = journal_entry(donations, time)
+        for name, amount in entry["donations"].items():
+            self.total[name] += amount
+            self.number[name] += 1
+
+        month = self._rollups.setdefault(entry["date"][:7], {})
+        for category, (amount, count) in entry["categories"].items():
+            month_totals = month.setdefault(category, [0, 0])
+            month_totals[0] += amount
+            month_totals[1] += count
+
+        if self.last_donation is None or time > self.last_donation:
+            self.last_donation = time
+
+    def totals(self) -> tuple[dict[str, int], dict[str, int]]:
+        return dict(self.total), dict(self.number)
+
+    def rollups(self, since: Optional[str] = None,
+                until: Optional[str] = None) -> Rollups:
+        return rollups_between(self._rollups, since, until)
+
+
+storage_map: dict[str, Type[Storage]] = {
+    "files": FileStorage,
+    "sqlite": SQLiteStorage,
+    "memory": MemoryStorage
+}
@@ -0,0 +1,42 @@
+"""
+Reproducible, independent random streams.
+
+A stream is identified by a seed and a path of indices, such as the index of a
+block of simulated rounds. The stream's generator is seeded with a hash of its
+identifier so any stream can be created directly, in any process and in any
+order, and streams with different identifiers are independent.
+"""
+from hashlib import sha256
+from random import Random, SystemRandom
+
+# Number of rounds simulated with each stream. Work is divided between
+# processes in whole blocks so results do not depend on the number of
+# processes.
+BLOCK_SIZE = 1024
+
+
+def new_seed() -> int:
+    """Draw a seed from the operating system's source of randomness."""
+    return SystemRandom().getrandbits(64)
+
+
+def derive_seed(seed: int, *indices: int) -> int:
+    """Derive the seed of the stream at `indices` from `seed`."""
+    key = ":".join(str(part) for part in (seed, *indices))
+    digest = sha256(key.encode()).digest()
+    return int.from_bytes(digest[:16], "little")
+
+
+def stream(seed: int, *indices: int) -> Random:
+    """Return a generator for the stream at `indices` derived from `seed`."""
+    return Random(derive_seed(seed, *indices))
+
+
+def blocks(rounds: int,
+           block_size: int = BLOCK_SIZE) -> list[tuple[int, int]]:
+    """Split `rounds` into blocks, returning each block's index and size."""
+    n_blocks, remainder = divmod(rounds, block_size)
+    block_list = [(index, block_size) for index in range(n_blocks)]
+    if remainder:
+        block_list.append((n_blocks, remainder))
+    return block_list
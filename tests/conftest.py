@@ -37,3 +37,47 @@ def donations(donees):
         donees[0]: 50,
         donees[3]: 10
     }
+
+
+@pytest.fixture
+def mock_data_paths(monkeypatch, tmp_path):
+    """Keep the ledger, log and last donation time in a temporary directory."""
+    import donate.database
+    import donate.ledger
+    import donate.logs
+    import donate.paths
+    import donate.schedule
+
+    monkeypatch.setattr(donate.paths, "_data_path", tmp_path)
+    monkeypatch.setattr(donate.ledger, "_ledger_path",
+                        lambda: tmp_path / "ledger.json")
+    monkeypatch.setattr(donate.logs, "_log_path",
+                        lambda: tmp_path / "donation_log.csv")
+    monkeypatch.setattr(donate.schedule, "_last_donation_path",
+                        lambda: tmp_path / "last_donation")
+    monkeypatch.setattr(donate.database, "_database_path",
+                        lambda: tmp_path / "donate.sqlite")
+    return tmp_path
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    """Write an example configuration file."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(
+        "---\n"
+        "total_donation: 20\n"
+        "split: 4\n"
+        "schedule: monthly\n"
+        "weights:\n"
+        "  large: 1.0\n"
+        "donees:\n"
+        "  - name: Favourite distro\n"
+        "    weight: large\n"
+        "    category: distribution\n"
+        "    url: distro.com\n"
+        "  - name: Favourite software\n"
+        "    weight: 0.5\n"
+        "    url: software.com\n"
+    )
+    return config_path
@@ -0,0 +1,156 @@
+"""Test batch generation for many profiles."""
+import donate.configuration
+from donate.batch import (Profile, batch_summary, find_profiles, run_batch,
+                          run_profile)
+import json
+from pathlib import Path
+import pytest
+import re
+
+
+@pytest.fixture(autouse=True)
+def mock_cache_path(monkeypatch, tmp_path):
+    def _config_cache_path(config_path):
+        return tmp_path / f"{config_path.parent.name}.pickle"
+    monkeypatch.setattr(donate.configuration, "_config_cache_path",
+                        _config_cache_path)
+
+
+@pytest.fixture
+def profiles_path(tmp_path, config_path):
+    profiles_path = tmp_path / "profiles"
+    for name in ["alice", "bob", "carol"]:
+        (profiles_path / name).mkdir(parents=True)
+        (profiles_path / name / "config.yaml").write_text(
+            config_path.read_text()
+        )
+    # Directories without a configuration are not profiles
+    (profiles_path / "empty").mkdir()
+    return profiles_path
+
+
+def test_find_profiles_directory(profiles_path):
+    profiles = find_profiles(profiles_path)
+
+    assert [profile.name for profile in profiles] == ["alice", "bob", "carol"]
+    assert profiles[0].config_path == profiles_path / "alice" / "config.yaml"
+    assert profiles[0].data_path == profiles_path / "alice" / "data"
+
+
+def test_find_profiles_manifest(profiles_path):
+    manifest_path = profiles_path / "manifest.yaml"
+    manifest_path.write_text(
+        "- config: alice/config.yaml\n"
+        "- name: robert\n"
+        "  config: bob/config.yaml\n"
+        "  data: state/bob\n"
+    )
+
+    profiles = find_profiles(manifest_path)
+
+    assert profiles == [
+        Profile("alice", profiles_path / "alice" / "config.yaml",
+                profiles_path / "alice" / "data"),
+        Profile("robert", profiles_path / "bob" / "config.yaml",
+                profiles_path / "state" / "bob")
+    ]
+
+
+def test_find_profiles_relative_manifest(profiles_path, monkeypatch):
+    (profiles_path / "manifest.yaml").write_text(
+        "- config: alice/config.yaml\n"
+        "- config: bob/config.yaml\n"
+        "  data: state/bob\n"
+    )
+    monkeypatch.chdir(profiles_path.parent)
+
+    profiles = find_profiles(Path("profiles/manifest.yaml"))
+
+    assert profiles == [
+        Profile("alice", Path("profiles/alice/config.yaml"),
+                Path("profiles/alice/data")),
+        Profile("bob", Path("profiles/bob/config.yaml"),
+                Path("profiles/state/bob"))
+    ]
+
+
+def test_run_profile(profiles_path):
+    profile = find_profiles(profiles_path)[0]
+    result = run_profile(profile)
+
+    assert result.error is None
+    assert result.due_donations == 1
+    assert result.total == 20
+    assert (profile.data_path / "last_donation").exists()
+
+    # The monthly donation has been made
+    assert run_profile(profile).due_donations == 0
+
+
+def test_run_profile_error(tmp_path):
+    profile = Profile("missing", tmp_path / "missing.yaml", tmp_path / "data")
+    result = run_profile(profile)
+
+    assert "FileNotFoundError" in result.error
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_batch(profiles_path, workers):
+    profiles = find_profiles(profiles_path)
+    results = run_batch(profiles, workers)
+
+    assert [result.name for result in results] == ["alice", "bob", "carol"]
+    for profile in profiles:
+        # Each profile's state is kept separately
+        with open(profile.data_path / "ledger.journal") as journal_file:
+            entries = [json.loads(line) for line in journal_file]
+        assert len(entries) == 1
+        assert sum(entries[0]["donations"].values()) == 20
+
+
+def test_run_batch_seed(profiles_path):
+    profiles = find_profiles(profiles_path)
+
+    def journal_entries():
+        entries = []
+        for profile in profiles:
+            journal_path = profile.data_path / "ledger.journal"
+            with open(journal_path) as journal_file:
+                entry = json.loads(journal_file.readline())
+            entries.append(entry["donations"])
+        return entries
+
+    run_batch(profiles, 1, ad_hoc=True, seed=3)
+    single = journal_entries()
+    for profile in profiles:
+        (profile.data_path / "ledger.journal").unlink()
+    run_batch(profiles, 2, ad_hoc=True, seed=3)
+
+    assert journal_entries() == single
+
+
+def test_run_batch_memory(profiles_path):
+    profiles = find_profiles(profiles_path)
+    results = run_batch(profiles, 1, storage_backend="memory")
+
+    assert [result.due_donations for result in results] == [1, 1, 1]
+    for profile in profiles:
+        assert not (profile.data_path / "ledger.journal").exists()
+
+
+def test_run_batch_dry_run(profiles_path):
+    profiles = find_profiles(profiles_path)
+    run_batch(profiles, 1, dry_run=True)
+
+    for profile in profiles:
+        assert not (profile.data_path / "last_donation").exists()
+
+
+def test_batch_summary(profiles_path):
+    results = run_batch(find_profiles(profiles_path), 1)
+    summary = batch_summary(results, 0.5)
+
+    assert re.search(r"^alice\s+1\s+\d\s+£20\s", summary, re.MULTILINE)
+    assert summary.endswith(
+        "3 profiles (0 failed) in 0.50 s (6.0 profiles per second)"
+    )
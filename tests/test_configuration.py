@@ -1,5 +1,7 @@
-from donate.configuration import parse_config
+import donate.configuration
+from donate.configuration import parse_config, load_config
 from donate.donee import Donee
+import os
 from textwrap import dedent
 from pydantic import ValidationError
 import pytest
@@ -102,3 +104,101 @@ class TestParseConfig:
         with pytest.raises(ValidationError) as e:
             parse_config(yaml_string)
             assert "Schedule 'occasional' is not valid" in str(e.value)
+
+    def test_default_storage(self):
+        config = parse_config(self.yaml_string)
+        assert config.storage == "files"
+
+    def test_sqlite_storage(self):
+        yaml_string = self.yaml_string.replace(
+            "schedule: ad hoc", "schedule: ad hoc\nstorage: sqlite"
+        )
+
+        config = parse_config(yaml_string)
+        assert config.storage == "sqlite"
+
+    @pytest.mark.parametrize("storage", ["cloud", "memory"])
+    def test_invalid_storage(self, storage):
+        yaml_string = self.yaml_string.replace(
+            "schedule: ad hoc", f"schedule: ad hoc\nstorage: {storage}"
+        )
+
+        with pytest.raises(ValidationError) as e:
+            parse_config(yaml_string)
+        assert f"Storage '{storage}' is not valid" in str(e.value)
+
+    def test_duplicate_donee(self):
+        yaml_string = self.yaml_string.replace(
+            "name: Favourite software", "name: Favourite distro"
+        )
+
+        with pytest.raises(ValidationError) as e:
+            parse_config(yaml_string)
+        assert "Donee 'Favourite distro' is duplicated" in str(e.value)
+
+
+class TestLoadConfig:
+    @pytest.fixture
+    def config_path(self, tmp_path):
+        config_path = tmp_path / "config.yaml"
+        config_path.write_text(TestParseConfig.yaml_string)
+        return config_path
+
+    @pytest.fixture(autouse=True)
+    def mock_cache_path(self, monkeypatch, tmp_path):
+        def _config_cache_path(config_path):
+            return tmp_path / "config.pickle"
+        monkeypatch.setattr(donate.configuration, "_config_cache_path",
+                            _config_cache_path)
+
+    @pytest.fixture
+    def count_parses(self, monkeypatch):
+        calls = []
+
+        def mock_parse_config(config):
+            calls.append(config)
+            return parse_config(config)
+        monkeypatch.setattr(donate.configuration, "parse_config",
+                            mock_parse_config)
+        return calls
+
+    def test_load(self, config_path):
+        config = load_config(config_path)
+        assert config == parse_config(TestParseConfig.yaml_string)
+
+    def test_cached(self, config_path, count_parses):
+        first = load_config(config_path)
+        second = load_config(config_path)
+
+        assert first == second
+        assert len(count_parses) == 1
+
+    def test_invalidated(self, config_path, count_parses):
+        load_config(config_path)
+
+        config_path.write_text(
+            TestParseConfig.yaml_string.replace("split: 4", "split: 5")
+        )
+        config = load_config(config_path)
+
+        assert config.split == 5
+        assert len(count_parses) == 2
+
+    def test_corrupt_cache(self, config_path, tmp_path, count_parses):
+        (tmp_path / "config.pickle").write_bytes(b"not a pickle")
+
+        config = load_config(config_path)
+
+        assert config.total_donation == 20
+        assert len(count_parses) == 1
+
+    def test_cache_unwritable(self, config_path, tmp_path, monkeypatch):
+        def replace(src, dst):
+            raise PermissionError("read only")
+        monkeypatch.setattr(os, "replace", replace)
+
+        config = load_config(config_path)
+
+        assert config.total_donation == 20
+        assert not (tmp_path / "config.pickle").exists()
+        assert not list(tmp_path.glob("config.pickle.*"))
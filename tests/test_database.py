@@ -0,0 +1,109 @@
+"""Test SQLite storage."""
+from datetime import datetime
+from donate.database import (connect, get_last_donation, record_donations,
+                             database_rollups, database_totals)
+import pytest
+import sqlite3
+
+
+@pytest.fixture
+def connection(tmp_path):
+    return connect(tmp_path / "donate.sqlite")
+
+
+def test_empty_last_donation(connection):
+    assert get_last_donation(connection) is None
+
+
+def test_record_donations(connection, donations):
+    time = datetime(1990, 9, 11, 12, 30)
+    record_donations(connection, donations, "£", time)
+
+    assert get_last_donation(connection) == time
+
+    rows = connection.execute(
+        "SELECT date, donee, category, currency_symbol, amount"
+        " FROM donations ORDER BY amount DESC"
+    ).fetchall()
+    assert rows == [
+        ("1990-09-11", "Favourite distro", "distribution", "£", 100),
+        ("1990-09-11", "Favourite software", "software", "£", 50),
+        ("1990-09-11", "Podcast 1", "podcast", "£", 10)
+    ]
+
+
+def test_update_last_donation(connection, donations):
+    record_donations(connection, donations, "£", datetime(1990, 9, 11))
+    record_donations(connection, donations, "£", datetime(1990, 10, 11))
+
+    assert get_last_donation(connection) == datetime(1990, 10, 11)
+
+
+def test_record_donations_rollback(connection, donations):
+    # A failing insert must not update the last donation time
+    connection.execute("DROP TABLE donations")
+    connection.execute("CREATE TABLE donations (id INTEGER PRIMARY KEY)")
+
+    with pytest.raises(Exception):
+        record_donations(connection, donations, "£", datetime(1990, 9, 11))
+
+    assert get_last_donation(connection) is None
+
+
+def test_database_totals(connection, donations):
+    record_donations(connection, donations, "£", datetime(1990, 9, 11))
+    record_donations(connection, donations, "£", datetime(1990, 10, 11))
+
+    total, number = database_totals(connection)
+
+    assert total == {"Favourite distro": 200, "Favourite software": 100,
+                     "Podcast 1": 20}
+    assert number["Favourite distro"] == 2
+
+
+def test_database_rollups(connection, donations):
+    record_donations(connection, donations, "£", datetime(1990, 9, 11))
+    record_donations(connection, donations, "£", datetime(1990, 10, 1))
+
+    rollups = database_rollups(connection)
+
+    assert rollups["1990-09"]["software"] == [50, 1]
+    assert rollups["1990-10"]["distribution"] == [100, 1]
+
+
+def test_database_rollups_window(connection, donations):
+    for month in [8, 9, 10]:
+        record_donations(connection, donations, "£",
+                         datetime(1990, month, 11))
+
+    assert list(database_rollups(connection, since="1990-09")) == [
+        "1990-09", "1990-10"
+    ]
+    assert list(database_rollups(connection, "1990-09", "1990-09")) == [
+        "1990-09"
+    ]
+
+
+def test_rollups_table(connection, donations):
+    record_donations(connection, donations, "£", datetime(1990, 9, 11))
+    record_donations(connection, donations, "£", datetime(1990, 9, 12))
+
+    # Rollups are kept up to date as donations are recorded
+    rows = connection.execute(
+        "SELECT month, category, total, number FROM rollups"
+        " WHERE category = 'software'"
+    ).fetchall()
+    assert rows == [("1990-09", "software", 100, 2)]
+
+
+def test_rollups_backfilled(tmp_path, donations):
+    path = tmp_path / "donate.sqlite"
+    record_donations(connect(path), donations, "£", datetime(1990, 9, 11))
+
+    # A database from before the rollups table
+    old = sqlite3.connect(path)
+    old.executescript("DROP TABLE rollups; PRAGMA user_version = 0;")
+    old.close()
+
+    rollups = database_rollups(connect(path))
+    assert rollups["1990-09"]["software"] == [50, 1]
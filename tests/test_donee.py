@@ -0,0 +1,61 @@
+from array import array
+from donate.donee import Donee, DoneeTable
+from donate.maths import (weights, names, normalised_weights, donee_means,
+                          category_means, donee_statistics,
+                          category_statistics, single_donation,
+                          catch_up_donation)
+from donate.sampler import get_sampler
+import pytest
+
+
+@pytest.fixture(scope="module")
+def table(donees):
+    return DoneeTable.from_donees(donees)
+
+
+def test_from_donees(donees, table):
+    assert len(table) == len(donees)
+    assert table.names == [donee.name for donee in donees]
+    assert table.weights == array("d", [donee.weight for donee in donees])
+    assert table.urls == [donee.url for donee in donees]
+    assert table.categories == [
+        "software", "distribution", "podcast", "organisation"
+    ]
+    assert [table.categories[code] for code in table.category_codes] == [
+        donee.category for donee in donees
+    ]
+
+
+def test_getitem(donees, table):
+    for index, donee in enumerate(donees):
+        assert table[index] == donee
+        assert isinstance(table[index], Donee)
+
+    # Rows are only converted to models once
+    assert table[0] is table[0]
+
+
+def test_sampler_cached(table):
+    assert get_sampler(table) is get_sampler(table)
+
+
+@pytest.mark.parametrize("function", [weights, names, normalised_weights])
+def test_columns(donees, table, function):
+    assert function(table) == function(donees)
+
+
+@pytest.mark.parametrize("function", [donee_means, category_means])
+def test_means(donees, table, function):
+    assert function(table, 100) == pytest.approx(function(donees, 100))
+
+
+@pytest.mark.parametrize("function", [donee_statistics, category_statistics])
+def test_statistics(donees, table, function):
+    assert function(table, 100, 4) == pytest.approx(function(donees, 100, 4))
+
+
+@pytest.mark.parametrize("function", [single_donation, catch_up_donation])
+def test_donation(donees, table, function):
+    individual_donations = function(table, 20, 4)
+    assert sum(individual_donations.values()) == 20
+    assert all(donee in donees for donee in individual_donations)
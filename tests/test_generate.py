@@ -0,0 +1,155 @@
+from collections import Counter
+from donate import database
+from donate.configuration import load_config
+from donate.donee import Donee
+from donate.generate import (donation_rows, format_donations,
+                             generate_donations, make_donations)
+from donate.ledger import _get_ledger
+from donate.logs import log_segments
+from donate.schedule import get_last_donation
+from donate.state import record_intent
+from donate.storage import MemoryStorage
+from donate.streams import stream
+import multiprocessing
+import pytest
+import re
+
+
+def test_format_donations(donations):
+    donation_text = format_donations(donations, "$", False)
+
+    assert re.search(r"^Favourite distro\s+\$100\s+distro.com", donation_text,
+                     re.MULTILINE)
+    assert re.search(r"^Favourite software\s+\$50\s+software.com",
+                     donation_text,
+                     re.MULTILINE)
+    assert re.search(r"^Podcast 1\s+\$10\s+podcast1.com", donation_text,
+                     re.MULTILINE)
+
+
+def test_format_donations2(donations):
+    donation_text = format_donations(donations, "£", True)
+
+    assert re.search(r"^Favourite distro\s+\£1.00\s+distro.com", donation_text,
+                     re.MULTILINE)
+    assert re.search(r"^Favourite software\s+\£0.50\s+software.com",
+                     donation_text,
+                     re.MULTILINE)
+    assert re.search(r"^Podcast 1\s+\£0.10\s+podcast1.com", donation_text,
+                     re.MULTILINE)
+
+
+def test_format_donations_sorted():
+    donees = [Donee(name=name, weight=1, url=name) for name in "abc"]
+    donations = {donees[0]: 999, donees[1]: 1000, donees[2]: 50}
+
+    lines = format_donations(donations, "£", True).splitlines()[1:-1]
+    assert [line.split()[0] for line in lines] == ["b", "a", "c"]
+
+
+def test_donation_rows(donations):
+    rows = list(donation_rows(donations, "£", True))
+
+    assert rows[0] == {"donee": "Favourite distro", "amount": 1.0,
+                       "currency_symbol": "£", "url": "distro.com"}
+    assert [row["amount"] for row in rows] == sorted(
+        (row["amount"] for row in rows), reverse=True
+    )
+
+
+class TestGenerateDonations:
+    @pytest.fixture
+    def config(self, config_path):
+        return load_config(config_path)
+
+    def test_generate(self, config, mock_data_paths):
+        output = generate_donations(config)
+
+        assert output.startswith("1 donations due\n")
+        assert "distro.com" in output or "software.com" in output
+        assert get_last_donation() is not None
+        assert sum(_get_ledger()["total"].values()) == 20
+        assert len(log_segments()) == 1
+
+    def test_none_due(self, config, mock_data_paths):
+        generate_donations(config)
+        assert generate_donations(config) == "No donations due"
+
+    def test_ad_hoc(self, config, mock_data_paths):
+        generate_donations(config)
+        output = generate_donations(config, ad_hoc=True)
+
+        assert "donations due" not in output
+        assert sum(_get_ledger()["total"].values()) == 40
+
+    def test_dry_run(self, config, mock_data_paths):
+        generate_donations(config, dry_run=True)
+
+        assert get_last_donation() is None
+        assert _get_ledger()["total"] == Counter()
+        assert log_segments() == []
+
+    def test_sqlite(self, config, mock_data_paths):
+        config = config.copy(update={"storage": "sqlite"})
+        generate_donations(config)
+
+        assert get_last_donation() is None
+        assert database.get_last_donation(database.connect()) is not None
+        assert generate_donations(config) == "No donations due"
+
+    def test_seed(self, config, mock_data_paths):
+        assert (
+            generate_donations(config, ad_hoc=True, dry_run=True,
+                               rng=stream(5))
+            == generate_donations(config, ad_hoc=True, dry_run=True,
+                                  rng=stream(5))
+        )
+
+    def test_distinct(self, config, mock_data_paths):
+        config = config.copy(update={"split": 2})
+        _, donations = make_donations(config, distinct=True)
+
+        assert sorted(donations.values()) == [10, 10]
+        assert sum(_get_ledger()["total"].values()) == 20
+
+    def test_distinct_too_many(self, config, mock_data_paths):
+        config = config.copy(update={"split": 5})
+        with pytest.raises(ValueError):
+            make_donations(config, distinct=True)
+
+    def test_balanced(self, config):
+        storage = MemoryStorage()
+        for _ in range(3):
+            make_donations(config, ad_hoc=True, storage=storage,
+                           balanced=True)
+
+        # Favourite distro's weight is twice Favourite software's
+        assert storage.totals()[0] == {"Favourite distro": 40,
+                                       "Favourite software": 20}
+
+    def test_balanced_pending(self, config, mock_data_paths):
+        # A round recorded but not yet committed counts towards the totals
+        distro, software = config.donees
+        record_intent(Counter({distro: 20}), "£", False)
+
+        _, donations = make_donations(config, ad_hoc=True, balanced=True)
+
+        assert donations == {distro: 5, software: 15}
+
+    def test_balanced_concurrent(self, config_path, mock_data_paths):
+        context = multiprocessing.get_context("fork")
+        with context.Pool(4) as pool:
+            pool.map(_generate_balanced, [config_path] * 4)
+
+        # Each run is balanced against the rounds before it
+        total = _get_ledger()["total"]
+        assert abs(total["Favourite distro"] - 80 * 2 / 3) <= 5
+        assert abs(total["Favourite software"] - 80 / 3) <= 5
+
+    def test_distinct_balanced(self, config):
+        with pytest.raises(ValueError):
+            make_donations(config, distinct=True, balanced=True)
+
+
+def _generate_balanced(config_path):
+    make_donations(load_config(config_path), ad_hoc=True, balanced=True)
@@ -1,7 +1,11 @@
 from collections import Counter
 import donate.ledger
-from donate.ledger import (_ledger_path, _get_ledger, update_ledger,
-                           ledger_stats)
+from datetime import datetime
+from donate.ledger import (_ledger_path, _journal_path, _get_ledger,
+                           _last_line, _last_sequence, append_journal,
+                           compact_ledger, get_rollups, journal_entry,
+                           update_ledger, ledger_stats, rollup_rows,
+                           rollup_stats, stats_rows)
 import json
 import pytest
 import re
@@ -15,6 +19,14 @@ def test_ledger_path():
     assert path_string.split("/")[-2] == "donate"
 
 
+def test_journal_path():
+    journal_path = _journal_path()
+    path_string = str(journal_path.absolute())
+
+    assert path_string.split("/")[-1] == "ledger.journal"
+    assert path_string.split("/")[-2] == "donate"
+
+
 @pytest.fixture
 def mock_ledger_path(tmp_path):
     def _ledger_path():
@@ -52,8 +64,7 @@ def test_update_empty_ledger(monkeypatch, donations, mock_ledger_path):
 
     update_ledger(donations)
 
-    with open(mock_ledger_path(), "r") as ledger_file:
-        ledger = json.load(ledger_file)
+    ledger = _get_ledger()
 
     assert ledger["total"]["Favourite distro"] == 100
     assert ledger["total"]["Favourite software"] == 50
@@ -62,23 +73,18 @@ def test_update_empty_ledger(monkeypatch, donations, mock_ledger_path):
 
 
 def test_update_ledger(monkeypatch, donees, donations, mock_ledger_path):
-    def mock_get_ledger():
-        return {
-            "total": Counter(
-                {"Favourite distro": 50, "Favourite software": 30}
-            ),
-            "number": Counter(
-                {"Favourite distro": 5, "Favourite software": 2}
-            )
-        }
+    ledger_dict = {
+        "total": {"Favourite distro": 50, "Favourite software": 30},
+        "number": {"Favourite distro": 5, "Favourite software": 2}
+    }
+    with open(mock_ledger_path(), "w") as ledger_file:
+        json.dump(ledger_dict, ledger_file)
 
     monkeypatch.setattr(donate.ledger, "_ledger_path", mock_ledger_path)
-    monkeypatch.setattr(donate.ledger, "_get_ledger", mock_get_ledger)
 
     update_ledger(donations)
 
-    with open(mock_ledger_path(), "r") as ledger_file:
-        ledger = json.load(ledger_file)
+    ledger = _get_ledger()
 
     assert ledger["total"]["Favourite distro"] == 150
     assert ledger["total"]["Favourite software"] == 80
@@ -88,6 +94,175 @@ def test_update_ledger(monkeypatch, donees, donations, mock_ledger_path):
     assert ledger["number"]["Podcast 1"] == 1
 
 
+def test_update_ledger_appends(monkeypatch, donations, mock_ledger_path):
+    monkeypatch.setattr(donate.ledger, "_ledger_path", mock_ledger_path)
+
+    update_ledger(donations)
+    update_ledger(donations)
+
+    # The snapshot is not written until the journal is compacted
+    assert not mock_ledger_path().exists()
+
+    with open(_journal_path(), "r") as journal_file:
+        entries = [json.loads(line) for line in journal_file]
+
+    assert [entry["sequence"] for entry in entries] == [1, 2]
+    assert entries[0]["donations"]["Favourite distro"] == 100
+    assert _last_sequence() == 2
+
+
+def test_compact_ledger(monkeypatch, donations, mock_ledger_path):
+    monkeypatch.setattr(donate.ledger, "_ledger_path", mock_ledger_path)
+
+    update_ledger(donations)
+    update_ledger(donations)
+    compact_ledger()
+
+    with open(mock_ledger_path(), "r") as ledger_file:
+        snapshot = json.load(ledger_file)
+
+    assert snapshot["sequence"] == 2
+    assert snapshot["total"]["Favourite distro"] == 200
+    assert snapshot["number"]["Favourite distro"] == 2
+
+    # Only a sequence marker remains in the journal
+    with open(_journal_path(), "r") as journal_file:
+        assert journal_file.readlines() == ['{"sequence": 2}\n']
+
+    update_ledger(donations)
+
+    assert _last_sequence() == 3
+    ledger = _get_ledger()
+    assert ledger["total"]["Favourite distro"] == 300
+    assert ledger["number"]["Favourite distro"] == 3
+
+
+def test_compact_ledger_interrupted(monkeypatch, donations, mock_ledger_path):
+    monkeypatch.setattr(donate.ledger, "_ledger_path", mock_ledger_path)
+
+    update_ledger(donations)
+    update_ledger(donations)
+
+    # Write the snapshot without clearing the journal, as if compaction was
+    # interrupted
+    snapshot = dict(sequence=2, **_get_ledger())
+    with open(mock_ledger_path(), "w") as ledger_file:
+        json.dump(snapshot, ledger_file)
+
+    ledger = _get_ledger()
+    assert ledger["total"]["Favourite distro"] == 200
+    assert ledger["number"]["Favourite distro"] == 2
+
+
+def test_automatic_compaction(monkeypatch, donations, mock_ledger_path):
+    monkeypatch.setattr(donate.ledger, "_ledger_path", mock_ledger_path)
+    monkeypatch.setattr(donate.ledger, "COMPACTION_SIZE", 200)
+
+    for _ in range(5):
+        update_ledger(donations)
+
+    assert mock_ledger_path().exists()
+    assert _journal_path().stat().st_size <= 200
+
+    ledger = _get_ledger()
+    assert ledger["total"]["Favourite distro"] == 500
+    assert ledger["number"]["Podcast 1"] == 5
+
+
+def test_journal_entry(donations):
+    entry = journal_entry(donations, datetime(2021, 3, 4))
+
+    assert entry["date"] == "2021-03-04"
+    assert entry["donations"]["Favourite distro"] == 100
+    assert entry["categories"]["software"] == [50, 1]
+    assert entry["categories"]["podcast"] == [10, 1]
+
+
+def test_rollups(monkeypatch, donations, mock_ledger_path):
+    monkeypatch.setattr(donate.ledger, "_ledger_path", mock_ledger_path)
+
+    append_journal([
+        journal_entry(donations, datetime(2021, 3, 4)),
+        journal_entry(donations, datetime(2021, 3, 20)),
+        journal_entry(donations, datetime(2021, 4, 1))
+    ])
+    rollups = get_rollups()
+
+    assert rollups["2021-03"]["distribution"] == [200, 2]
+    assert rollups["2021-04"]["distribution"] == [100, 1]
+
+    # Rollups are kept in the snapshot
+    compact_ledger()
+    with open(mock_ledger_path(), "r") as ledger_file:
+        assert json.load(ledger_file)["rollups"] == rollups
+
+    update_ledger(donations)
+    month = f"{datetime.today():%Y-%m}"
+    assert get_rollups()[month]["software"][1] >= 1
+
+
+class TestRollupStats:
+    rollups = {
+        "2021-01": {"a": [1000, 2], "b": [500, 1]},
+        "2021-02": {"a": [300, 1]},
+        "2022-01": {"b": [250, 3]}
+    }
+
+    def test_month(self):
+        stats = rollup_stats(self.rollups, "month", "£", True)
+
+        assert re.match(r"^Month\s+Total / £\s+Number of donations"
+                        r"\s+Change / £$", stats, re.MULTILINE)
+        assert re.search(r"^2021-01\s+15.00\s+3\s+-$", stats, re.MULTILINE)
+        assert re.search(r"^2021-02\s+3.00\s+1\s+-12.00$", stats,
+                         re.MULTILINE)
+
+    def test_year(self):
+        stats = rollup_stats(self.rollups, "year", "£", False)
+
+        assert re.search(r"^2021\s+1800\s+4\s+-$", stats, re.MULTILINE)
+        assert re.search(r"^2022\s+250\s+3\s+-1550$", stats, re.MULTILINE)
+
+    def test_category(self):
+        stats = rollup_stats(self.rollups, "category", "£", False)
+
+        assert re.search(r"^a\s+1300\s+3\s+63.4%$", stats, re.MULTILINE)
+        assert re.search(r"^b\s+750\s+4\s+36.6%$", stats, re.MULTILINE)
+
+    def test_window(self):
+        stats = rollup_stats(self.rollups, "month", "£", False,
+                             since="2021-02", until="2021-12")
+
+        assert "2021-01" not in stats
+        assert "2022-01" not in stats
+        assert re.search(r"^2021-02\s+300\s+1\s+-$", stats, re.MULTILINE)
+
+    def test_rows(self):
+        assert list(rollup_rows(self.rollups, "year", True)) == [
+            {"year": "2021", "total": 18.0, "number": 4, "change": None},
+            {"year": "2022", "total": 2.5, "number": 3, "change": -15.5}
+        ]
+        assert next(rollup_rows(self.rollups, "category", False)) == (
+            {"category": "a", "total": 1300, "number": 3,
+             "share": 1300 / 2050}
+        )
+
+    def test_invalid(self):
+        with pytest.raises(ValueError, match="Breakdown 'week' is not valid"):
+            rollup_stats(self.rollups, "week", "£", False)
+
+
+def test_last_line(tmp_path):
+    path = tmp_path / "file"
+    long_line = "x" * 10000
+    path.write_text(f"first\n{long_line}\n")
+
+    assert _last_line(path) == long_line.encode()
+
+    path.write_text("")
+    assert _last_line(path) is None
+
+
 def test_ledger_stats(monkeypatch):
     def mock_get_ledger():
         return {
@@ -132,3 +307,10 @@ def test_ledger_stats_decimal(monkeypatch):
                     re.MULTILINE)
     assert re.search(r"^a\s+5$", number_stats, re.MULTILINE)
     assert re.search(r"^b\s+2$", number_stats, re.MULTILINE)
+
+
+def test_stats_rows():
+    assert list(stats_rows({"a": 30, "b": 5050}, {"a": 2, "b": 5}, True)) == [
+        {"donee": "b", "total": 50.5, "number": 5},
+        {"donee": "a", "total": 0.3, "number": 2}
+    ]
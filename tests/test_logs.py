@@ -1,7 +1,10 @@
 """Test log functions."""
 from datetime import date
 import donate
-from donate.logs import _log_path, update_log
+from donate.logs import (_index_path, _log_path, _segment_path, LogRecord,
+                         append_log, log_segments, log_sizes, read_log,
+                         restore_log, rotate_log, update_index, update_log)
+import gzip
 import pytest
 
 
@@ -36,7 +39,8 @@ def test_update_log(monkeypatch, mock_log_path, mock_date, donations):
 
     update_log(donations, "£", False)
 
-    with open(mock_log_path(), "r") as csvfile:
+    segment_path = mock_log_path().with_name("donation_log-1990.csv")
+    with open(segment_path, "r") as csvfile:
         log_lines = csvfile.readlines()
 
     assert "1990-09-11" in log_lines[0]
@@ -56,7 +60,8 @@ def test_update_log_decimal(monkeypatch, mock_log_path, mock_date, donations):
 
     update_log(donations, "$", True)
 
-    with open(mock_log_path(), "r") as csvfile:
+    segment_path = mock_log_path().with_name("donation_log-1990.csv")
+    with open(segment_path, "r") as csvfile:
         log_lines = csvfile.readlines()
 
     assert "1990-09-11" in log_lines[0]
@@ -68,3 +73,151 @@ def test_update_log_decimal(monkeypatch, mock_log_path, mock_date, donations):
     assert "1990-09-11" in log_lines[2]
     assert "Podcast 1" in log_lines[2]
     assert "$,0.1" in log_lines[2]
+
+
+class TestReadLog:
+    rows = [
+        "2021-01-05,a,£,10\n",
+        "2021-01-20,b,£,2.5\n",
+        "2021-02-05,a,£,10\n",
+        "2021-04-05,\"c, d\",£,10\n",
+    ]
+
+    @pytest.fixture
+    def log(self, mock_data_paths):
+        _log_path().write_text("".join(self.rows))
+
+    def test_records(self, log):
+        assert list(read_log()) == [
+            LogRecord(date(2021, 1, 5), "a", "£", 10),
+            LogRecord(date(2021, 1, 20), "b", "£", 2.5),
+            LogRecord(date(2021, 2, 5), "a", "£", 10),
+            LogRecord(date(2021, 4, 5), "c, d", "£", 10),
+        ]
+
+    @pytest.mark.parametrize("since,until,expected", [
+        (date(2021, 1, 6), None, ["b", "a", "c, d"]),
+        (None, date(2021, 2, 5), ["a", "b", "a"]),
+        (date(2021, 3, 1), date(2021, 3, 31), []),
+        (date(2021, 5, 1), None, []),
+    ])
+    def test_filters(self, log, since, until, expected):
+        assert [record.donee for record in read_log(since, until)] == (
+            expected
+        )
+
+    def offset(self, row):
+        return sum(len(line.encode()) for line in self.rows[:row])
+
+    def test_index(self, log):
+        index = update_index()
+
+        assert index["months"] == {"2021-01": 0, "2021-02": self.offset(2),
+                                   "2021-04": self.offset(3)}
+        assert index["size"] == _log_path().stat().st_size
+        assert _index_path().exists()
+
+    def test_seek(self, log):
+        # Records before the first month read should not be parsed
+        _log_path().write_text("2021-01-01,a,£,invalid\n" + "".join(
+            self.rows[2:]
+        ))
+
+        assert len(list(read_log(date(2021, 2, 1)))) == 2
+        with pytest.raises(ValueError):
+            list(read_log())
+
+    def test_index_incremental(self, log):
+        update_index()
+        with open(_log_path(), "a") as log_file:
+            log_file.write("2021-06-01,a,£,10\n")
+
+        assert update_index()["months"]["2021-06"] == self.offset(4)
+        assert [record.donee for record in read_log(date(2021, 6, 1))] == (
+            ["a"]
+        )
+
+    def test_partial_record(self, log):
+        with open(_log_path(), "a") as log_file:
+            log_file.write("2021-06-01,a,")
+
+        assert len(list(read_log())) == 4
+        assert update_index()["size"] == self.offset(4)
+
+    def test_unordered(self, log):
+        with open(_log_path(), "a") as log_file:
+            log_file.write("2021-01-31,e,£,10\n")
+
+        assert not update_index()["ordered"]
+        assert [record.donee for record in read_log(
+            until=date(2021, 1, 31)
+        )] == ["a", "b", "e"]
+
+    def test_no_log(self, mock_data_paths):
+        assert list(read_log()) == []
+
+
+class TestSegments:
+    def test_segments(self, mock_data_paths):
+        append_log([["2020-05-01", "a", "£", 10]])
+        assert [path.name for path in log_segments()] == [
+            "donation_log-2020.csv"
+        ]
+
+        append_log([["2021-01-01", "b", "£", 10]])
+        assert [path.name for path in log_segments()] == [
+            "donation_log-2020.csv.gz", "donation_log-2021.csv"
+        ]
+        assert [record.donee for record in read_log()] == ["a", "b"]
+
+    def test_late_record(self, mock_data_paths):
+        append_log([["2020-05-01", "a", "£", 10],
+                    ["2021-01-01", "b", "£", 10]])
+        append_log([["2020-12-31", "c", "£", 10]])
+
+        assert len(log_segments()) == 2
+        with gzip.open(_segment_path("2020").with_suffix(".csv.gz"),
+                       "rt") as segment_file:
+            assert len(segment_file.readlines()) == 2
+
+    def test_filters(self, mock_data_paths):
+        append_log([["2019-05-01", "a", "£", 10],
+                    ["2020-05-01", "b", "£", 10],
+                    ["2021-01-01", "c", "£", 10]])
+
+        assert [
+            record.donee for record in read_log(date(2020, 1, 1),
+                                                date(2020, 12, 31))
+        ] == ["b"]
+
+    def test_unsegmented_log(self, mock_data_paths):
+        _log_path().write_text("2018-01-01,a,£,10\n")
+        append_log([["2020-05-01", "b", "£", 10]])
+
+        assert [record.donee for record in read_log()] == ["a", "b"]
+
+    def test_interrupted_rotation(self, mock_data_paths):
+        append_log([["2020-05-01", "a", "£", 10],
+                    ["2021-01-01", "b", "£", 10]])
+        # Restore the uncompressed segment as if it had not been removed
+        _segment_path("2020").write_text("2020-05-01,a,£,10\n")
+
+        assert [record.donee for record in read_log()] == ["a", "b"]
+        rotate_log()
+        assert not _segment_path("2020").exists()
+        assert not _index_path(_segment_path("2020")).exists()
+        assert [record.donee for record in read_log()] == ["a", "b"]
+
+    def test_restore(self, mock_data_paths):
+        append_log([["2020-05-01", "a", "£", 10]])
+        update_index(_segment_path("2020"))
+        sizes = log_sizes()
+
+        append_log([["2020-06-01", "b", "£", 10],
+                    ["2021-01-01", "c", "£", 10]], rotate=False)
+        update_index(_segment_path("2020"))
+        restore_log(sizes)
+
+        assert log_sizes() == sizes
+        assert not _index_path(_segment_path("2020")).exists()
+        assert [record.donee for record in read_log()] == ["a"]
@@ -1,26 +1,41 @@
-from donate.__main__ import format_donations
-import re
+from donate.__main__ import check_distinct_split, check_workers
+from donate.configuration import load_config
+import pytest
+import subprocess
+import sys
+import typer
 
 
-def test_format_donations(donations):
-    donation_text = format_donations(donations, "$", False)
+def test_lazy_imports():
+    # Heavy dependencies should only be imported by the commands which need
+    # them
+    heavy_modules = ["pydantic", "yaml", "tabulate", "sqlite3",
+                     "concurrent.futures"]
+    script = "\n".join([
+        "import sys",
+        "import donate.__main__",
+        f"print([m for m in {heavy_modules} if m in sys.modules])"
+    ])
+    result = subprocess.run([sys.executable, "-c", script],
+                            capture_output=True, text=True, check=True)
 
-    assert re.search(r"^Favourite distro\s+\$100\s+distro.com", donation_text,
-                     re.MULTILINE)
-    assert re.search(r"^Favourite software\s+\$50\s+software.com",
-                     donation_text,
-                     re.MULTILINE)
-    assert re.search(r"^Podcast 1\s+\$10\s+podcast1.com", donation_text,
-                     re.MULTILINE)
+    assert result.stdout.strip() == "[]"
 
 
-def test_format_donations2(donations):
-    donation_text = format_donations(donations, "£", True)
+def test_check_distinct_split(config_path):
+    config = load_config(config_path)
+    check_distinct_split(config.copy(update={"split": 2}))
 
-    assert re.search(r"^Favourite distro\s+\£1.00\s+distro.com", donation_text,
-                     re.MULTILINE)
-    assert re.search(r"^Favourite software\s+\£0.50\s+software.com",
-                     donation_text,
-                     re.MULTILINE)
-    assert re.search(r"^Podcast 1\s+\£0.10\s+podcast1.com", donation_text,
-                     re.MULTILINE)
+    # The configuration has two donees
+    with pytest.raises(typer.BadParameter) as e:
+        check_distinct_split(config)
+    assert "Split '4' is larger than the number of donees" in str(e.value)
+
+
+def test_check_workers():
+    check_workers(None)
+    check_workers(1)
+
+    with pytest.raises(typer.BadParameter) as e:
+        check_workers(0)
+    assert "Workers '0' is not valid" in str(e.value)
@@ -1,6 +1,14 @@
-import donate
-from donate.maths import (weights, normalised_weights, single_donation, _means,
-                          donee_means, category_means, means_summary)
+from collections import Counter
+import donate.sampler
+from donate.donee import Donee
+from donate.maths import (weights, normalised_weights, single_donation,
+                          catch_up_donation, _means, donee_means,
+                          category_means, means_summary, _statistics,
+                          donee_statistics, category_statistics,
+                          statistics_summary, means_rows, distinct_donation,
+                          inclusion_probabilities, distinct_statistics,
+                          distinct_summary, distinct_rows, balanced_donation)
+from donate.streams import stream
 import pytest
 import re
 
@@ -57,11 +65,12 @@ class TestSingleDonation:
         assert f"The donation split {3}" in str(e.value)
 
     def test_single_donation_output(self, donees, monkeypatch):
-        # Create mock choices function which just returns 'k' of the first
+        # Create mock sample method which just returns 'k' of the first
         # element
-        def mock_choices(population, weights, *, k=1):
-            return [population[0]]*k
-        monkeypatch.setattr(donate.maths, "choices", mock_choices)
+        def mock_sample(self, k, rng=None):
+            return [self.donees[0]]*k
+        monkeypatch.setattr(donate.sampler.AliasSampler, "sample",
+                            mock_sample)
 
         individual_donations = single_donation(donees, 20, 4)
         assert sum(individual_donations.values()) == 20
@@ -69,6 +78,147 @@ class TestSingleDonation:
         for donee in individual_donations:
             assert donee is donees[0]
 
+    def test_rng(self, donees):
+        assert (
+            single_donation(donees, 100, 20, rng=stream(1))
+            == single_donation(donees, 100, 20, rng=stream(1))
+        )
+
+
+class TestCatchUpDonation:
+    def test_rng(self, donees):
+        assert (
+            catch_up_donation(donees, 1000, 200, rng=stream(1))
+            == catch_up_donation(donees, 1000, 200, rng=stream(1))
+        )
+
+    def test_total(self, donees):
+        individual_donations = catch_up_donation(donees, 20*12, 4*12)
+        assert sum(individual_donations.values()) == 240
+        assert all(
+            amount % 5 == 0 for amount in individual_donations.values()
+        )
+
+    def test_total_decimal(self, donees):
+        individual_donations = catch_up_donation(donees, 20*12, 4*12, True)
+        assert sum(individual_donations.values()) == 24000
+
+    def test_non_divisable(self, donees):
+        with pytest.raises(ValueError) as e:
+            catch_up_donation(donees, 10, 3)
+        assert f"The donation split {3}" in str(e.value)
+
+
+class TestBalancedDonation:
+    def test_total(self, donees):
+        individual_donations = balanced_donation(donees, 100, 10, {})
+        assert sum(individual_donations.values()) == 100
+        assert all(
+            amount % 10 == 0 for amount in individual_donations.values()
+        )
+
+    def test_decimal(self, donees):
+        individual_donations = balanced_donation(donees, 10, 4, {}, True)
+        assert sum(individual_donations.values()) == 1000
+
+    def test_first(self, donees):
+        individual_donations = balanced_donation(donees, 10, 1, {})
+        assert individual_donations == {donees[2]: 10}
+
+    def test_deficit(self, donees):
+        # Every other donee is at or above its share
+        totals = {donee.name: int(100 * weight)
+                  for donee, weight in zip(donees, normalised_weights(donees))}
+        totals["Favourite distro"] = 0
+
+        individual_donations = balanced_donation(donees, 10, 2, totals)
+        assert individual_donations == {donees[2]: 10}
+
+    def test_converges(self, donees):
+        totals: Counter[str] = Counter()
+        for _ in range(62):
+            for donee, amount in balanced_donation(donees, 10, 2,
+                                                   totals).items():
+                totals[donee.name] += amount
+
+        # Each donee is within one part of its target share
+        for donee, weight in zip(donees, normalised_weights(donees)):
+            assert abs(totals[donee.name] - 620 * weight) <= 5
+
+
+class TestDistinctDonation:
+    def test_distinct(self, donees):
+        individual_donations = distinct_donation(donees, 100, 5)
+        assert len(individual_donations) == 5
+        assert set(individual_donations.values()) == {20}
+
+    def test_decimal(self, donees):
+        individual_donations = distinct_donation(donees, 10, 4, True)
+        assert set(individual_donations.values()) == {250}
+
+    def test_rng(self, donees):
+        assert (
+            distinct_donation(donees, 100, 5, rng=stream(1))
+            == distinct_donation(donees, 100, 5, rng=stream(1))
+        )
+
+    def test_too_many(self, donees):
+        with pytest.raises(ValueError):
+            distinct_donation(donees, 100, 10)
+
+
+class TestInclusionProbabilities:
+    def test_sum(self, donees):
+        probabilities = inclusion_probabilities(donees, 3, 2000)
+        assert sum(probabilities) == pytest.approx(3)
+        assert all(0 <= probability <= 1 for probability in probabilities)
+
+    def test_all(self, donees):
+        assert inclusion_probabilities(donees, len(donees), 10) == [1.] * 9
+
+    def test_seed(self, donees):
+        assert (
+            inclusion_probabilities(donees, 3, 2000, seed=3)
+            == inclusion_probabilities(donees, 3, 2000, seed=3)
+        )
+
+    def test_analytic(self):
+        # A single donee is included with probability equal to its weight
+        probabilities = inclusion_probabilities(
+            [Donee(name="a", weight=3., category="c", url="a.com"),
+             Donee(name="b", weight=1., category="c", url="b.com")],
+            1, 20000, seed=1
+        )
+        assert probabilities[0] == pytest.approx(0.75, abs=0.02)
+
+
+def test_distinct_statistics(donees):
+    donee_rows, category_rows = distinct_statistics(donees, 100, 4, 2000,
+                                                    seed=2)
+
+    assert donee_rows[0][0] == "Favourite distro"
+    assert donee_rows[0][2] == pytest.approx(donee_rows[0][1] * 25)
+    assert sum(row[1] for row in category_rows) == pytest.approx(4)
+    assert sum(row[2] for row in category_rows) == pytest.approx(100)
+
+
+def test_distinct_summary(donees):
+    summary = distinct_summary(donees, 100, 4, "£", 1000, seed=2)
+
+    assert summary.startswith(
+        "Mean donations from £100 split between 4 distinct donees"
+    )
+    assert re.search(r"^Donee\s+P\(included\)\s+Mean donation / £", summary,
+                     re.MULTILINE)
+    assert re.search(r"^Category\s+Mean included", summary, re.MULTILINE)
+
+
+def test_distinct_rows(donees):
+    rows = list(distinct_rows(donees, 100, 4, 1000, seed=2))
+
+    assert set(rows[0]) == {"type", "name", "included", "mean"}
+    assert [row["type"] for row in rows].count("category") == 4
+
 
 expected_means = [16.129032258064516, 8.064516129032258, 32.25806451612903,
                   8.064516129032258, 8.064516129032258, 8.064516129032258,
@@ -122,3 +272,75 @@ def test_means_summary(donees):
                      re.MULTILINE)
     assert re.search(r"^podcast\s+32.2581$", category_means,
                      re.MULTILINE)
+
+
+def test_statistics():
+    mean, variance, std, p_any = _statistics(0.25, 100, 4)
+
+    assert mean == pytest.approx(25.)
+    # Each of 4 parts of 25 is received with probability 0.25
+    assert variance == pytest.approx(25.**2 * 4 * 0.25 * 0.75)
+    assert std == pytest.approx(variance**0.5)
+    assert p_any == pytest.approx(1 - 0.75**4)
+
+
+def test_statistics_certain():
+    mean, variance, std, p_any = _statistics(1., 100, 4)
+
+    assert mean == pytest.approx(100.)
+    assert variance == pytest.approx(0.)
+    assert p_any == pytest.approx(1.)
+
+
+def test_donee_statistics(donees):
+    statistics = donee_statistics(donees, 100, 4)
+
+    assert [elem[1] for elem in statistics] == pytest.approx(
+        sorted(expected_means, reverse=True)
+    )
+    assert statistics[0][0] == "Favourite distro"
+    assert statistics[0][4] == pytest.approx(1 - (1 - 0.3225806)**4)
+
+
+def test_category_statistics(donees):
+    statistics = category_statistics(donees, 100, 4)
+
+    assert len(statistics) == 4
+    assert [elem[1] for elem in statistics] == pytest.approx(
+        [32.25806451612903, 32.25806451612903, 27.41935483870968,
+         8.064516129032258]
+    )
+    # Categories are less variable than the sum of their donees
+    podcast = [elem for elem in statistics if elem[0] == "podcast"][0]
+    podcast_donees = [
+        elem for elem in donee_statistics(donees, 100, 4)
+        if elem[0].startswith("Podcast")
+    ]
+    assert podcast[2] < sum(elem[2] for elem in podcast_donees)
+
+
+def test_statistics_summary(donees):
+    statistics = statistics_summary(donees, 100, 4, "£")
+
+    header, donee_statistics, category_statistics = statistics.rsplit("\n\n")
+
+    assert re.search(r"^Donation statistics from £100 split 4 ways$", header,
+                     re.MULTILINE)
+    assert re.search(r"^Donee\s+Mean / £\s+Variance / £²", donee_statistics,
+                     re.MULTILINE)
+    assert re.search(r"^Favourite distro\s+32.2581", donee_statistics,
+                     re.MULTILINE)
+    assert re.search(r"^Category\s+Mean / £", category_statistics,
+                     re.MULTILINE)
+
+
+def test_means_rows(donees):
+    rows = list(means_rows(donees, 100, 10))
+
+    assert rows[0] == {"type": "donee", "name": "Favourite distro",
+                       "mean": pytest.approx(100 / 3.1)}
+    assert [row["type"] for row in rows].count("category") == 4
+
+    rows = list(means_rows(donees, 100, 10, statistics=True))
+    assert set(rows[0]) == {"type", "name", "mean", "variance",
+                            "standard_deviation", "p_any"}
@@ -0,0 +1,38 @@
+from donate.output import amount, write_rows
+import io
+import json
+import pytest
+
+rows = [{"name": "a", "amount": 1.5}, {"name": "b, c", "amount": 2}]
+
+
+def write(rows, output_format):
+    file = io.StringIO()
+    write_rows(iter(rows), output_format, file)
+    return file.getvalue()
+
+
+def test_ndjson():
+    assert write(rows, "ndjson") == (
+        '{"name": "a", "amount": 1.5}\n{"name": "b, c", "amount": 2}\n'
+    )
+
+
+@pytest.mark.parametrize("row_list", [rows, []])
+def test_json(row_list):
+    assert json.loads(write(row_list, "json")) == row_list
+
+
+def test_csv():
+    assert write(rows, "csv") == 'name,amount\na,1.5\n"b, c",2\n'
+    assert write([], "csv") == ""
+
+
+def test_invalid_format():
+    with pytest.raises(ValueError, match="Output format 'xml' is not valid"):
+        write(rows, "xml")
+
+
+def test_amount():
+    assert amount(150, True) == 1.5
+    assert amount(150, False) == 150
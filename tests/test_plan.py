@@ -0,0 +1,172 @@
+from donate.configuration import load_config
+from donate.donee import DoneeTable
+from donate.generate import make_donations
+from donate.plan import (_cursor_path, _plan_path, advance_plan,
+                         config_fingerprint, make_plan, plan_remaining,
+                         planned_donations)
+from donate.storage import MemoryStorage
+from donate.streams import stream
+import json
+import multiprocessing
+import pytest
+
+
+@pytest.fixture
+def config(config_path):
+    return load_config(config_path)
+
+
+@pytest.fixture
+def donees(config):
+    return DoneeTable.from_donees(config.donees)
+
+
+def test_fingerprint(config):
+    assert config_fingerprint(config) == config_fingerprint(config.copy())
+
+    donees = [donee.copy(update={"weight": 2.}) for donee in config.donees]
+    assert (
+        config_fingerprint(config.copy(update={"donees": donees}))
+        != config_fingerprint(config)
+    )
+    assert (
+        config_fingerprint(config.copy(update={"split": 2}))
+        != config_fingerprint(config)
+    )
+
+
+class TestMakePlan:
+    def test_plan(self, config, mock_data_paths):
+        make_plan(config, 3)
+
+        lines = _plan_path().read_text().splitlines()
+        assert json.loads(lines[0]) == {
+            "fingerprint": config_fingerprint(config), "periods": 3
+        }
+        assert len(lines) == 4
+        for line in lines[1:]:
+            assert sum(int(part.split(":")[1]) for part in line.split()) == 4
+        assert plan_remaining() == 3
+
+    def test_seed(self, config, mock_data_paths):
+        make_plan(config, 3, rng=stream(1))
+        plan = _plan_path().read_text()
+        make_plan(config, 3, rng=stream(1))
+
+        assert _plan_path().read_text() == plan
+
+    def test_replace(self, config, mock_data_paths):
+        make_plan(config, 3)
+        advance_plan(planned_donations(config, config.donees)[1])
+        make_plan(config, 2)
+
+        assert not _cursor_path().exists()
+        assert plan_remaining() == 2
+
+    def test_invalid_periods(self, config, mock_data_paths):
+        with pytest.raises(ValueError) as e:
+            make_plan(config, 0)
+        assert "Periods '0' is not valid" in str(e.value)
+
+
+class TestPlannedDonations:
+    def test_no_plan(self, config, donees, mock_data_paths):
+        assert planned_donations(config, donees) is None
+        assert plan_remaining() == 0
+
+    def test_take(self, config, donees, mock_data_paths):
+        make_plan(config, 2)
+
+        donations, offset = planned_donations(config, donees)
+        assert sum(donations.values()) == 20
+        # Taking rounds does not remove them
+        assert planned_donations(config, donees) == (donations, offset)
+
+        advance_plan(offset)
+        assert plan_remaining() == 1
+        advance_plan(planned_donations(config, donees)[1])
+        assert planned_donations(config, donees) is None
+
+    def test_rounds(self, config, donees, mock_data_paths):
+        make_plan(config, 3)
+
+        donations, _ = planned_donations(config, donees, 3)
+        assert sum(donations.values()) == 60
+        assert planned_donations(config, donees, 4) is None
+
+    def test_config_changed(self, config, donees, mock_data_paths):
+        make_plan(config, 3)
+        advance_plan(planned_donations(config, donees)[1])
+
+        config = config.copy(update={"split": 2})
+        donations, _ = planned_donations(config, donees)
+
+        assert set(donations.values()) <= {10, 20}
+        assert json.loads(_plan_path().read_text().splitlines()[0]) == {
+            "fingerprint": config_fingerprint(config), "periods": 3
+        }
+        assert plan_remaining() == 3
+
+
+class TestGenerate:
+    def test_generate(self, config, donees, mock_data_paths):
+        make_plan(config, 2)
+        planned, _ = planned_donations(config, donees)
+
+        _, donations = make_donations(config, donees, ad_hoc=True,
+                                      storage=MemoryStorage(), plan=True)
+
+        assert donations == planned
+        assert plan_remaining() == 1
+
+    def test_dry_run(self, config, mock_data_paths):
+        make_plan(config, 2)
+        make_donations(config, ad_hoc=True, dry_run=True, plan=True)
+
+        assert plan_remaining() == 2
+
+    def test_without_plan(self, config, mock_data_paths):
+        make_plan(config, 2)
+        make_donations(config, ad_hoc=True, storage=MemoryStorage())
+        make_donations(config, ad_hoc=True, storage=MemoryStorage(),
+                       plan=True, rng=stream(1))
+
+        assert plan_remaining() == 2
+
+    def test_exhausted(self, config, mock_data_paths):
+        make_plan(config, 1)
+        storage = MemoryStorage()
+        for _ in range(2):
+            make_donations(config, ad_hoc=True, storage=storage, plan=True)
+
+        assert sum(storage.totals()[0].values()) == 40
+
+    def test_interrupted(self, config, donees, mock_data_paths):
+        make_plan(config, 2)
+        storage = MemoryStorage()
+
+        def crash(*args, **kwargs):
+            raise OSError("crash")
+
+        storage.record_donations = crash
+        with pytest.raises(OSError):
+            make_donations(config, donees, ad_hoc=True, storage=storage,
+                           plan=True)
+
+        # The interrupted round is not taken again
+        assert plan_remaining() == 1
+
+    def test_concurrent(self, config_path, mock_data_paths):
+        make_plan(load_config(config_path), 8)
+
+        context = multiprocessing.get_context("fork")
+        with context.Pool(4) as pool:
+            pool.map(_generate_ad_hoc, [config_path] * 8)
+
+        # Every run took a different round
+        assert plan_remaining() == 0
+
+
+def _generate_ad_hoc(config_path):
+    make_donations(load_config(config_path), ad_hoc=True,
+                   storage=MemoryStorage(), plan=True)
@@ -0,0 +1,112 @@
+"""Test phase timing and profiling."""
+from donate.configuration import load_config
+from donate.generate import generate_donations
+from donate.profiling import Profiler, write_report
+import json
+import pytest
+import re
+
+
+def work():
+    return [str(i) for i in range(1000)]
+
+
+def test_disabled():
+    profiler = Profiler(enabled=False)
+    with profiler.phase("work"):
+        work()
+
+    assert profiler.phases == {}
+
+
+def test_timings():
+    profiler = Profiler()
+    with profiler.phase("work"):
+        work()
+    with profiler.phase("more work"):
+        work()
+
+    assert list(profiler.phases) == ["work", "more work"]
+    assert profiler.phases["work"]["seconds"] > 0
+    assert "calls" not in profiler.phases["work"]
+
+
+def test_detailed():
+    profiler = Profiler(enabled=False, detailed=True)
+    with profiler.phase("work"):
+        work()
+
+    record = profiler.phases["work"]
+    assert record["seconds"] > 0
+    assert record["calls"] >= 1
+    assert record["peak_bytes"] > 0
+
+
+def test_phase_exception():
+    profiler = Profiler()
+    with pytest.raises(ValueError):
+        with profiler.phase("failure"):
+            raise ValueError
+
+    assert "failure" in profiler.phases
+
+
+def test_report_json():
+    profiler = Profiler(detailed=True)
+    with profiler.phase("work"):
+        work()
+
+    report = json.loads(profiler.report("json"))
+    assert set(report["phases"]["work"]) == {
+        "seconds", "allocated_bytes", "peak_bytes", "calls"
+    }
+
+
+def test_report_openmetrics():
+    profiler = Profiler()
+    with profiler.phase("work"):
+        work()
+
+    report = profiler.report("openmetrics")
+    assert re.search(r"^# TYPE donate_phase_seconds gauge$", report,
+                     re.MULTILINE)
+    assert re.search(r'^donate_phase_seconds\{phase="work"\} [0-9.e-]+$',
+                     report, re.MULTILINE)
+    assert "donate_phase_calls" not in report
+    assert report.endswith("# EOF")
+
+
+def test_report_invalid():
+    with pytest.raises(ValueError):
+        Profiler().report("xml")
+
+
+def test_write_report(tmp_path):
+    profiler = Profiler()
+    with profiler.phase("work"):
+        work()
+
+    write_report(profiler, "json", str(tmp_path / "report.json"))
+
+    with open(tmp_path / "report.json") as report_file:
+        assert "work" in json.load(report_file)["phases"]
+
+
+def test_generate_phases(config_path, mock_data_paths):
+    profiler = Profiler()
+    generate_donations(load_config(config_path), profiler=profiler)
+
+    assert list(profiler.phases) == [
+        "schedule", "sampling", "record", "log", "ledger", "last_donation",
+        "formatting"
+    ]
+
+
+def test_generate_phases_sqlite(config_path, mock_data_paths):
+    config = load_config(config_path).copy(update={"storage": "sqlite"})
+    profiler = Profiler()
+    generate_donations(config, profiler=profiler)
+
+    assert list(profiler.phases) == [
+        "schedule", "sampling", "record", "formatting"
+    ]
@@ -0,0 +1,75 @@
+from collections import Counter
+from donate.ledger import _get_ledger, get_rollups, update_ledger
+from donate.logs import _segment_path, append_log, update_log
+from donate.reconcile import (_chunks, format_drift, rebuild_ledger,
+                              tally_log, verify_ledger)
+import pytest
+
+
+@pytest.fixture
+def history(mock_data_paths, donations):
+    for _ in range(3):
+        update_log(donations, "£", True)
+        update_ledger(donations)
+
+
+def test_chunks(mock_data_paths):
+    append_log([["2021-01-01", f"donee {i}", "£", i] for i in range(100)])
+    path = _segment_path("2021")
+
+    chunks = _chunks(path, 100)
+
+    assert chunks[0][1] == 0
+    assert chunks[-1][2] == path.stat().st_size
+    data = path.read_bytes()
+    for _, start, end in chunks:
+        # Chunks start and end on record boundaries
+        assert data[end - 1:end] == b"\n"
+        assert start == 0 or data[start - 1:start] == b"\n"
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_tally_log(mock_data_paths, workers):
+    append_log([["2020-12-01", "a", "£", 0.1]])
+    append_log([["2021-01-01", "a", "£", 1.5]] * 50
+               + [["2021-02-01", "b", "£", 2.0]] * 50)
+
+    total, number, rollups = tally_log(True, {"a": "software"}, workers,
+                                       chunk_size=64)
+
+    assert total == Counter({"a": 7510, "b": 10000})
+    assert number == Counter({"a": 51, "b": 50})
+    assert rollups["2020-12"] == {"software": [10, 1]}
+    assert rollups["2021-02"] == {"other": [10000, 50]}
+
+
+def test_verify(history, donations):
+    assert verify_ledger(True, 1) == []
+
+    update_ledger(donations)
+    drift = verify_ledger(True, 1)
+
+    assert ("Favourite distro", 400, 300, 4, 3) in drift
+    assert len(drift) == len(donations)
+
+
+def test_rebuild(history, donations):
+    update_ledger(donations)
+    drift = rebuild_ledger(True, {donee.name: donee.category
+                                  for donee in donations}, 1)
+
+    assert len(drift) == len(donations)
+    assert verify_ledger(True, 1) == []
+    assert _get_ledger()["number"]["Favourite distro"] == 3
+    assert sum(
+        amount for month in get_rollups().values()
+        for amount, _ in month.values()
+    ) == 3 * sum(donations.values())
+
+
+def test_format_drift():
+    assert format_drift([], "£", False) == "The ledger agrees with the log"
+
+    report = format_drift([("a", 250, 200, 3, 2)], "£", True)
+    assert report.startswith("The ledger differs from the log for 1 donees")
+    assert "2.50" in report
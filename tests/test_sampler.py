@@ -0,0 +1,230 @@
+from collections import Counter
+from donate.maths import normalised_weights, single_donation
+from donate.sampler import (AliasSampler, DynamicSampler, _alias_tables,
+                            get_donee_table, get_sampler, binomial,
+                            multinomial,
+                            sample_distinct, sample_distinct_indices)
+from random import Random
+import pytest
+
+
+def test_alias_tables_uniform():
+    probability, alias = _alias_tables([1., 1., 1., 1.])
+    assert probability == pytest.approx([1., 1., 1., 1.])
+
+
+def test_alias_tables_empty():
+    with pytest.raises(ValueError):
+        _alias_tables([])
+
+
+def test_alias_tables_probabilities(donees):
+    probability, alias = _alias_tables([donee.weight for donee in donees])
+    n = len(donees)
+
+    # Reconstruct the probability of selecting each donee from the tables
+    reconstructed = [0.] * n
+    for i in range(n):
+        reconstructed[i] += probability[i] / n
+        reconstructed[alias[i]] += (1. - probability[i]) / n
+
+    assert reconstructed == pytest.approx(normalised_weights(donees))
+
+
+def test_sample(donees):
+    sampler = AliasSampler(donees)
+    selected = sampler.sample(10)
+
+    assert len(selected) == 10
+    assert all(donee in donees for donee in selected)
+
+
+def test_sample_distribution(donees):
+    sampler = AliasSampler(donees)
+    k = 100000
+    counts = Counter(sampler.sample(k, Random(1)))
+
+    for donee, weight in zip(donees, normalised_weights(donees)):
+        assert counts[donee] / k == pytest.approx(weight, abs=0.01)
+
+
+def test_sample_rng(donees):
+    sampler = AliasSampler(donees)
+    assert sampler.sample(20, Random(5)) == sampler.sample(20, Random(5))
+
+
+def test_get_sampler_cached(donees):
+    assert get_sampler(donees) is get_sampler(list(donees))
+
+
+def test_get_donee_table_cached(donees):
+    table = get_donee_table(donees)
+
+    assert get_donee_table(list(donees)) is table
+    assert get_sampler(get_donee_table(donees)) is get_sampler(table)
+    assert table.names == [donee.name for donee in donees]
+
+
+def test_get_sampler_weights_changed(donees):
+    changed = [donees[0].copy(update={"weight": 5.})] + donees[1:]
+    assert get_sampler(donees) is not get_sampler(changed)
+
+
+@pytest.mark.parametrize("n,p", [
+    (0, 0.5),
+    (20, 0.),
+    (20, 1.),
+    (1, 0.3),
+    (50, 0.05),
+    (1000, 0.3),
+    (10000000, 0.8)
+])
+def test_binomial_range(n, p):
+    rng = Random(2)
+    for _ in range(100):
+        assert 0 <= binomial(n, p, rng) <= n
+
+
+@pytest.mark.parametrize("n,p", [(40, 0.1), (5000, 0.3), (100000, 0.9)])
+def test_binomial_moments(n, p):
+    rng = Random(3)
+    trials = 20000
+    samples = [binomial(n, p, rng) for _ in range(trials)]
+
+    mean = sum(samples) / trials
+    variance = sum((x - mean)**2 for x in samples) / (trials - 1)
+
+    assert mean == pytest.approx(n * p, rel=0.01)
+    assert variance == pytest.approx(n * p * (1 - p), rel=0.05)
+
+
+def test_multinomial_total(donees):
+    counts = multinomial(donees, 1000000, Random(4))
+    assert sum(counts.values()) == 1000000
+    assert all(donee in donees for donee in counts)
+
+
+def test_multinomial_zero(donees):
+    assert multinomial(donees, 0) == Counter()
+
+
+def test_multinomial_distribution(donees):
+    k = 1000000
+    counts = multinomial(donees, k, Random(5))
+
+    for donee, weight in zip(donees, normalised_weights(donees)):
+        assert counts[donee] / k == pytest.approx(weight, abs=0.005)
+
+
+class TestSampleDistinct:
+    def test_distinct(self, donees):
+        for seed in range(100):
+            selected = sample_distinct(donees, 5, Random(seed))
+            assert len(set(selected)) == 5
+
+    def test_all(self, donees):
+        assert set(sample_distinct(donees, len(donees))) == set(donees)
+
+    def test_zero_weight(self):
+        for seed in range(100):
+            assert 1 not in sample_distinct_indices([1., 0., 2.], 2,
+                                                    Random(seed))
+
+    def test_too_many(self):
+        with pytest.raises(ValueError) as e:
+            sample_distinct_indices([1., 0., 2.], 3)
+        assert "Cannot choose 3 distinct donees from 2" in str(e.value)
+
+    def test_first_distribution(self, donees):
+        # The first donee drawn is drawn with replacement's probability
+        trials = 100000
+        rng = Random(6)
+        counts = Counter(
+            sample_distinct(donees, 3, rng)[0] for _ in range(trials)
+        )
+
+        for donee, weight in zip(donees, normalised_weights(donees)):
+            assert counts[donee] / trials == pytest.approx(weight, abs=0.01)
+
+
+class TestDynamicSampler:
+    def test_build(self, donees):
+        sampler = DynamicSampler(donees)
+
+        assert len(sampler) == len(donees)
+        assert sampler.total_weight == pytest.approx(
+            sum(donee.weight for donee in donees)
+        )
+        # Every prefix sum matches the weights
+        for i in range(len(donees) + 1):
+            assert sampler._prefix(i) == pytest.approx(
+                sum(donee.weight for donee in donees[:i])
+            )
+
+    def test_duplicate(self, donees):
+        with pytest.raises(ValueError):
+            DynamicSampler([donees[0], donees[0]])
+
+        sampler = DynamicSampler(donees)
+        with pytest.raises(ValueError):
+            sampler.insert(donees[0])
+
+    def test_empty(self):
+        with pytest.raises(ValueError):
+            DynamicSampler().sample(1)
+
+    def test_sample_distribution(self, donees):
+        sampler = DynamicSampler(donees)
+        k = 100000
+        counts = Counter(sampler.sample(k, Random(1)))
+
+        for donee, weight in zip(donees, normalised_weights(donees)):
+            assert counts[donee] / k == pytest.approx(weight, abs=0.01)
+
+    def test_insert(self, donees):
+        sampler = DynamicSampler(donees[:3])
+        for donee in donees[3:]:
+            sampler.insert(donee)
+
+        assert len(sampler) == len(donees)
+        for i in range(len(donees) + 1):
+            assert sampler._prefix(i) == pytest.approx(
+                sum(donee.weight for donee in donees[:i])
+            )
+
+    def test_remove(self, donees):
+        sampler = DynamicSampler(donees)
+        sampler.remove(donees[2].name)
+
+        assert len(sampler) == len(donees) - 1
+        assert donees[2].name not in sampler
+        assert sampler.total_weight == pytest.approx(
+            sum(donee.weight for donee in donees) - donees[2].weight
+        )
+        assert donees[2] not in sampler.sample(1000, Random(2))
+
+    def test_reuse_slot(self, donees):
+        sampler = DynamicSampler(donees)
+        sampler.remove(donees[2].name)
+        sampler.insert(donees[2])
+
+        assert len(sampler._weights) == len(donees)
+        assert sampler.total_weight == pytest.approx(
+            sum(donee.weight for donee in donees)
+        )
+
+    def test_update(self, donees):
+        sampler = DynamicSampler(donees)
+        # Make one donee far more likely than the others
+        heavy = donees[6].copy(update={"weight": 1e6})
+        sampler.update(heavy)
+
+        assert sampler.donee(heavy.name).weight == 1e6
+        counts = Counter(sampler.sample(1000, Random(3)))
+        assert counts[heavy] > 990
+
+    def test_single_donation(self, donees):
+        sampler = DynamicSampler(donees[:1])
+        individual_donations = single_donation(donees, 20, 4,
+                                               sampler=sampler)
+        assert individual_donations == Counter({donees[0]: 20})
@@ -0,0 +1,238 @@
+"""Test the donate server and client."""
+import asyncio
+from donate.__main__ import _generate
+from donate.client import default_socket_path, main, request
+from donate.ledger import _get_ledger
+from donate.profiling import Profiler
+from donate.sampler import DynamicSampler
+from donate.server import DonateServer, update_sampler
+import os
+import pytest
+import re
+import stat
+import threading
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return tmp_path / "run" / "donate.sock"
+
+
+@pytest.fixture
+def server(config_path, socket_path, mock_data_paths):
+    yield from _serve_in_thread(config_path, socket_path)
+
+
+@pytest.fixture
+def sqlite_server(config_path, socket_path, mock_data_paths):
+    config_path.write_text(config_path.read_text() + "storage: sqlite\n")
+    yield from _serve_in_thread(config_path, socket_path)
+
+
+def _serve_in_thread(config_path, socket_path):
+    ready = threading.Event()
+
+    async def _serve():
+        server = DonateServer(config_path)
+        task = asyncio.create_task(server.serve(socket_path))
+        while not socket_path.exists():
+            await asyncio.sleep(0.01)
+        ready.set()
+        await task
+
+    thread = threading.Thread(target=asyncio.run, args=(_serve(),))
+    thread.start()
+    assert ready.wait(5)
+
+    yield socket_path
+
+    request("shutdown", socket_path=socket_path)
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_socket_permissions(config_path, socket_path, mock_data_paths,
+                            monkeypatch):
+    umasks = []
+    start_unix_server = asyncio.start_unix_server
+
+    async def mock_start_unix_server(*args, **kwargs):
+        umask = os.umask(0)
+        os.umask(umask)
+        umasks.append(umask)
+        return await start_unix_server(*args, **kwargs)
+
+    monkeypatch.setattr(asyncio, "start_unix_server", mock_start_unix_server)
+    umask = os.umask(0o022)
+    try:
+        for _ in _serve_in_thread(config_path, socket_path):
+            assert stat.S_IMODE(socket_path.stat().st_mode) & 0o077 == 0
+            # The process umask is restored once the socket is created
+            assert os.umask(0o022) == 0o022
+    finally:
+        os.umask(umask)
+
+    # The socket was created with no access for other users
+    assert umasks == [0o077]
+
+
+def test_default_socket_path(monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", "/run/user/1000")
+    assert str(default_socket_path()) == "/run/user/1000/donate.sock"
+
+
+def test_ping(server):
+    assert request("ping", socket_path=server) == {
+        "ok": True, "output": "pong"
+    }
+
+
+def test_means(server):
+    response = request("means", {"total_donation": 30, "statistics": True},
+                       socket_path=server)
+
+    assert response["ok"]
+    assert re.search(r"^Favourite distro\s+20$", response["output"],
+                     re.MULTILINE)
+    assert "Donation statistics from £30 split 4 ways" in response["output"]
+
+
+def test_generate_seed(server, config_path, capsys):
+    """The server and command line give the same donations for a seed."""
+    for seed in range(10):
+        _generate(config_path, ad_hoc=True, dry_run=True,
+                  profiler=Profiler(enabled=False), seed=seed,
+                  distinct=False, balanced=False, output_format="table")
+        response = request("generate",
+                           {"ad_hoc": True, "dry_run": True, "seed": seed},
+                           socket_path=server)
+
+        assert response["output"] == capsys.readouterr().out.rstrip("\n")
+
+
+def test_generate_and_stats(server):
+    response = request("generate", socket_path=server)
+    assert response["ok"]
+    assert response["output"].startswith("1 donations due")
+
+    response = request("generate", socket_path=server)
+    assert response["output"] == "No donations due"
+
+    assert sum(_get_ledger()["total"].values()) == 20
+
+    response = request("stats", socket_path=server)
+    assert response["ok"]
+    assert "Number of donations" in response["output"]
+
+
+def test_sqlite(sqlite_server):
+    """Requests run in worker threads each using their own connection."""
+    response = request("generate", socket_path=sqlite_server)
+    assert response["ok"], response.get("error")
+    assert response["output"].startswith("1 donations due")
+
+    response = request("generate", {"ad_hoc": True},
+                       socket_path=sqlite_server)
+    assert response["ok"], response.get("error")
+
+    response = request("stats", socket_path=sqlite_server)
+    assert response["ok"], response.get("error")
+    assert "Number of donations" in response["output"]
+    assert _get_ledger()["total"] == {}
+
+
+def test_concurrent_generate(server):
+    # Concurrent ad hoc donations must all be recorded
+    threads = [
+        threading.Thread(
+            target=request,
+            args=("generate", {"ad_hoc": True}),
+            kwargs={"socket_path": server}
+        )
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(_get_ledger()["total"].values()) == 8 * 20
+
+
+def test_reload(server, config_path):
+    config_path.write_text(
+        config_path.read_text().replace("weight: 0.5", "weight: 1.0")
+    )
+
+    response = request("means", {"total_donation": 30}, socket_path=server)
+    assert re.search(r"^Favourite software\s+15$", response["output"],
+                     re.MULTILINE)
+
+
+def test_reload_waits_for_generate(config_path, mock_data_paths):
+    """A changed configuration is not loaded while a generate is running."""
+    server = DonateServer(config_path)
+    started = threading.Event()
+    release = threading.Event()
+
+    def generate():
+        started.set()
+        release.wait(5)
+        return server.config.donees[1].weight
+
+    server.generate = generate
+
+    async def run():
+        generating = asyncio.create_task(
+            server._dispatch({"command": "generate"})
+        )
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+
+        config_path.write_text(
+            config_path.read_text().replace("weight: 0.5", "weight: 1.0")
+        )
+        means = asyncio.create_task(
+            server._dispatch({"command": "means",
+                              "arguments": {"total_donation": 30}})
+        )
+        await asyncio.sleep(0.05)
+        assert not means.done()
+        assert server.config.donees[1].weight == 0.5
+
+        release.set()
+        assert await generating == 0.5
+        assert re.search(r"^Favourite software\s+15$", await means,
+                         re.MULTILINE)
+
+    asyncio.run(run())
+
+
+def test_invalid_command(server):
+    response = request("explode", socket_path=server)
+    assert response == {"ok": False, "error": "Command 'explode' is not valid"}
+
+
+def test_client_main(server, capsys):
+    assert main(["--socket", str(server), "ping"]) == 0
+    assert capsys.readouterr().out == "pong\n"
+
+
+def test_client_no_server(tmp_path, capsys):
+    assert main(["--socket", str(tmp_path / "missing.sock"), "ping"]) == 1
+    assert "Could not connect" in capsys.readouterr().err
+
+
+def test_update_sampler(donees):
+    sampler = DynamicSampler(donees[:5])
+    changed = donees[1].copy(update={"weight": 3.})
+
+    update_sampler(sampler, [donees[0], changed] + donees[3:7])
+
+    assert sampler.names() == {
+        donee.name for donee in [donees[0], changed] + donees[3:7]
+    }
+    assert sampler.donee(changed.name).weight == 3.
+    assert sampler.total_weight == pytest.approx(
+        sum(donee.weight for donee in [donees[0], changed] + donees[3:7])
+    )
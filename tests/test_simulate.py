@@ -0,0 +1,85 @@
+from collections import Counter
+from donate.donee import DoneeTable
+from donate.simulate import _chunks, _percentile, _simulate_chunk, simulate
+from donate.streams import blocks
+import pytest
+import re
+
+
+@pytest.mark.parametrize("rounds,workers",
+                         [(100, 4), (7, 4), (100001, 3), (1024, 2)])
+def test_chunks(rounds, workers):
+    chunks = _chunks(rounds, workers)
+    assert sorted(block for chunk in chunks for block in chunk) == (
+        blocks(rounds)
+    )
+    assert all(chunks)
+
+
+def test_percentile():
+    # 10 rounds, 5 with nothing, 3 with 1 part and 2 with 2 parts
+    histogram = Counter({1: 3, 2: 2})
+    assert _percentile(histogram, 10, 50) == 0
+    assert _percentile(histogram, 10, 60) == 1
+    assert _percentile(histogram, 10, 80) == 1
+    assert _percentile(histogram, 10, 95) == 2
+
+
+def test_simulate_chunk(donees):
+    table = DoneeTable.from_donees(donees)
+    donee_histograms, category_histograms = _simulate_chunk(
+        table, 4, blocks(1000), 1
+    )
+
+    # Every round distributes 4 parts
+    total_parts = sum(
+        count * rounds
+        for histogram in donee_histograms
+        for count, rounds in histogram.items()
+    )
+    assert total_parts == 4000
+
+    total_category_parts = sum(
+        count * rounds
+        for histogram in category_histograms
+        for count, rounds in histogram.items()
+    )
+    assert total_category_parts == 4000
+
+
+def test_simulate_chunk_seed(donees):
+    table = DoneeTable.from_donees(donees)
+    assert (
+        _simulate_chunk(table, 4, blocks(100), 3)
+        == _simulate_chunk(table, 4, blocks(100), 3)
+    )
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_simulate(donees, workers):
+    summary = simulate(donees, 20, 4, 2000, workers=workers, seed=1)
+
+    assert re.search(r"^Simulated 2000 donations of £20 split 4 ways$",
+                     summary, re.MULTILINE)
+    assert re.search(r"^Donee\s+P5 / £", summary, re.MULTILINE)
+    assert re.search(r"^Category\s+P5 / £", summary, re.MULTILINE)
+    assert re.search(r"^Favourite distro\s", summary, re.MULTILINE)
+    assert re.search(r"^podcast\s", summary, re.MULTILINE)
+    assert re.search(r"rounds per second\)$", summary, re.MULTILINE)
+
+
+@pytest.mark.parametrize("rounds", [0, -1])
+def test_simulate_invalid_rounds(donees, rounds):
+    with pytest.raises(ValueError) as e:
+        simulate(donees, 20, 4, rounds, workers=1)
+    assert f"Rounds '{rounds}' is not valid" in str(e.value)
+
+
+def test_simulate_workers_reproducible(donees):
+    """The same seed gives the same outcome for any number of workers."""
+    def outcome(workers):
+        summary = simulate(donees, 20, 4, 5000, workers=workers, seed=7)
+        # Drop the timing line
+        return summary.splitlines()[:-1]
+
+    assert outcome(1) == outcome(3)
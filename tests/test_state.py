@@ -0,0 +1,141 @@
+from collections import Counter
+from datetime import datetime
+from donate.configuration import load_config
+from donate.generate import make_donations
+from donate.ledger import _get_ledger, _journal_path, journal_intents
+from donate.logs import read_log
+from donate.paths import write_atomic
+from donate.schedule import get_last_donation
+from donate.state import (_draining_path, _pending_path, commit_donations,
+                          drain_pending, record_intent, state_lock)
+import donate.state
+import fcntl
+import json
+import multiprocessing
+import pytest
+
+
+def test_write_atomic(tmp_path):
+    path = tmp_path / "file"
+    path.write_text("old")
+
+    write_atomic(path, "new")
+
+    assert path.read_text() == "new"
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_state_lock(mock_data_paths):
+    with state_lock():
+        with open(mock_data_paths / "lock") as lock_file:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(lock_file.fileno(),
+                            fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def test_state_lock_reentrant(mock_data_paths):
+    with state_lock():
+        with state_lock():
+            pass
+        # Leaving the inner lock keeps the outer lock held
+        with open(mock_data_paths / "lock") as lock_file:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(lock_file.fileno(),
+                            fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+class TestDrainPending:
+    def test_nothing_pending(self, mock_data_paths):
+        with state_lock():
+            assert drain_pending() == 0
+
+        assert get_last_donation() is None
+
+    def test_drain(self, mock_data_paths, donations):
+        time = datetime(2021, 3, 4, 12)
+        record_intent(donations, "£", False, time)
+        record_intent(donations, "£", False, time.replace(month=2))
+
+        with state_lock():
+            assert drain_pending() == 2
+
+        assert list(_pending_path().iterdir()) == []
+        assert not _draining_path().exists()
+        assert get_last_donation() == time
+        assert _get_ledger()["number"] == Counter(
+            {donee.name: 2 for donee in donations}
+        )
+        assert len(list(read_log())) == 2 * len(donations)
+
+    def test_group_commit(self, mock_data_paths, donations):
+        for _ in range(3):
+            record_intent(donations, "£", False)
+        commit_donations(donations, "£", False)
+
+        assert len(journal_intents()) == 4
+        assert list(_pending_path().iterdir()) == []
+
+    def test_recover_interrupted(self, mock_data_paths, donations):
+        intent_id = record_intent(donations, "£", False)
+        intent_path = _pending_path() / f"{intent_id}.json"
+        intent = intent_path.read_text()
+        with state_lock():
+            drain_pending()
+
+        # Simulate a commit interrupted before the intent was removed
+        write_atomic(intent_path, intent)
+        write_atomic(_draining_path(), json.dumps(
+            {"intents": [intent_id], "log_sizes": {}, "written": True}
+        ))
+
+        with state_lock():
+            assert drain_pending() == 1
+
+        assert list(_pending_path().iterdir()) == []
+        with open(_journal_path()) as journal_file:
+            assert len(journal_file.readlines()) == 1
+        assert len(list(read_log())) == len(donations)
+
+    @pytest.mark.parametrize("failing", [
+        "append_journal", "update_last_donation"
+    ])
+    def test_recover_crash(self, mock_data_paths, monkeypatch, donations,
+                           failing):
+        """A commit interrupted after appending to the log is repeated."""
+        record_intent(donations, "£", False)
+        with state_lock():
+            drain_pending()
+        record_intent(donations, "£", False)
+
+        def crash(*args, **kwargs):
+            raise OSError("crash")
+
+        with monkeypatch.context() as context:
+            context.setattr(donate.state, failing, crash)
+            with pytest.raises(OSError):
+                with state_lock():
+                    drain_pending()
+        assert _draining_path().exists()
+
+        with state_lock():
+            assert drain_pending() == 1
+
+        assert len(list(read_log())) == 2 * len(donations)
+        assert _get_ledger()["number"] == Counter(
+            {donee.name: 2 for donee in donations}
+        )
+        assert not _draining_path().exists()
+
+
+def _generate(config_path):
+    return make_donations(load_config(config_path))[0]
+
+
+def test_concurrent_generate(mock_data_paths, config_path):
+    """Only one of many concurrent runs should make a due donation."""
+    context = multiprocessing.get_context("fork")
+    with context.Pool(4) as pool:
+        due = pool.map(_generate, [config_path] * 8)
+
+    assert sorted(due) == [0] * 7 + [1]
+    assert sum(_get_ledger()["total"].values()) == 20
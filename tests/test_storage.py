@@ -0,0 +1,82 @@
+from datetime import datetime
+from donate.configuration import load_config
+from donate.generate import make_donations
+import donate.paths
+from donate.paths import data_path
+from donate.storage import (FileStorage, MemoryStorage, SQLiteStorage,
+                            storage_map)
+import pytest
+
+
+@pytest.fixture(params=["files", "sqlite", "memory"])
+def storage(request, mock_data_paths):
+    return storage_map[request.param]()
+
+
+def test_storage_map():
+    assert storage_map["files"] is FileStorage
+    assert storage_map["sqlite"] is SQLiteStorage
+    assert storage_map["memory"] is MemoryStorage
+
+
+def test_record_donations(storage, donations):
+    time = datetime(2021, 3, 4, 12)
+
+    with storage.lock():
+        assert storage.get_last_donation() is None
+        storage.record_donations(donations, "£", False, time)
+    storage.commit()
+    storage.record_donations(donations, "£", False, time.replace(month=4))
+    storage.commit()
+
+    with storage.lock():
+        assert storage.get_last_donation() == time.replace(month=4)
+
+    total, number = storage.totals()
+    assert total["Favourite distro"] == 200
+    assert number["Podcast 1"] == 2
+
+    rollups = storage.rollups()
+    assert rollups["2021-03"]["software"] == [50, 1]
+    assert rollups["2021-04"]["distribution"] == [100, 1]
+    assert list(storage.rollups(since="2021-04")) == ["2021-04"]
+    assert list(storage.rollups(until="2021-03")) == ["2021-03"]
+
+
+def test_uncommitted(storage, donations):
+    # Rounds recorded but not yet committed are included
+    storage.record_donations(donations, "£", False, datetime(2021, 3, 4))
+
+    assert storage.rollups()["2021-03"]["software"] == [50, 1]
+    assert storage.totals()[0]["Favourite distro"] == 100
+
+
+def test_make_donations_memory(mock_data_paths, config_path):
+    config = load_config(config_path)
+    storage = MemoryStorage()
+
+    assert make_donations(config, storage=storage)[0] == 1
+    assert make_donations(config, storage=storage)[0] == 0
+
+    assert sum(storage.totals()[0].values()) == 20
+    # Nothing is written to the data directory
+    for name in ["ledger.journal", "last_donation", "pending", "lock"]:
+        assert not (mock_data_paths / name).exists()
+    assert not list(mock_data_paths.glob("donation_log*"))
+
+
+def test_data_path_resolved_once(monkeypatch, tmp_path):
+    calls = []
+
+    def save_data_path(name):
+        calls.append(name)
+        return str(tmp_path)
+
+    monkeypatch.setattr(donate.paths, "_data_path", None)
+    monkeypatch.setattr(donate.paths, "_default_data_path", None)
+    monkeypatch.setattr(donate.paths.BaseDirectory, "save_data_path",
+                        save_data_path)
+
+    assert data_path() == tmp_path
+    assert data_path() == tmp_path
+    assert calls == ["donate"]
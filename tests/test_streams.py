@@ -0,0 +1,25 @@
+from donate.streams import BLOCK_SIZE, blocks, derive_seed, stream
+import pytest
+
+
+def test_derive_seed():
+    assert derive_seed(1, 0) == derive_seed(1, 0)
+    assert derive_seed(1, 0) != derive_seed(1, 1)
+    assert derive_seed(1, 0) != derive_seed(2, 0)
+    assert derive_seed(1, 0, 1) != derive_seed(1, 0)
+
+
+def test_stream():
+    assert stream(1, 2).random() == stream(1, 2).random()
+    assert stream(1, 2).random() != stream(1, 3).random()
+
+
+@pytest.mark.parametrize("rounds", [0, 1, BLOCK_SIZE, 3 * BLOCK_SIZE + 5])
+def test_blocks(rounds):
+    round_blocks = blocks(rounds)
+
+    assert sum(size for _, size in round_blocks) == rounds
+    assert [index for index, _ in round_blocks] == list(
+        range(len(round_blocks))
+    )
+    assert all(0 < size <= BLOCK_SIZE for _, size in round_blocks)